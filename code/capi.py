@@ -2,12 +2,14 @@
 # -*- coding: utf-8 -*-
 
 
-import requests
 import logging
 import json
 from datetime import datetime, timezone, timedelta
 import os
 
+from http_client import get_client, http_get
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
+
 logger = logging.getLogger(__name__)
 
 CCTV_CHANNELS = {
@@ -40,7 +42,11 @@ def validate_date(date_str):
     except ValueError:
         return False
 
-def get_cctv_epg(channel_id, date_str):
+def parse_jsonp(text):
+    """取出 JSONP 回调括号中的 JSON 并解析"""
+    return json.loads(text[text.index('(') + 1:text.rindex(')')])
+
+def get_cctv_epg(channel_id, date_str, session=None):
     api_url = os.environ.get('CCTV_API_URL')
     if not api_url:
         logger.error("未找到入口CCTV_API_URL")
@@ -49,69 +55,60 @@ def get_cctv_epg(channel_id, date_str):
     api_url = api_url.format(channel_id=channel_id, date_str=date_str)
     
     try:
-        response = requests.get(api_url, timeout=15)
-        response.raise_for_status()
+        response = http_get(api_url, session=session)
+        if response is None:
+            logger.error(f"获取CCTV节目单失败: {channel_id}")
+            return None
         
-        jsonp_text = response.text
-        json_text = jsonp_text[jsonp_text.index('(') + 1:jsonp_text.rindex(')')]
-        data = json.loads(json_text)
+        data = parse_jsonp(response.text)
         
         if 'errcode' in data:
             logger.warning(f"CCTV: {data['errcode']}, 错误信息: {data.get('msg', '无')}")
+            get_client().cache.invalidate(api_url)
             return None
         
         if 'data' not in data:
             logger.warning(f"CCTV API返回的数据中没有包含data字段: {data}")
+            get_client().cache.invalidate(api_url)
             return None
         
         return data
     except Exception as e:
         logger.error(f"获取CCTV节目单失败: {e}")
+        get_client().cache.invalidate(api_url)
         return None
 
-def generate_xmltv(programs_dict, target_date, timezone):
+def write_xmltv(programs_dict, target_date, timezone, stream):
     generator_url = os.environ.get('CCTV_GENERATOR_URL', '')
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="CCTV API EPG Generator" generator-info-url="{generator_url}">
-'''    
     total_programs = 0
     
-    for channel_id, programs in programs_dict.items():
-        channel_name = CCTV_CHANNELS.get(channel_id, channel_id)
-        channel_xml_id = channel_name.replace(' ', '_').replace('-', '_')
-        
-        xml_content += f'''
-  <channel id="{channel_xml_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-        
-        channel_program_count = 0
-        for program in programs:
-            try:
-                start_time = datetime.fromtimestamp(program['startTime'], timezone)
-                end_time = datetime.fromtimestamp(program['endTime'], timezone)
-                
-                start_str = start_time.strftime('%Y%m%d%H%M%S')
-                end_str = end_time.strftime('%Y%m%d%H%M%S')
-                
-                title = program['title']
-                
-                xml_content += f'''
-  <programme channel="{channel_xml_id}" start="{start_str} +0800" stop="{end_str} +0800">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-                channel_program_count += 1
-                total_programs += 1
-            except Exception as e:
-                logger.warning(f"解析节目失败: {e}")
-                continue
-        
-        logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目")
+    with XmltvWriter(stream, 'CCTV API EPG Generator', generator_url, declaration=UTF8_DECLARATION) as writer:
+        for channel_id, programs in programs_dict.items():
+            channel_name = CCTV_CHANNELS.get(channel_id, channel_id)
+            channel_xml_id = channel_name.replace(' ', '_').replace('-', '_')
+            
+            writer.channel(channel_xml_id, channel_name)
+            
+            channel_program_count = 0
+            for program in programs:
+                try:
+                    start_time = datetime.fromtimestamp(program['startTime'], timezone)
+                    end_time = datetime.fromtimestamp(program['endTime'], timezone)
+                    
+                    start_str = start_time.strftime('%Y%m%d%H%M%S')
+                    end_str = end_time.strftime('%Y%m%d%H%M%S')
+                    
+                    writer.programme(channel_xml_id, f"{start_str} +0800", f"{end_str} +0800", program['title'])
+                    channel_program_count += 1
+                    total_programs += 1
+                except Exception as e:
+                    logger.warning(f"解析节目失败: {e}")
+                    continue
+            
+            logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目")
     
     logger.info(f"共生成了 {total_programs} 个节目")
-    xml_content += '''</tv>
-'''
-    
-    return xml_content
+    return total_programs
+
+def generate_xmltv(programs_dict, target_date, timezone):
+    return render_xmltv(write_xmltv, programs_dict, target_date, timezone)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地方台频道目录缓存
+
+省份首页上的频道列表（频道名称 -> 频道代码）很少变化，按省份 code 保存到
+cache/tmdf_catalog.json，在 cache.catalog_ttl_days 内直接使用，不再下载、解析首页。
+与节目页面的响应缓存分开保存，各自过期。
+
+返回 404 的频道代码记入否定缓存，cache.missing_ttl_days 内不再请求。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from settings import get_section
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_TTL_DAYS = 30
+DEFAULT_MISSING_TTL_DAYS = 7
+
+
+class ChannelCatalog:
+    """
+    频道目录
+
+    Args:
+        cache_config: cache 配置节，默认读取 config.yaml
+    """
+
+    def __init__(self, cache_config=None):
+        if cache_config is None:
+            cache_config = get_section('cache')
+
+        self.enabled = cache_config.get('enabled', True)
+        self.ttl = cache_config.get('catalog_ttl_days', DEFAULT_CATALOG_TTL_DAYS) * 86400
+        self.missing_ttl = cache_config.get('missing_ttl_days', DEFAULT_MISSING_TTL_DAYS) * 86400
+        self.path = os.path.join(cache_config.get('dir', 'cache'), 'tmdf_catalog.json')
+
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取频道目录失败: {self.path} ({e})")
+                self._data = {}
+            self._data.setdefault('provinces', {})
+            # 过期的否定缓存条目在读取时丢弃，下次保存时不再写入
+            now = time.time()
+            self._data['missing'] = {
+                code: stored_at for code, stored_at in self._data.get('missing', {}).items()
+                if now - stored_at <= self.missing_ttl
+            }
+        return self._data
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get_channels(self, province_code):
+        """返回未过期的频道列表 {频道名称: 频道代码}，没有时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._load()['provinces'].get(province_code)
+        if entry is None or time.time() - entry['stored_at'] > self.ttl:
+            return None
+        return dict(entry['channels'])
+
+    def put_channels(self, province_code, channels):
+        if not self.enabled or not channels:
+            return
+        with self._lock:
+            self._load()['provinces'][province_code] = {'stored_at': time.time(), 'channels': channels}
+            self._save()
+
+    def is_missing(self, channel_code):
+        """频道代码是否在否定缓存中且未过期"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            stored_at = self._load()['missing'].get(channel_code)
+        return stored_at is not None and time.time() - stored_at <= self.missing_ttl
+
+    def mark_missing(self, channel_code):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._load()['missing'][channel_code] = time.time()
+            self._save()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """返回进程内共享的频道目录"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ChannelCatalog()
+    return _catalog
@@ -1,6 +1,8 @@
 # 频道名称映射表
 # 用于统一处理不同来源的频道名称变体
 
+from functools import lru_cache
+
 # 央视名称映射表：键为各种可能的变体，值为标准化名称
 CCTV_NAME_MAPPING = {
     # CCTV-1 综合
@@ -413,6 +415,28 @@ CHANNEL_NAME_MAPPING = {}
 CHANNEL_NAME_MAPPING.update(CCTV_NAME_MAPPING)
 CHANNEL_NAME_MAPPING.update(SATELLITE_NAME_MAPPING)
 
+def _build_lookup_tables():
+    """
+    预先构建查找表，使 get_standard_channel_name 无需逐个扫描映射表
+
+    lower 表对应小写匹配，token 表对应部分匹配：部分匹配要求输入是某个名称中
+    以空格分隔的连续片段，因此把每个名称的所有连续片段都登记下来。
+    两个表都只保留映射表中第一个命中的名称，与逐个扫描的结果一致。
+    """
+    lower_table = {}
+    token_table = {}
+    for key, value in CHANNEL_NAME_MAPPING.items():
+        key_lower = key.lower()
+        lower_table.setdefault(key_lower, value)
+        tokens = key_lower.split(' ')
+        for start in range(len(tokens)):
+            for end in range(start + 1, len(tokens) + 1):
+                token_table.setdefault(' '.join(tokens[start:end]), value)
+    return lower_table, token_table
+
+LOWER_NAME_TABLE, TOKEN_NAME_TABLE = _build_lookup_tables()
+
+@lru_cache(maxsize=4096)
 def get_standard_channel_name(channel_name):
     """
     获取标准化的频道名称
@@ -434,9 +458,8 @@ def get_standard_channel_name(channel_name):
         return CHANNEL_NAME_MAPPING[channel_name]
     
     # 2. 尝试小写匹配
-    for key, value in CHANNEL_NAME_MAPPING.items():
-        if key.lower() == normalized:
-            return value
+    if normalized in LOWER_NAME_TABLE:
+        return LOWER_NAME_TABLE[normalized]
     
     # 3. 针对CCTV-4 欧洲和美洲的特殊处理
     if normalized == 'cctv-4 欧洲' or normalized == 'cctv4 欧洲' or 'europe' in normalized:
@@ -444,12 +467,9 @@ def get_standard_channel_name(channel_name):
     if normalized == 'cctv-4 美洲' or normalized == 'cctv4 美洲' or 'america' in normalized:
         return 'CCTV-4 美洲'
     
-    # 4. 尝试更安全的部分匹配（避免前缀匹配问题）
-    for key, value in CHANNEL_NAME_MAPPING.items():
-        key_lower = key.lower()
-        # 只匹配完整的单词或频道名称的开始/结束
-        if f" {normalized} " in f" {key_lower} " or key_lower.startswith(f"{normalized} ") or key_lower.endswith(f" {normalized}"):
-            return value
+    # 4. 尝试更安全的部分匹配（只匹配完整的单词，避免前缀匹配问题）
+    if normalized in TOKEN_NAME_TABLE:
+        return TOKEN_NAME_TABLE[normalized]
     
     # 5. 如果都没有匹配到，返回原始名称
     return channel_name
@@ -460,6 +480,40 @@ def normalize_channel_name(channel_name):
     """
     return get_standard_channel_name(channel_name)
 
+def channel_names_match(expected, parsed):
+    """
+    判断页面中提取的频道名称与请求的频道是否一致
+
+    页面名称常多出或少了“频道”等后缀，标准化后相等或互相包含即视为一致。
+    """
+    if not expected or not parsed:
+        return False
+    expected = normalize_channel_name(expected)
+    parsed = normalize_channel_name(parsed)
+    return expected == parsed or expected in parsed or parsed in expected
+
+class ChannelIndex:
+    """
+    按标准化名称查找频道ID的索引，创建时对每个频道名称只标准化一次
+
+    Args:
+        channels: {频道ID: {'name': 频道名称, ...}}，如 channels.CHANNELS
+    """
+
+    def __init__(self, channels):
+        # 标准名称 -> 频道ID，同名时保留第一个，与按顺序遍历的结果一致
+        self.by_standard_name = {}
+        # (频道ID, 标准名称)，保持原顺序，供模糊匹配使用
+        self.standard_names = []
+        for channel_id, channel_info in channels.items():
+            standard_name = normalize_channel_name(channel_info['name'])
+            self.by_standard_name.setdefault(standard_name, channel_id)
+            self.standard_names.append((channel_id, standard_name))
+
+    def lookup(self, channel_name):
+        """精确匹配，返回频道ID，没有则返回 None"""
+        return self.by_standard_name.get(normalize_channel_name(channel_name))
+
 # 使用示例
 if __name__ == "__main__":
     # 测试央视名称映射
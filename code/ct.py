@@ -1,13 +1,15 @@
-import requests
 from bs4 import BeautifulSoup
 import logging
 from datetime import datetime, timedelta, timezone
 import os
-import time
 import re
 import json
 import argparse
 
+from http_client import http_get
+from programme import Programme, format_hhmm
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
+
 logger = logging.getLogger(__name__)
 
 CCTV_CHANNELS = {
@@ -42,8 +44,10 @@ def get_cctv_epg(channel_id, date_str):
     api_url = api_url.format(channel_id=channel_id, date_str=date_str)
     
     try:
-        response = requests.get(api_url, timeout=15)
-        response.raise_for_status()
+        response = http_get(api_url)
+        if response is None:
+            logger.error(f"获取CCTV节目单失败: {channel_id}")
+            return None
         
         jsonp_text = response.text
         json_text = jsonp_text[jsonp_text.index('(') + 1:jsonp_text.rindex(')')]
@@ -54,53 +58,40 @@ def get_cctv_epg(channel_id, date_str):
         logger.error(f"获取CCTV节目单失败: {e}")
         return None
 
-def generate_xmltv(programs_dict, target_date, timezone):
+def write_xmltv(programs_dict, target_date, timezone, stream):
     generator_url = os.environ.get('CCTV_GENERATOR_URL', '')
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="CCTV API EPG Generator" generator-info-url="{generator_url}">
-'''
-    
     total_programs = 0
     
-    for channel_id, programs in programs_dict.items():
-        channel_name = CCTV_CHANNELS.get(channel_id, channel_id)
-        channel_xml_id = channel_name.replace(' ', '_').replace('-', '_')
-        
-        xml_content += f'''
-  <channel id="{channel_xml_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-        
-        channel_program_count = 0
-        for program in programs:
-            try:
-                start_time = datetime.fromtimestamp(program['startTime'], timezone)
-                end_time = datetime.fromtimestamp(program['endTime'], timezone)
-                
-                start_str = start_time.strftime('%Y%m%d%H%M%S')
-                end_str = end_time.strftime('%Y%m%d%H%M%S')
-                
-                title = program['title']
-                
-                xml_content += f'''
-  <programme channel="{channel_xml_id}" start="{start_str} +0800" stop="{end_str} +0800">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-                channel_program_count += 1
-                total_programs += 1
-            except Exception as e:
-                logger.warning(f"解析节目失败: {e}")
-                continue
-        
-        logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目")
+    with XmltvWriter(stream, 'CCTV API EPG Generator', generator_url, declaration=UTF8_DECLARATION) as writer:
+        for channel_id, programs in programs_dict.items():
+            channel_name = CCTV_CHANNELS.get(channel_id, channel_id)
+            channel_xml_id = channel_name.replace(' ', '_').replace('-', '_')
+            
+            writer.channel(channel_xml_id, channel_name)
+            
+            channel_program_count = 0
+            for program in programs:
+                try:
+                    start_time = datetime.fromtimestamp(program['startTime'], timezone)
+                    end_time = datetime.fromtimestamp(program['endTime'], timezone)
+                    
+                    start_str = start_time.strftime('%Y%m%d%H%M%S')
+                    end_str = end_time.strftime('%Y%m%d%H%M%S')
+                    
+                    writer.programme(channel_xml_id, f"{start_str} +0800", f"{end_str} +0800", program['title'])
+                    channel_program_count += 1
+                    total_programs += 1
+                except Exception as e:
+                    logger.warning(f"解析节目失败: {e}")
+                    continue
+            
+            logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目")
     
     logger.info(f"共生成了 {total_programs} 个节目")
-    xml_content += '''</tv>
-'''
-    
-    return xml_content
+    return total_programs
+
+def generate_xmltv(programs_dict, target_date, timezone):
+    return render_xmltv(write_xmltv, programs_dict, target_date, timezone)
 
 def validate_date(date_str):
     try:
@@ -141,14 +132,10 @@ def main():
                 if 'list' in channel_data:
                     programs_dict[channel_id] = channel_data['list']
                     break
-
-        time.sleep(1)
     
     logger.info(f"共获取到 {len(programs_dict)} 个频道的节目单")
     
     if programs_dict:
-        xmltv_content = generate_xmltv(programs_dict, target_date, beijing_tz)
-
         output_dir = 'output'
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -156,7 +143,7 @@ def main():
         output_file = os.path.join(output_dir, f'cctv_epg_{target_date}.xml')
         
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(xmltv_content)
+            write_xmltv(programs_dict, target_date, beijing_tz, f)
         
         logger.info(f"CCTV节目单已保存到 {output_file}")
     else:
@@ -165,40 +152,70 @@ def main():
 from capi import get_cctv_epg as api_get_cctv_epg
 from capi import CCTV_CHANNELS as API_CCTV_CHANNELS
 
-def fetch_cctv_programs():
+def format_cctv_programs(epg_data):
+    for key, channel_data in epg_data['data'].items():
+        if 'list' in channel_data:
+            formatted_programs = []
+            for program in channel_data['list']:
+                # 与 'HH:MM' 一样精确到分钟
+                start = int(program['startTime']) // 60 * 60
+                formatted_programs.append(Programme(
+                    format_hhmm(start), program['title'],
+                    start=start, stop=int(program['endTime']) // 60 * 60
+                ))
+            return formatted_programs
+
+    return None
+
+def fetch_cctv_programs(concurrent=True, max_workers=8, target_date=None):
+    """
+    抓取全部央视频道节目单
+
+    Args:
+        concurrent: 是否并发抓取，False 时退回逐个频道顺序抓取
+        max_workers: 并发抓取时的最大线程数
+        target_date: 'YYYYmmdd'，默认为北京时间今天
+    """
     from datetime import timezone, timedelta
 
     beijing_tz = timezone(timedelta(hours=8))
 
-    target_date = datetime.now(beijing_tz).strftime('%Y%m%d')
+    if target_date is None:
+        target_date = datetime.now(beijing_tz).strftime('%Y%m%d')
     
     programs_dict = {}
     success_count = 0
     fail_count = 0
 
-    for channel_id, channel_name in API_CCTV_CHANNELS.items():
-        epg_data = api_get_cctv_epg(channel_id, target_date)
-        
+    channel_items = list(API_CCTV_CHANNELS.items())
+
+    if concurrent and max_workers and max_workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # 各线程共用 http_client 中该主机的 keep-alive 连接池
+        logger.info(f"并发抓取央视频道节目单，线程数: {max_workers}")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(api_get_cctv_epg, channel_id, target_date)
+                for channel_id, _ in channel_items
+            ]
+            # 按频道顺序收集结果，保证与顺序抓取一致
+            epg_results = [future.result() for future in futures]
+    else:
+        epg_results = []
+        for channel_id, channel_name in channel_items:
+            epg_results.append(api_get_cctv_epg(channel_id, target_date))
+
+    for (channel_id, channel_name), epg_data in zip(channel_items, epg_results):
         if epg_data and 'data' in epg_data:
-            for key, channel_data in epg_data['data'].items():
-                if 'list' in channel_data:
-                    formatted_programs = []
-                    for program in channel_data['list']:
-                        start_time = datetime.fromtimestamp(program['startTime'], beijing_tz).strftime('%H:%M')
-                        formatted_programs.append({
-                            'time': start_time,
-                            'title': program['title']
-                        })
-
-                    programs_dict[channel_name] = formatted_programs
-                    success_count += 1
-                    logger.info(f"成功获取到{channel_name}的节目单，共{len(formatted_programs)}个节目")
-                    break
+            formatted_programs = format_cctv_programs(epg_data)
+            if formatted_programs is not None:
+                programs_dict[channel_name] = formatted_programs
+                success_count += 1
+                logger.info(f"成功获取到{channel_name}的节目单，共{len(formatted_programs)}个节目")
         else:
             fail_count += 1
             logger.warning(f"未能获取到{channel_name}的节目单")
-
-        time.sleep(0.5)
     
     logger.info(f"完成，成功获取到 {success_count} 个频道的节目单，{fail_count} 个频道失败")
     return programs_dict
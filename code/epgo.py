@@ -1,29 +1,15 @@
 import logging
-from datetime import datetime, timedelta, timezone
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 import time
 import os
-import yaml
 import gzip
-import shutil
-import difflib
+import sys
+import argparse
+from datetime import datetime
+from functools import lru_cache, partial
 
-DEFAULT_CONFIG_PATH = "config.yaml"
+from settings import get_config
 
-def load_config(config_path=DEFAULT_CONFIG_PATH):
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config
-    except FileNotFoundError:
-        logger.error(f"配置文件未找到: {config_path}")
-        return {}
-    except yaml.YAMLError as e:
-        logger.error(f"解析配置文件失败: {e}")
-        return {}
-
-CONFIG = load_config()
+CONFIG = get_config()
 
 log_level = CONFIG.get('logging', {}).get('level', 'INFO').upper()
 log_format = CONFIG.get('logging', {}).get('format', '%(asctime)s - %(levelname)s - %(message)s')
@@ -39,7 +25,16 @@ if CONFIG.get('logging', {}).get('file_enabled', True):
 
 from channels import CHANNELS
 
-from channel_mapping import normalize_channel_name
+from channel_mapping import ChannelIndex, normalize_channel_name
+from fuzzy_match import FuzzyMatcher
+from programme import BEIJING_TZ, Programme, SECONDS_PER_DAY, day_of, day_start, ensure_start_times, format_xmltv_time, start_key, weekday_start
+from schedule_merge import ScheduleMerger
+from fetch_planner import FetchPlanner
+from guide_store import GuideStore, day_label
+from xmltv_writer import XmltvWriter, render_xmltv
+
+from scheduler import SourceScheduler, SourceTask
+from http_client import get_client
 
 def fetch_ctws_programs():
     """从 ctws 获取节目单数据"""
@@ -66,7 +61,7 @@ def fetch_ctws_programs():
                 if start_time:
                     time_str = start_time.strftime('%H:%M')
                     title = program.get('title', '')
-                    standard_programs.append({'time': time_str, 'title': title})
+                    standard_programs.append(Programme(time_str, title))
             
             if standard_programs:
                 programs_dict[channel_name] = standard_programs
@@ -94,7 +89,7 @@ except ImportError as e:
     logger.error(f"导入ct模块失败: {e}")
 
 try:
-    from tm import fetch_tvmao_programs
+    from tm import fetch_tvmao_programs, upcoming_slots
     source_functions['weishi'] = fetch_tvmao_programs
     logger.info("成功导入tm模块")
 except ImportError as e:
@@ -102,7 +97,7 @@ except ImportError as e:
 
 try:
     from tmdf import fetch_all_provinces_epg
-    def fetch_difang_programs(provinces=None):
+    def fetch_difang_programs(provinces=None, weekday=None, max_workers=None):
         if provinces is None:
             # 从配置中读取省份列表
             provinces = []
@@ -114,7 +109,7 @@ try:
                 provinces = ['北京', '上海', '广东', '浙江', '江苏', '湖南', '湖北']
         
         logger.info(f"开始抓取地方台节目单，省份: {provinces}")
-        all_provinces_epg = fetch_all_provinces_epg(provinces)
+        all_provinces_epg = fetch_all_provinces_epg(provinces, weekday, max_workers)
         
         # 转换为标准格式
         programs_dict = {}
@@ -131,10 +126,13 @@ except ImportError as e:
     logger.error(f"导入tmdf模块失败: {e}")
 
 try:
-    from tm2 import fetch_all_satellite_epg
-    def fetch_tm2_programs():
+    from tm2 import CHANNEL_CODES as TM2_CHANNEL_CODES, fetch_all_satellite_epg
+    def fetch_tm2_programs(channel_list=None, weekday=None):
+        if channel_list is not None and not channel_list:
+            logger.info("tm2 没有需要补充的频道，跳过")
+            return {}
         logger.info("开始抓取tm2卫视节目单")
-        programs = fetch_all_satellite_epg()
+        programs = fetch_all_satellite_epg(channel_list, weekday)
         logger.info(f"tm2抓取完成，共获取 {len(programs)} 个频道")
         return programs
     
@@ -143,62 +141,44 @@ try:
 except ImportError as e:
     logger.error(f"导入tm2模块失败: {e}")
 
-def generate_xmltv(programs_dict):
-    # 使用北京时间(UTC+8)获取当天日期
-    today = datetime.now(timezone(timedelta(hours=8))).strftime('%Y%m%d')
-
-    tv = ET.Element('tv')
-    tv.set('generator-info-name', 'EPGO Generator')
-    tv.set('generator-info-url', 'https://github.com/37289551/epgo')
-    
-    for channel_id, channel_data in programs_dict.items():
-        channel_name = channel_data['name']
-        channel_programs = channel_data['programs']
-
-        # 将央视名称从"CCTV-X 频道名称"格式修改为"CCTV-X"格式
-        if channel_name.startswith('CCTV-'):
-            channel_name = channel_name.split(' ')[0]
+def write_xmltv(programs_dict, stream):
+    """
+    将节目单以 XMLTV 格式逐个频道写入文本流
 
-        channel = ET.SubElement(tv, 'channel')
-        channel.set('id', channel_id)
+    Returns:
+        写入的节目数
+    """
+    with XmltvWriter(stream, 'EPGO Generator', 'https://github.com/37289551/epgo') as writer:
+        for channel_id, channel_data in programs_dict.items():
+            channel_name = channel_data['name']
+            channel_programs = channel_data['programs']
 
-        display_name = ET.SubElement(channel, 'display-name')
-        display_name.text = channel_name
+            # 将央视名称从"CCTV-X 频道名称"格式修改为"CCTV-X"格式
+            if channel_name.startswith('CCTV-'):
+                channel_name = channel_name.split(' ')[0]
 
-        channel_programs.sort(key=lambda x: x['time'])
+            writer.channel(channel_id, channel_name)
 
-        for i, program in enumerate(channel_programs):
-            programme = ET.SubElement(tv, 'programme')
-            programme.set('channel', channel_id)
+            # 旧格式的节目（只有 'time'）按北京时间今天计算
+            ensure_start_times(channel_programs)
+            channel_programs.sort(key=start_key)
+            timed_programs = [program for program in channel_programs if program['start'] is not None]
 
-            start_time_str = program['time']
-            start_hour, start_minute = map(int, start_time_str.split(':'))
-            start_datetime = datetime.strptime(f"{today} {start_time_str}", "%Y%m%d %H:%M")
+            for i, program in enumerate(timed_programs):
+                start = program['start']
+                if i == len(timed_programs) - 1:
+                    # 最后一个节目结束于当天 23:59:59
+                    stop = day_of(start) + SECONDS_PER_DAY - 1
+                else:
+                    stop = timed_programs[i + 1]['start'] - 1
 
-            if i == len(channel_programs) - 1:
-                end_datetime = start_datetime.replace(hour=23, minute=59, second=59)
-            else:
-                next_program = channel_programs[i + 1]
-                next_start_time_str = next_program['time']
-                next_hour, next_minute = map(int, next_start_time_str.split(':'))
-                next_start_datetime = datetime.strptime(f"{today} {next_start_time_str}", "%Y%m%d %H:%M")
-                end_datetime = next_start_datetime - timedelta(seconds=1)
-
-            start_time = start_datetime.strftime("%Y%m%d%H%M") + "00"
-            end_time = end_datetime.strftime("%Y%m%d%H%M") + "00"
-            
-            programme.set('start', start_time)
-            programme.set('stop', end_time)
+                writer.programme(channel_id, format_xmltv_time(start), format_xmltv_time(stop), program['title'])
 
-            title = ET.SubElement(programme, 'title')
-            title.set('lang', 'zh')
-            title.text = program['title']
+    return writer.programme_count
 
-    rough_string = ET.tostring(tv, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="  ")
-    
-    return pretty_xml
+def generate_xmltv(programs_dict):
+    """生成完整的 XMLTV 字符串，写文件时请直接用 save_xmltv 流式写入"""
+    return render_xmltv(write_xmltv, programs_dict)
 
 def calculate_success_rate(programs_dict, total_channels, channel_ids=None):
     """
@@ -225,36 +205,34 @@ def calculate_success_rate(programs_dict, total_channels, channel_ids=None):
     success_rate = (success_count / count) * 100
     return round(success_rate, 2)
 
-def merge_programs(existing_programs, new_programs):
-    if not existing_programs:
-        return new_programs
-    
-    if not new_programs:
-        return existing_programs
+def create_merger():
+    """按配置创建节目单合并器；未配置优先级时沿用 sources 的顺序"""
+    merge_config = CONFIG.get('merge', {})
+    priority = merge_config.get('priority') or [source['name'] for source in CONFIG.get('sources', [])]
+    return ScheduleMerger(priority, duplicate_window=merge_config.get('duplicate_window_minutes', 5) * 60)
 
-    merged = existing_programs.copy()
+MERGER = create_merger()
 
-    existing_set = {(prog['time'], prog['title']) for prog in merged}
-    
-    for prog in new_programs:
-        prog_key = (prog['time'], prog['title'])
-        if prog_key not in existing_set:
-            merged.append(prog)
-            existing_set.add(prog_key)
+def merge_programs(existing_programs, new_programs, source=None):
+    """
+    按时间段合并节目单，重叠部分保留优先级高的源，近似重复的节目只保留一个
 
-    merged.sort(key=lambda x: x['time'])
-    
-    return merged
+    Args:
+        source: new_programs 所属的数据源名称
+    """
+    ensure_start_times(existing_programs)
+    ensure_start_times(new_programs)
+    return MERGER.merge(existing_programs, new_programs, source)
 
-def save_xmltv(xmltv_content, output_file):
+def save_xmltv(programs_dict, output_file):
     output_dir = CONFIG.get('output', {}).get('dir', 'output')
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     gz_file = os.path.join(output_dir, "epg.gz")
-    xml_bytes = xmltv_content.encode('utf-8')
-    with gzip.open(gz_file, 'wb') as f_out:
-        f_out.write(xml_bytes)
+    # 边生成边压缩，不在内存中保留完整的 XML
+    with gzip.open(gz_file, 'wt', encoding='utf-8', newline='\n') as f_out:
+        write_xmltv(programs_dict, f_out)
     
     logger.info(f"保存压缩文件: {gz_file}")
 
@@ -285,28 +263,21 @@ def clean_old_files():
     if deleted_count > 0:
         logger.info(f"共删除 {deleted_count} 个过期文件")
 
+# 频道索引在导入时构建一次，匹配时不再逐个标准化 CHANNELS 中的名称
+CHANNEL_INDEX = ChannelIndex(CHANNELS)
+FUZZY_MATCHER = FuzzyMatcher(CHANNEL_INDEX.standard_names)
+
+@lru_cache(maxsize=4096)
 def match_channel(channel_name):
     standard_input = normalize_channel_name(channel_name)
 
-    for channel_id, channel_info in CHANNELS.items():
-        standard_channel = normalize_channel_name(channel_info['name'])
-        if standard_input == standard_channel:
-            return channel_id
+    channel_id = CHANNEL_INDEX.by_standard_name.get(standard_input)
+    if channel_id:
+        return channel_id
 
     if CONFIG.get('channel_matching', {}).get('fuzzy_match', True):
-        best_match = None
-        best_score = 0
         threshold = CONFIG.get('channel_matching', {}).get('fuzzy_threshold', 0.8)
-        
-        for channel_id, channel_info in CHANNELS.items():
-            channel_name = channel_info['name']
-            standard_channel = normalize_channel_name(channel_name)
-
-            score = difflib.SequenceMatcher(None, standard_input, standard_channel).ratio()
-            
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = channel_id
+        best_match, best_score = FUZZY_MATCHER.best_match(standard_input, threshold)
         
         if best_match:
             logger.debug(f"模糊匹配成功: {channel_name} -> {CHANNELS[best_match]['name']} (相似度: {best_score:.2f})")
@@ -314,12 +285,220 @@ def match_channel(channel_name):
     
     return None
 
-def main():
-    logger.info("开始生成EPG...")
+# 源之间的依赖关系：weishi 的CCTV补充阶段需要 cctv 的匹配结果，
+# tm2 按 cctv、weishi 合并后仍缺节目的频道制定抓取计划
+# 可在配置文件中通过 depends_on 覆盖
+SOURCE_DEPENDENCIES = {
+    'weishi': ['cctv'],
+    'tm2': ['cctv', 'weishi'],
+}
+
+# 只能按本周的星期几抓取的源，窗口中下周的日期只由 cctv 提供
+WEEK_BOUND_SOURCES = {'weishi', 'difang', 'tm2'}
+
+# 各补充源能提供的频道：weishi 按频道分组（cctv/satellite）抓取，tm2 按频道代码逐个抓取
+PLANNER = FetchPlanner(match_channel)
+PLANNER.register('weishi', {channel_info['name']: channel_info.get('source') for channel_info in CHANNELS.values()})
+if source_functions['tm2']:
+    PLANNER.register('tm2', TM2_CHANNEL_CODES)
+
+def fetch_weishi_programs(source_func, cctv_channels_need_supplement, fetch_satellite=True, weekday=None):
+    filtered_programs = {}
+    if fetch_satellite:
+        logger.info("TM step one，卫视频道")
+        satellite_programs = source_func('satellite', weekday)
+        for channel_name, programs in satellite_programs.items():
+            if not (channel_name.startswith('CCTV') or channel_name.startswith('央视')):
+                filtered_programs[channel_name] = programs
+
+        logger.info(f"TM STEP ONE，处理 {len(filtered_programs)} 个非CCTV频道")
+    else:
+        logger.info("卫视频道均已有节目，跳过TM第一阶段")
+
+    if cctv_channels_need_supplement:
+        logger.info(f"TM第二阶段，补充CCTV频道")
+        cctv_programs = source_func('cctv', weekday)
+        
+        logger.info(f"TM 第二阶段，处理 {len(cctv_programs)} 个央视频道")
+        for channel_name, programs in cctv_programs.items():
+            if (channel_name.startswith('CCTV') or channel_name.startswith('央视')):
+                matched_channel = match_channel(channel_name)
+                if matched_channel in cctv_channels_need_supplement:
+                    filtered_programs[channel_name] = programs
+                    logger.info(f"  补充 {channel_name} 的节目单")
     
+    return filtered_programs
+
+def fetch_source(source_name, source_func, source_config, day, **kwargs):
+    """
+    在调度器工作线程中抓取单个源某一天的节目单
+
+    Args:
+        day: 当天零点的时间戳；cctv 按日期抓取，其余源按本周的星期几抓取
+    """
+    logger.info(f"\n=== 使用 {source_name} 源抓取 {day_label(day)} 的节目单 ===")
+    weekday = datetime.fromtimestamp(day, BEIJING_TZ).isoweekday()
+
+    if source_name == 'cctv':
+        return source_func(
+            concurrent=source_config.get('concurrent', True),
+            max_workers=source_config.get('max_workers', 8),
+            target_date=day_label(day)
+        )
+    elif source_name == 'weishi':
+        return fetch_weishi_programs(
+            source_func,
+            kwargs.get('cctv_channels_need_supplement', []),
+            kwargs.get('fetch_satellite', True),
+            weekday
+        )
+    elif source_name == 'difang':
+        # 提取省份配置（用于difang源）
+        return source_func(source_config.get('provinces'), weekday, source_config.get('max_workers', 6))
+    elif source_name == 'tm2':
+        # tm2: 补充源，只抓取抓取计划中的频道
+        return source_func(kwargs.get('channel_list'), weekday)
+    else:
+        return source_func()
+
+def guide_store():
+    output_dir = CONFIG.get('output', {}).get('dir', 'output')
+    return GuideStore(os.path.join(output_dir, CONFIG.get('output', {}).get('guide_dir', 'guide')))
+
+def window_days():
+    """节目单窗口内每天零点的时间戳，从今天开始，共 output.days 天"""
+    today = day_start()
+    days = max(1, CONFIG.get('output', {}).get('days', 1))
+    return [today + i * SECONDS_PER_DAY for i in range(days)]
+
+def in_current_week(day):
+    # 电视猫页面只能按本周的星期几（w1~w7）访问
+    return day <= weekday_start(7)
+
+def clip_to_day(programs, day):
+    """只保留在 [day, day + 1 天) 内开始的节目，旧格式的节目按当天计算，时间无法解析的节目丢弃"""
+    ensure_start_times(programs, day)
+    day_end = day + SECONDS_PER_DAY
+    return [program for program in programs
+            if program['start'] is not None and day <= program['start'] < day_end]
+
+def combine_days(day_guides):
+    """
+    把按天的节目单合并为一份，频道顺序以第一次出现为准
+
+    每天的节目单会带上跨过午夜的节目（页面末尾次日凌晨的节目、前一天延续过来的节目），
+    与相邻一天的节目重复，合并前先裁剪到当天。
+
+    Args:
+        day_guides: [(当天零点的时间戳, {频道ID: {'name', 'programs'}})]
+    """
+    combined = {}
+    for day, programs_dict in day_guides:
+        for channel_id, channel_data in programs_dict.items():
+            if channel_id not in combined:
+                combined[channel_id] = {'name': channel_data['name'], 'programs': []}
+            combined[channel_id]['programs'].extend(clip_to_day(channel_data['programs'], day))
+    return combined
+
+def write_window(store, days):
+    """读取窗口内各天的存档，生成 epg.gz 和合并报告"""
+    day_guides = []
+    for day in days:
+        guide = store.load(day)
+        if guide is None:
+            logger.warning(f"缺少 {day_label(day)} 的节目单")
+            continue
+        day_guides.append((day, guide['channels']))
+    programs_dict = combine_days(day_guides)
+
+    output_dir = CONFIG.get('output', {}).get('dir', 'output')
+    save_xmltv(programs_dict, os.path.join(output_dir, 'temp'))
+    logger.info(f"输出 {len(day_guides)} 天的节目单")
+
+    MERGER.log_report(programs_dict)
+    report_file = CONFIG.get('merge', {}).get('report_file')
+    if report_file:
+        MERGER.save_report(programs_dict, os.path.join(output_dir, report_file))
+
+def replace_window(existing_programs, new_programs, window_start, window_end, source, merger=None):
+    """
+    用新抓取的节目替换 [window_start, window_end) 内 source 提供的节目
+
+    只去掉窗口内同一来源的旧节目，新节目按优先级合并，
+    其他来源（如优先级更高的央视接口）的节目不会被覆盖。窗口外的节目不变。
+
+    Args:
+        merger: ScheduleMerger，默认为按配置创建的 MERGER
+    """
+    kept = [
+        program for program in existing_programs
+        if program.get('start') is None or not window_start <= program['start'] < window_end
+        or program.get('source') != source
+    ]
+    refreshed = [program for program in new_programs
+                 if program['start'] is not None and window_start <= program['start'] < window_end]
+    merged = (merger or MERGER).merge(kept, refreshed, source)
+    merged.sort(key=start_key)
+    return merged
+
+def refresh(store):
+    """
+    刷新模式：读取今天的节目单存档，只重新抓取电视猫当前及下一个时段，
+    替换这段时间内的节目后重新生成 epg.gz
+
+    Returns:
+        没有今天的节目单存档或 weishi 源不可用时返回 False
+    """
+    if not source_functions['weishi']:
+        logger.warning("weishi 源不可用，无法刷新")
+        return False
+
+    today = day_start()
+    guide = store.load(today)
+    if guide is None:
+        return False
+    programs_dict = guide['channels']
+
+    slots = upcoming_slots(CONFIG.get('refresh', {}).get('slot_count', 2))
+    window_start = today + slots[0] * 3600
+    window_end = today + (slots[-1] + 2) * 3600
+    logger.info(f"刷新时段: {', '.join(f'{slot:02d}:00' for slot in slots)}")
+
+    refreshed = {}
+    for channel_type in ('cctv', 'satellite'):
+        refreshed.update(fetch_tvmao_programs(channel_type, slots=slots, revalidate=True))
+
+    updated_count = 0
+    for channel_name, programs in refreshed.items():
+        channel_id = match_channel(channel_name)
+        if channel_id not in programs_dict or not programs:
+            continue
+        programs_dict[channel_id]['programs'] = replace_window(
+            programs_dict[channel_id]['programs'], programs, window_start, window_end, 'weishi'
+        )
+        updated_count += 1
+    logger.info(f"刷新了 {updated_count} 个频道的节目")
+
+    store.save(today, programs_dict, guide['partial'])
+    write_window(store, window_days())
+    get_client().log_report()
+    return True
+
+def fetch_day(day):
+    """
+    抓取并合并某一天的节目单
+
+    Args:
+        day: 当天零点的时间戳
+
+    Returns:
+        (节目单字典, 是否有源因不在本周内被跳过)
+    """
+    logger.info(f"\n===== 抓取 {day_label(day)} 的节目单 =====")
     total_channels = len(CHANNELS)
     standard_channel_ids = set(CHANNELS.keys())  # 标准频道ID集合（用于成功率计算排除difang新增频道）
     logger.info(f"总共有 {total_channels} 个频道需要抓取")
+    in_week = in_current_week(day)
 
     final_programs_dict = {}
     for channel_id, channel_info in CHANNELS.items():
@@ -334,73 +513,72 @@ def main():
         source_name = source_config['name']
         enabled = source_config.get('enabled', True)
         if enabled and source_name in source_functions:
-            # 提取省份配置（用于difang源）
-            provinces = source_config.get('provinces')
-            sources.append((source_name, source_functions[source_name], provinces))
+            sources.append((source_name, source_functions[source_name], source_config))
 
     if not sources:
         sources = [
-            ('cctv', source_functions['cctv'], None),
-            ('weishi', source_functions['weishi'], None),
-            ('difang', source_functions['difang'], None)
+            ('cctv', source_functions['cctv'], {}),
+            ('weishi', source_functions['weishi'], {}),
+            ('difang', source_functions['difang'], {})
         ]
 
     success_threshold = CONFIG.get('success_threshold', 80.0)
     logger.info(f"成功率阈值: {success_threshold}%")
 
-    cctv_matched_count = 0
+    state = {'cctv_matched_count': 0}
+
+    def prepare_weishi():
+        # 在调度线程中读取CCTV合并结果，决定TM第二阶段需要补充的频道
+        fetch_satellite = 'satellite' in PLANNER.plan('weishi', final_programs_dict).values()
+        cctv_matched_count = state['cctv_matched_count']
+        if cctv_matched_count >= 18:
+            logger.info(f"CCTV已匹配 {cctv_matched_count} 个频道，跳过TM第二阶段CCTV频道抓取")
+            return {'cctv_channels_need_supplement': [], 'fetch_satellite': fetch_satellite}
+
+        cctv_channels_need_supplement = []
+        for channel_id, channel_data in final_programs_dict.items():
+            if (channel_data['name'].startswith('CCTV') or channel_data['name'].startswith('央视')) and len(channel_data['programs']) == 0:
+                cctv_channels_need_supplement.append(channel_id)
+        return {'cctv_channels_need_supplement': cctv_channels_need_supplement, 'fetch_satellite': fetch_satellite}
+
+    def prepare_tm2():
+        # 只抓取合并结果中仍缺节目的频道
+        return {'channel_list': PLANNER.plan('tm2', final_programs_dict)}
 
-    for source_name, source_func, provinces in sources:
+    preparers = {'weishi': prepare_weishi, 'tm2': prepare_tm2}
+
+    tasks = []
+    for source_name, source_func, source_config in sources:
         if not source_func:
             logger.warning(f"跳过不可用的源: {source_name}")
             continue
-        
-        logger.info(f"\n=== 使用 {source_name} 源抓取节目单 ===")
+        if source_name in WEEK_BOUND_SOURCES and not in_week:
+            logger.info(f"{day_label(day)} 不在本周内，跳过源: {source_name}")
+            continue
 
-        try:
-            if source_name == 'cctv':
-                source_programs = source_func()
-            elif source_name == 'weishi':
-                logger.info("TM step one，卫视频道")
-                satellite_programs = source_func('satellite')
-                filtered_programs = {}
-                for channel_name, programs in satellite_programs.items():
-                    if not (channel_name.startswith('CCTV') or channel_name.startswith('央视')):
-                        filtered_programs[channel_name] = programs
-                
-                logger.info(f"TM STEP ONE，处理 {len(filtered_programs)} 个非CCTV频道")
+        depends_on = source_config.get('depends_on', SOURCE_DEPENDENCIES.get(source_name, []))
+        prepare = preparers.get(source_name)
+        if source_name == 'tm2' and not source_config.get('targeted', True):
+            # 不制定抓取计划时 tm2 抓取全部频道，无需等待其他源
+            prepare = None
+            depends_on = source_config.get('depends_on', [])
+        run = partial(fetch_source, source_name, source_func, source_config, day)
+        tasks.append(SourceTask(source_name, run, depends_on=depends_on, prepare=prepare))
+
+    scheduler_config = CONFIG.get('scheduler', {})
+    scheduler = SourceScheduler(
+        tasks,
+        max_workers=scheduler_config.get('max_workers'),
+        parallel=scheduler_config.get('parallel', True),
+        # 成功率达标后停止仍在运行的源，避免它们占用下一天抓取的限速额度
+        cancel_event=get_client().cancelled
+    )
+
+    for task, future in scheduler.run():
+        source_name = task.name
 
-                skip_cctv_supplement = False
-                if cctv_matched_count >= 18:
-                    skip_cctv_supplement = True
-                    logger.info(f"CCTV已匹配 {cctv_matched_count} 个频道，跳过TM第二阶段CCTV频道抓取")
-                
-                if not skip_cctv_supplement:
-                    cctv_channels_need_supplement = []
-                    for channel_id, channel_data in final_programs_dict.items():
-                        if (channel_data['name'].startswith('CCTV') or channel_data['name'].startswith('央视')) and len(channel_data['programs']) == 0:
-                            cctv_channels_need_supplement.append(channel_id)
-                    
-                    if cctv_channels_need_supplement:
-                        logger.info(f"TM第二阶段，补充CCTV频道")
-                        cctv_programs = source_func('cctv')
-                        
-                        logger.info(f"TM 第二阶段，处理 {len(cctv_programs)} 个央视频道")
-                        for channel_name, programs in cctv_programs.items():
-                            if (channel_name.startswith('CCTV') or channel_name.startswith('央视')):
-                                matched_channel = match_channel(channel_name)
-                                if matched_channel in cctv_channels_need_supplement:
-                                    filtered_programs[channel_name] = programs
-                                    logger.info(f"  补充 {channel_name} 的节目单")
-                
-                source_programs = filtered_programs
-            elif source_name == 'difang':
-                source_programs = source_func(provinces)
-            elif source_name == 'tm2':
-                # tm2: 补充源，用于补充卫视频道
-                source_programs = source_func()
-            else:
-                source_programs = source_func()
+        try:
+            source_programs = future.result()
             
             logger.info(f"{source_name} 源完成，获取到 {len(source_programs)} 个频道的节目单")
 
@@ -440,21 +618,22 @@ def main():
                 logger.info(f"{source_name} 源匹配到 {len(standard_programs)} 个频道")
             
             if source_name == 'cctv':
-                cctv_matched_count = len(standard_programs)
-                logger.info(f"CCTV源匹配频道数量: {cctv_matched_count}")
+                state['cctv_matched_count'] = len(standard_programs)
+                logger.info(f"CCTV源匹配频道数量: {state['cctv_matched_count']}")
             
             for channel_id, channel_data in standard_programs.items():
                 if channel_id in final_programs_dict:
                     # 已存在频道，合并节目单
                     final_programs_dict[channel_id]['programs'] = merge_programs(
                         final_programs_dict[channel_id]['programs'],
-                        channel_data['programs']
+                        channel_data['programs'],
+                        source_name
                     )
                 elif source_name == 'difang':
                     # 地方台新频道，直接添加
                     final_programs_dict[channel_id] = {
                         'name': channel_data['name'],
-                        'programs': channel_data['programs']
+                        'programs': merge_programs([], channel_data['programs'], source_name)
                     }
             
             # 成功率检查：difang和tm2不受成功率限制，始终执行
@@ -465,48 +644,71 @@ def main():
 
                 if current_rate >= success_threshold:
                     logger.info(f"成功率已达到 {success_threshold}% 以上，停止后续源的调用")
+                    scheduler.cancel_pending()
                     break
             # difang 和 tm2 不参与成功率检查，始终执行
             
         except Exception as e:
             logger.error(f"使用 {source_name} 源抓取节目单失败: {e}", exc_info=True)
 
-    xmltv_content = generate_xmltv(final_programs_dict)
-
-    output_dir = CONFIG.get('output', {}).get('dir', 'output')
-    output_file = os.path.join(output_dir, 'temp') 
-
-    save_xmltv(xmltv_content, output_file)
-
-    
-    logger.info(f"\nEPG生成完成")
-    logger.info(f"共处理 {len(final_programs_dict)} 个频道")
-    
     total_programs = 0
-    success_channels = 0
     for channel_id, channel_data in final_programs_dict.items():
         program_count = len(channel_data['programs'])
         total_programs += program_count
-        if program_count > 0:
-            success_channels += 1
-        else:
+        if program_count == 0:
             logger.warning(f"频道 {channel_data['name']} 未抓取到任何节目")
-    
+
     final_rate = calculate_success_rate(final_programs_dict, total_channels, standard_channel_ids)
-    logger.info(f"最终成功率: {final_rate}%")
-    logger.info(f"共抓取 {total_programs} 个节目")
+    logger.info(f"{day_label(day)} 最终成功率: {final_rate}%，共抓取 {total_programs} 个节目")
 
     if final_rate < success_threshold:
         logger.warning(f"最终成功率 {final_rate}% 低于阈值 {success_threshold}%")
+
+    incomplete = not in_week and any(name in WEEK_BOUND_SOURCES for name, _, _ in sources)
+    return final_programs_dict, incomplete
+
+def main(refresh_only=False):
+    store = guide_store()
+
+    if refresh_only:
+        logger.info("刷新EPG...")
+        if refresh(store):
+            logger.info("EPG刷新完成")
+            return
+        logger.warning("没有今天的节目单存档，改为完整抓取")
+
+    logger.info("开始生成EPG...")
+
+    days = window_days()
+    today = days[0]
+    for day in days:
+        guide = store.load(day)
+        if guide is not None and day != today and not (guide['partial'] and in_current_week(day)):
+            logger.info(f"复用已保存的 {day_label(day)} 节目单")
+            continue
+        # 今天的节目可能临时调整，每次运行都向服务器确认，不直接使用仍新鲜的缓存
+        with get_client().revalidating(day == today):
+            programs_dict, incomplete = fetch_day(day)
+        store.save(day, programs_dict, incomplete)
+
+    store.prune(CONFIG.get('output', {}).get('keep_days', 7))
+    write_window(store, days)
+
+    get_client().log_report()
     
     logger.info("EPG生成任务完成")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='生成EPG')
+    parser.add_argument('--refresh', action='store_true',
+                        help='只重新抓取当前及下一个时段，更新上次完整运行的节目单')
+    args = parser.parse_args()
     try:
-        main()
+        main(refresh_only=args.refresh)
     except Exception as e:
         import traceback
         print(f"Error: {e}")
 
         traceback.print_exc()
+        sys.exit(1)
 
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+补充源的抓取计划
+
+记录每个数据源能提供哪些标准频道（如 tm2 的 CHANNEL_CODES），补充源开始前
+只挑出合并结果中仍没有节目的频道去抓取，而不是遍历整个频道列表。
+"""
+
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class FetchPlanner:
+    """
+    抓取计划
+
+    Args:
+        match_func: 频道名称 -> 标准频道ID（未匹配时返回 None），如 epgo.match_channel
+    """
+
+    def __init__(self, match_func):
+        self.match_func = match_func
+        # 源名称 -> {标准频道ID: {源内频道名称: 源内参数}}
+        self.catalogs = {}
+
+    def register(self, source, catalog):
+        """
+        登记数据源能提供的频道
+
+        Args:
+            catalog: {源内频道名称: 源内参数}，如 tm2 的 {频道名称: 频道代码}
+        """
+        served = defaultdict(dict)
+        unmatched = 0
+        for name, key in catalog.items():
+            channel_id = self.match_func(name)
+            if channel_id:
+                served[channel_id][name] = key
+            else:
+                unmatched += 1
+        self.catalogs[source] = dict(served)
+        logger.debug(f"源 {source} 可提供 {len(served)} 个标准频道，{unmatched} 个频道未匹配")
+
+    def missing_channels(self, source, programs_dict):
+        """返回该源能提供、但合并结果中仍没有节目的标准频道ID"""
+        return [
+            channel_id for channel_id in self.catalogs.get(source, {})
+            if not programs_dict.get(channel_id, {}).get('programs')
+        ]
+
+    def plan(self, source, programs_dict):
+        """
+        返回该源需要抓取的部分频道列表
+
+        Returns:
+            {源内频道名称: 源内参数}；源未登记时返回 None，表示抓取全部频道
+        """
+        catalog = self.catalogs.get(source)
+        if catalog is None:
+            return None
+
+        selected = {}
+        missing = self.missing_channels(source, programs_dict)
+        for channel_id in missing:
+            selected.update(catalog[channel_id])
+        logger.info(f"{source} 源可提供的 {len(catalog)} 个频道中仍缺 {len(missing)} 个，"
+                    f"计划抓取 {len(selected)} 个频道")
+        return selected
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+频道名称模糊匹配
+
+与逐个计算 difflib.SequenceMatcher(None, 输入, 候选).ratio() 取最高分的结果完全一致，
+但只对可能达到阈值的候选计算相似度：
+
+ratio = 2 * 匹配字符数 / 两个名称的总长度，而匹配字符数不会超过两个名称共有字符的数量
+（按字符计数取较小值，即 SequenceMatcher.quick_ratio 的算法）。用字符倒排索引一次算出
+所有候选的共有字符数，得到每个候选的相似度上限；上限低于阈值或低于当前最高分的候选
+直接跳过，按上限从高到低计算，上限不足以超过当前最高分时提前结束。
+"""
+
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+
+class FuzzyMatcher:
+    """
+    模糊匹配器
+
+    Args:
+        candidates: [(键, 名称)]，相似度相同时取靠前的候选，与按顺序遍历一致
+    """
+
+    def __init__(self, candidates):
+        self.keys = []
+        self.names = []
+        # 字符 -> [(候选序号, 该字符在候选名称中的个数)]
+        self.postings = defaultdict(list)
+        for index, (key, name) in enumerate(candidates):
+            self.keys.append(key)
+            self.names.append(name)
+            for char, count in Counter(name).items():
+                self.postings[char].append((index, count))
+
+    def best_match(self, query, threshold):
+        """
+        返回相似度最高且不低于阈值的候选
+
+        Returns:
+            (键, 相似度)，没有达到阈值的候选时返回 (None, 0)
+        """
+        shared = defaultdict(int)
+        for char, query_count in Counter(query).items():
+            for index, count in self.postings.get(char, ()):
+                shared[index] += min(query_count, count)
+
+        query_length = len(query)
+        bounds = []
+        for index, common in shared.items():
+            # 与 SequenceMatcher 计算 ratio 的方式相同，保证上限与实际分数可以直接比较
+            bound = 2.0 * common / (query_length + len(self.names[index]))
+            if bound >= threshold:
+                bounds.append((-bound, index))
+        bounds.sort()
+
+        best_index = None
+        best_score = 0
+        for negative_bound, index in bounds:
+            if -negative_bound < best_score:
+                break
+            score = SequenceMatcher(None, query, self.names[index]).ratio()
+            if score < threshold:
+                continue
+            # 分数相同时保留序号较小的候选
+            if score > best_score or (best_index is not None and score == best_score and index < best_index):
+                best_score = score
+                best_index = index
+
+        if best_index is None:
+            return None, 0
+        return self.keys[best_index], best_score
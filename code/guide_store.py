@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按天保存合并后的节目单
+
+每天的节目单单独存为一个文件（YYYYmmdd.pkl），之后的运行直接复用已抓取的日期，
+只抓取新进入窗口的一天并刷新今天；刷新模式读取今天的节目单，只替换重新抓取的时段。
+"""
+
+import logging
+import os
+import pickle
+import re
+from datetime import datetime
+
+from programme import BEIJING_TZ, SECONDS_PER_DAY, day_start
+
+logger = logging.getLogger(__name__)
+
+DAY_FILE = re.compile(r'^(\d{8})\.pkl$')
+
+
+def day_label(day):
+    """零点时间戳 -> 'YYYYmmdd'（北京时间）"""
+    return datetime.fromtimestamp(day, BEIJING_TZ).strftime('%Y%m%d')
+
+
+class GuideStore:
+    """
+    节目单存档
+
+    Args:
+        directory: 存档目录
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, day):
+        return os.path.join(self.directory, f"{day_label(day)}.pkl")
+
+    def save(self, day, programs_dict, partial=False):
+        """
+        保存某天的节目单，先写临时文件再替换，避免中途失败留下不完整的存档
+
+        Args:
+            day: 当天零点的时间戳
+            programs_dict: {频道ID: {'name', 'programs'}}
+            partial: 是否有源因日期超出范围未能抓取，之后可以补抓
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(day)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'day': day, 'partial': partial, 'channels': programs_dict}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"保存 {day_label(day)} 的节目单: {path}")
+
+    def load(self, day):
+        """
+        读取某天的节目单
+
+        Returns:
+            {'day', 'partial', 'channels'}；没有存档或无法读取时返回 None
+        """
+        path = self.path(day)
+        try:
+            with open(path, 'rb') as f:
+                guide = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logger.warning(f"读取节目单存档失败: {path} ({e})")
+            return None
+
+        if guide.get('day') != day:
+            logger.warning(f"节目单存档日期不符，忽略: {path}")
+            return None
+        return guide
+
+    def prune(self, keep_days):
+        """删除早于今天 keep_days 天以上的存档，返回删除的数量"""
+        if not os.path.isdir(self.directory):
+            return 0
+
+        cutoff = day_label(day_start() - keep_days * SECONDS_PER_DAY)
+        removed = 0
+        for filename in os.listdir(self.directory):
+            match = DAY_FILE.match(filename)
+            if match and match.group(1) < cutoff:
+                os.remove(os.path.join(self.directory, filename))
+                removed += 1
+                logger.info(f"删除过期节目单存档: {filename}")
+        return removed
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML 解析辅助
+
+优先使用 lxml 解析（未安装时退回 html.parser），节目页面只构建解析函数用到的部分：
+频道名称来自 h1/title，节目列表在 ul#pgrow 中，没有 pgrow 时通用解析使用全部 li；
+只有需要面包屑或全文时才解析整页。
+"""
+
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+    logger.warning("未安装 lxml，使用 html.parser 解析页面")
+
+# 节目页面只保留这些标签（含其子树）。SoupStrainer 无法跨版本按“ul 且 id=pgrow”筛选，
+# 因此保留全部 ul；同时保留 li，没有 pgrow 时通用解析无需再解析一次
+PROGRAM_PAGE_TAGS = ('h1', 'title', 'ul', 'li')
+
+
+def make_soup(html, parse_only=None):
+    """用可用的最快解析器构建 BeautifulSoup"""
+    return BeautifulSoup(html, PARSER, parse_only=parse_only)
+
+
+class ProgramPage:
+    """
+    按需解析的节目页面
+
+    提供 find / find_all / get_text，可直接传给 tm2、tmdf 中接收 soup 的解析函数：
+    查找 PROGRAM_PAGE_TAGS 中的标签时使用精简的解析结果，其余查找和取全文时才解析整页。
+    结果与对整页 soup 调用相同。
+
+    Args:
+        html: 页面文本
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.soup = make_soup(html, SoupStrainer(list(PROGRAM_PAGE_TAGS)))
+        self._full_soup = None
+
+    @property
+    def full_soup(self):
+        if self._full_soup is None:
+            logger.debug("解析整页")
+            self._full_soup = make_soup(self.html)
+        return self._full_soup
+
+    def _soup_for(self, name):
+        if name in PROGRAM_PAGE_TAGS:
+            return self.soup
+        return self.full_soup
+
+    def find(self, name=None, *args, **kwargs):
+        return self._soup_for(name).find(name, *args, **kwargs)
+
+    def find_all(self, name=None, *args, **kwargs):
+        return self._soup_for(name).find_all(name, *args, **kwargs)
+
+    def get_text(self, *args, **kwargs):
+        return self.full_soup.get_text(*args, **kwargs)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP 响应磁盘缓存
+
+按 URL 缓存成功的响应（按星期参数化的页面额外带上日期），
+超过 cache.expire_hours 后过期，总大小超过 cache.max_size_mb 时按最近最少使用淘汰。
+抓取中途失败后重跑时，已抓过的页面直接从缓存读取。
+
+带 ETag / Last-Modified 的条目超过 cache.revalidate_minutes 后不直接丢弃，
+而是由 http_client 发送条件请求再验证；返回 304 时继续使用本地副本，
+并复用与该副本一起保存的解析结果。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from settings import get_section
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPIRE_HOURS = 24
+DEFAULT_MAX_SIZE_MB = 200
+
+# 按星期参数化的页面：tm 的 w{weekday}-h{slot}.html、tm2/tmdf 的 {code}-w{weekday}.html
+WEEKDAY_PAGE_PATTERN = re.compile(r'(?:^|[-/])w\d+(?:-h\d+)?\.html$')
+
+# 需要随响应一起缓存的响应头
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def cache_date():
+    return datetime.now(timezone(timedelta(hours=8))).strftime('%Y%m%d')
+
+
+class ResponseCache:
+    """
+    响应缓存
+
+    Args:
+        cache_config: cache 配置节，默认读取 config.yaml
+    """
+
+    def __init__(self, cache_config=None):
+        if cache_config is None:
+            cache_config = get_section('cache')
+
+        self.enabled = cache_config.get('enabled', True)
+        self.expire_seconds = cache_config.get('expire_hours', DEFAULT_EXPIRE_HOURS) * 3600
+        # 带校验信息的条目超过该时间后用条件请求再验证，未配置时与过期时间相同
+        revalidate_minutes = cache_config.get('revalidate_minutes')
+        self.revalidate_seconds = revalidate_minutes * 60 if revalidate_minutes is not None else self.expire_seconds
+        self.max_size = cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB) * 1024 * 1024
+        self.cache_dir = os.path.join(cache_config.get('dir', 'cache'), 'http')
+
+        self._lock = threading.Lock()
+        self._total_size = None
+
+    def key_for(self, url):
+        path = url.split('?', 1)[0]
+        if WEEKDAY_PAGE_PATTERN.search(path):
+            # 同一星期页面每周内容不同，按日期区分
+            raw_key = f"{url}|{cache_date()}"
+        else:
+            raw_key = url
+        return hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        directory = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(directory, f"{key}.json"), os.path.join(directory, f"{key}.body")
+
+    def _parsed_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.parsed")
+
+    def lookup(self, url):
+        """
+        查找缓存
+
+        Returns:
+            (响应, 是否新鲜)：新鲜的响应可直接使用；不新鲜但带校验信息的响应需要再验证；
+            没有可用缓存时返回 (None, False)
+        """
+        if not self.enabled:
+            return None, False
+
+        key = self.key_for(url)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            age = time.time() - meta['stored_at']
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None, False
+
+        has_validators = 'ETag' in meta['headers'] or 'Last-Modified' in meta['headers']
+        if age <= self.revalidate_seconds or (not has_validators and age <= self.expire_seconds):
+            fresh = True
+        elif has_validators:
+            fresh = False
+        else:
+            return None, False
+
+        # 更新访问时间，用于LRU淘汰
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        return self._build_response(meta, body, key), fresh
+
+    def get(self, url):
+        """返回新鲜的缓存响应，没有则返回 None"""
+        response, fresh = self.lookup(url)
+        return response if fresh else None
+
+    def refresh(self, url):
+        """再验证返回 304 后，重置条目的保存时间"""
+        meta_path, _ = self._paths(self.key_for(url))
+        with self._lock:
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                meta['stored_at'] = time.time()
+                with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                os.replace(meta_path + '.tmp', meta_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"更新缓存失败: {url}, 错误: {e}")
+
+    def get_parsed(self, key, name):
+        """返回与缓存条目一起保存的解析结果，没有或文件损坏时返回 None"""
+        try:
+            with open(self._parsed_path(key), 'rb') as f:
+                return pickle.load(f).get(name)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 损坏或由不兼容版本写入的文件（如 unsupported pickle protocol）当作没有，重新解析
+            logger.warning(f"读取解析缓存失败: {key}, 错误: {e}")
+            return None
+
+    def put_parsed(self, key, name, value):
+        path = self._parsed_path(key)
+        with self._lock:
+            try:
+                with open(path, 'rb') as f:
+                    parsed = pickle.load(f)
+                if not isinstance(parsed, dict):
+                    parsed = {}
+            except Exception:
+                parsed = {}
+            parsed[name] = value
+            try:
+                with open(path + '.tmp', 'wb') as f:
+                    pickle.dump(parsed, f)
+                os.replace(path + '.tmp', path)
+            except Exception as e:
+                logger.warning(f"写入解析缓存失败: {e}")
+
+    def put(self, url, response):
+        """保存响应，返回缓存键；未启用缓存时返回 None"""
+        if not self.enabled:
+            return None
+
+        key = self.key_for(url)
+        meta_path, body_path = self._paths(key)
+        body = response.content
+        meta = {
+            'url': url,
+            'final_url': response.url,
+            'status': response.status_code,
+            'encoding': response.encoding or response.apparent_encoding,
+            'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+            'stored_at': time.time(),
+        }
+
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+                old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+                # 先写入临时文件再替换，避免并发读到写了一半的缓存
+                with open(body_path + '.tmp', 'wb') as f:
+                    f.write(body)
+                os.replace(body_path + '.tmp', body_path)
+                with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                os.replace(meta_path + '.tmp', meta_path)
+                # 内容已更新，旧的解析结果作废
+                if os.path.exists(self._parsed_path(key)):
+                    os.remove(self._parsed_path(key))
+            except OSError as e:
+                logger.warning(f"写入缓存失败: {url}, 错误: {e}")
+                return None
+
+            if self._total_size is not None:
+                self._total_size += len(body) - old_size
+            self._evict_if_needed()
+        return key
+
+    def invalidate(self, url):
+        """删除某URL的缓存，用于接口返回错误内容的情况"""
+        key = self.key_for(url)
+        meta_path, body_path = self._paths(key)
+        with self._lock:
+            for path in (meta_path, body_path, self._parsed_path(key)):
+                try:
+                    size = os.path.getsize(path) if path == body_path else 0
+                    os.remove(path)
+                    if self._total_size is not None:
+                        self._total_size -= size
+                except OSError:
+                    pass
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, filename)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    size = os.path.getsize(body_path)
+                    atime = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                entries.append((atime, size, meta_path, body_path))
+        return entries
+
+    def _evict_if_needed(self):
+        if self._total_size is None:
+            self._total_size = sum(size for _, size, _, _ in self._scan())
+        if self._total_size <= self.max_size:
+            return
+
+        entries = sorted(self._scan())
+        self._total_size = sum(size for _, size, _, _ in entries)
+        evicted = 0
+        for atime, size, meta_path, body_path in entries:
+            if self._total_size <= self.max_size:
+                break
+            for path in (meta_path, body_path, meta_path[:-len('.json')] + '.parsed'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_size -= size
+            evicted += 1
+        logger.info(f"缓存超过 {self.max_size // (1024 * 1024)} MB，淘汰 {evicted} 个最久未使用的条目")
+
+    def _build_response(self, meta, body, key):
+        response = requests.Response()
+        response._content = body
+        response.status_code = meta['status']
+        response.url = meta['final_url']
+        response.encoding = meta['encoding']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.from_cache = True
+        response.cache_key = key
+        return response
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享 HTTP 客户端
+
+所有数据源都通过这里发请求：每个主机一个带连接池的 keep-alive 会话，
+超时、重试次数、重试间隔和默认请求头来自 config.yaml 的 network 配置，
+并可按主机覆盖。成功的响应写入磁盘缓存（见 http_cache）。
+同一主机同时进行的请求数可以设上限，多个线程并发抓取时由这里统一限制。
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import ResponseCache
+from rate_limit import RateLimiter
+from settings import get_section, get_host_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 15
+DEFAULT_RETRY = 3
+DEFAULT_RETRY_DELAY = 2
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class HttpClient:
+    """
+    按主机复用连接的 HTTP 客户端
+
+    Args:
+        network_config: network 配置节，默认读取 config.yaml
+        cache: 响应缓存，默认按 config.yaml 的 cache 配置创建
+    """
+
+    def __init__(self, network_config=None, cache=None):
+        if network_config is None:
+            network_config = get_section('network')
+
+        self.timeout = network_config.get('timeout', DEFAULT_TIMEOUT)
+        # retry 为总尝试次数，与各模块原 make_request 的含义一致
+        self.retry = network_config.get('retry', DEFAULT_RETRY)
+        self.retry_delay = network_config.get('retry_delay', DEFAULT_RETRY_DELAY)
+        self.headers = dict(network_config.get('headers') or {})
+
+        pool_config = network_config.get('pool') or {}
+        self.pool_maxsize = pool_config.get('maxsize', DEFAULT_POOL_MAXSIZE)
+
+        # 按主机覆盖的配置，键为主机名、其后缀或入口URL的环境变量名
+        self.host_config = network_config.get('hosts') or {}
+
+        # 每个主机同时进行的请求数上限，不填则不限制
+        self.max_concurrency = network_config.get('max_concurrency')
+
+        # 每个主机的请求间隔统一在这里控制，各模块不再自行 sleep
+        self.rate_limiter = RateLimiter(network_config.get('rate_limit'))
+
+        self.cache = cache if cache is not None else ResponseCache()
+
+        self.stats = {
+            'requests': 0, 'failures': 0, 'cache_hits': 0,
+            'revalidated': 0, 'bytes_saved': 0, 'parses_saved': 0,
+        }
+        self._sessions = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        # 设置后不再发出新的请求（缓存仍可命中），用于停止调度器中仍在运行的源
+        self.cancelled = threading.Event()
+        # 设置后所有请求都按 revalidate=True 处理，见 revalidating()
+        self._revalidate_all = threading.Event()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _host_settings(self, host):
+        return get_host_settings(host, self.host_config)
+
+    def _request_headers(self, host, headers=None):
+        """默认请求头，依次由该主机配置的 headers、调用方传入的 headers 覆盖"""
+        request_headers = dict(self.headers)
+        request_headers.update(self._host_settings(host).get('headers') or {})
+        if headers:
+            request_headers.update(headers)
+        return request_headers
+
+    def session_for(self, url):
+        """返回该URL所在主机的共享会话"""
+        host = urlsplit(url).hostname or ''
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                host_settings = self._host_settings(host)
+                pool_maxsize = host_settings.get('pool_maxsize', self.pool_maxsize)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+                logger.debug(f"为主机 {host} 创建连接池，大小: {pool_maxsize}")
+        return session
+
+    def _host_slot(self, host):
+        """返回限制该主机并发请求数的信号量，不限制时返回 None"""
+        if host in self._slots:
+            return self._slots[host]
+
+        with self._lock:
+            if host not in self._slots:
+                limit = self._host_settings(host).get('max_concurrency', self.max_concurrency)
+                self._slots[host] = threading.BoundedSemaphore(limit) if limit else None
+                if limit:
+                    logger.debug(f"主机 {host} 最多同时进行 {limit} 个请求")
+        return self._slots[host]
+
+    def get(self, url, headers=None, timeout=None, retry=None, retry_delay=None,
+            session=None, allow_redirects=True, validate=None, passthrough_status=(),
+            use_cache=True, revalidate=False):
+        """
+        发送GET请求，失败时按配置重试
+
+        Args:
+            headers: 额外请求头，覆盖配置中的默认请求头和该主机的请求头
+            timeout/retry/retry_delay: 覆盖配置（retry 为总尝试次数）
+            session: 可选，显式指定会话；默认使用该主机的共享会话
+            validate: 可选，校验响应的函数，返回错误描述字符串表示本次尝试失败
+            passthrough_status: 不视为失败、直接返回给调用方的状态码，如 (404,)
+            use_cache: 是否读写响应缓存
+            revalidate: 即使缓存仍新鲜也向服务器确认（有校验信息时发送条件请求）
+
+        Returns:
+            requests.Response（from_cache 属性表示是否来自缓存），所有尝试均失败时返回 None
+        """
+        revalidate = revalidate or self._revalidate_all.is_set()
+        stale = None
+        if use_cache:
+            cached, fresh = self.cache.lookup(url)
+            if cached is not None and fresh and not revalidate:
+                self._count('cache_hits')
+                logger.debug(f"命中缓存: {url}")
+                return cached
+            stale = cached
+
+        host = urlsplit(url).hostname or ''
+        host_settings = self._host_settings(host)
+        if timeout is None:
+            timeout = host_settings.get('timeout', self.timeout)
+        if retry is None:
+            retry = host_settings.get('retry', self.retry)
+        if retry_delay is None:
+            retry_delay = host_settings.get('retry_delay', self.retry_delay)
+        retry = max(1, retry)
+
+        request_headers = self._request_headers(host, headers)
+        if stale is not None:
+            # 条件请求：内容未变时服务器返回 304，继续使用本地副本
+            if 'ETag' in stale.headers:
+                request_headers['If-None-Match'] = stale.headers['ETag']
+            if 'Last-Modified' in stale.headers:
+                request_headers['If-Modified-Since'] = stale.headers['Last-Modified']
+
+        if session is None:
+            session = self.session_for(url)
+
+        slot = self._host_slot(host)
+        for attempt in range(retry):
+            if self.cancelled.is_set():
+                logger.debug(f"请求已取消: {url}")
+                return None
+            if slot is not None:
+                slot.acquire()
+            try:
+                # 先占用并发名额再取令牌，等待名额期间不消耗令牌
+                self.rate_limiter.acquire(host)
+                self._count('requests')
+                response = session.get(url, headers=request_headers, timeout=timeout,
+                                       allow_redirects=allow_redirects)
+                response.from_cache = False
+                if stale is not None and response.status_code == 304:
+                    self.cache.refresh(url)
+                    self._count('revalidated')
+                    self._count('bytes_saved', len(stale.content))
+                    logger.debug(f"内容未变化(304)，使用本地副本: {url}")
+                    return stale
+                if response.status_code in passthrough_status:
+                    return response
+                response.raise_for_status()
+
+                error = validate(response) if validate else None
+                if not error:
+                    if use_cache:
+                        response.cache_key = self.cache.put(url, response)
+                    return response
+                logger.warning(f"{error}: {url}")
+            except requests.RequestException as e:
+                error = e
+                logger.warning(f"请求失败 (尝试 {attempt + 1}/{retry}): {url}, 错误: {e}")
+            finally:
+                if slot is not None:
+                    slot.release()
+
+            if attempt < retry - 1:
+                wait_time = retry_delay * (attempt + 1)
+                logger.info(f"等待 {wait_time} 秒后重试... ({attempt + 1}/{retry})")
+                time.sleep(wait_time)
+
+        self._count('failures')
+        logger.error(f"所有重试均失败: {url}, 错误: {error}")
+        return None
+
+    @contextmanager
+    def revalidating(self, enabled=True):
+        """
+        在此期间各线程的请求即使缓存仍新鲜也向服务器确认（有校验信息时发送条件请求）
+
+        用于每次运行都重新抓取今天的节目单，各数据源不必逐个传递 revalidate 参数。
+        """
+        if not enabled:
+            yield
+            return
+        self._revalidate_all.set()
+        try:
+            yield
+        finally:
+            self._revalidate_all.clear()
+
+    def warm_up(self, url, headers=None, timeout=10):
+        """访问首页建立会话（获取cookie），失败不影响后续请求"""
+        host = urlsplit(url).hostname or ''
+        request_headers = self._request_headers(host, headers)
+        self.rate_limiter.acquire(host)
+        try:
+            self.session_for(url).get(url, headers=request_headers, timeout=timeout)
+            logger.info("已访问首页建立会话")
+            return True
+        except Exception as e:
+            logger.warning(f"访问首页失败: {e}")
+            return False
+
+    def parse(self, response, name, parse_func):
+        """
+        解析响应，并把结果与缓存条目一起保存
+
+        响应来自缓存（包括 304 再验证）且已有同名解析结果时直接复用，不再重新解析。
+
+        Args:
+            name: 解析结果名称，解析逻辑变化时应更换名称
+            parse_func: 接收响应、返回可序列化结果的解析函数
+        """
+        parsed = self.parsed_for(response, name)
+        if parsed is not None:
+            return parsed
+
+        parsed = parse_func(response)
+        self.save_parsed(getattr(response, 'cache_key', None), name, parsed)
+        return parsed
+
+    def parsed_for(self, response, name):
+        """响应来自缓存时返回已保存的同名解析结果，否则返回 None"""
+        cache_key = getattr(response, 'cache_key', None)
+        if cache_key and getattr(response, 'from_cache', False):
+            parsed = self.cache.get_parsed(cache_key, name)
+            if parsed is not None:
+                self._count('parses_saved')
+                return parsed
+        return None
+
+    def save_parsed(self, cache_key, name, parsed):
+        """把解析结果与缓存条目一起保存，供页面未变化时复用"""
+        if cache_key and parsed is not None:
+            self.cache.put_parsed(cache_key, name, parsed)
+
+    def log_report(self):
+        stats = self.stats
+        logger.info(f"HTTP请求 {stats['requests']} 次，失败 {stats['failures']} 个URL，"
+                    f"缓存命中 {stats['cache_hits']} 次")
+        logger.info(f"再验证未变化(304) {stats['revalidated']} 次，节省下载 {stats['bytes_saved'] / 1024:.1f} KB，"
+                    f"复用解析结果 {stats['parses_saved']} 次")
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """返回进程内共享的客户端实例"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def http_get(url, **kwargs):
+    """使用共享客户端发送GET请求，参数见 HttpClient.get"""
+    return get_client().get(url, **kwargs)
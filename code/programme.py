@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节目记录与时间模型
+
+各数据源解析节目时即把 'HH:MM' 换算成绝对时间 start（Unix 时间戳，单位：秒，北京时间），
+之后的排序、合并和 XMLTV 时间格式化都只做整数运算，并支持跨午夜、跨天的节目单。
+节目记录仍保留 'time' 字段，兼容按 'HH:MM' 读取的代码。
+
+节目记录使用带 __slots__ 的 Programme，标题和时间字符串经过 sys.intern，
+同一标题（新闻联播、天气预报等）在所有频道、所有天之间只保存一份。
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+UTC_OFFSET = 8 * 3600
+SECONDS_PER_DAY = 24 * 3600
+
+# 按页面顺序换算时，时间比上一个节目早超过该值视为已跨过午夜；按时段换算时，与时段相差超过该值视为相邻一天
+ROLLOVER_SECONDS = 12 * 3600
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Programme:
+    """
+    节目记录
+
+    支持按键读写（program['title']、program.get('start')、'end_time' in program），
+    与原先的节目字典兼容；值为 None 的字段视为不存在。
+
+    Args:
+        time: 开始时间 'HH:MM'
+        title: 节目名称
+        episode: 集数（tm2/tmdf）
+        start/stop: 开始、结束时间戳
+        end_time: 结束时间 'HH:MM'（tm）
+        source: 提供该节目的数据源，合并时填写
+    """
+
+    __slots__ = ('time', 'title', 'episode', 'start', 'stop', 'end_time', 'source')
+
+    def __init__(self, time, title, episode=None, start=None, stop=None, end_time=None, source=None):
+        self.time = _intern(time)
+        self.title = _intern(title)
+        self.episode = episode
+        self.start = start
+        self.stop = stop
+        self.end_time = _intern(end_time)
+        self.source = source
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, _intern(value) if key in ('time', 'title', 'end_time') else value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__ if getattr(self, key) is not None}
+
+    def __reduce__(self):
+        # 反序列化时重新经过 __init__，标题在新进程中同样被驻留
+        return (Programme, tuple(getattr(self, key) for key in self.__slots__))
+
+    def __eq__(self, other):
+        if not isinstance(other, Programme):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return f"Programme({self.to_dict()!r})"
+
+
+def day_start(date=None):
+    """
+    返回某天北京时间零点的时间戳
+
+    Args:
+        date: datetime.date，默认为北京时间的今天
+    """
+    if date is None:
+        date = datetime.now(BEIJING_TZ).date()
+    return int(datetime(date.year, date.month, date.day, tzinfo=BEIJING_TZ).timestamp())
+
+
+def weekday_start(weekday=None):
+    """
+    返回本周某天（1=周一 … 7=周日，与电视猫页面的 w1~w7 一致）北京时间零点的时间戳
+
+    Args:
+        weekday: 默认为今天
+    """
+    today = datetime.now(BEIJING_TZ).date()
+    if weekday is None:
+        return day_start(today)
+    return day_start(today + timedelta(days=weekday - today.isoweekday()))
+
+
+def day_of(timestamp):
+    """返回时间戳所在北京时间当天零点的时间戳"""
+    return (timestamp + UTC_OFFSET) // SECONDS_PER_DAY * SECONDS_PER_DAY - UTC_OFFSET
+
+
+def parse_hhmm(time_str):
+    """'HH:MM' -> 当天的秒数，格式不对时返回 None"""
+    try:
+        hour, minute = time_str.split(':')
+        return int(hour) * 3600 + int(minute) * 60
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_hhmm(timestamp):
+    seconds = (timestamp + UTC_OFFSET) % SECONDS_PER_DAY
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+_date_strings = {}
+
+def format_xmltv_time(timestamp):
+    """时间戳 -> XMLTV 时间 'YYYYmmddHHMM00'（北京时间，秒固定为 00，与原格式一致）"""
+    local = timestamp + UTC_OFFSET
+    day, seconds = divmod(local, SECONDS_PER_DAY)
+    date_str = _date_strings.get(day)
+    if date_str is None:
+        date_str = datetime.fromtimestamp(day * SECONDS_PER_DAY, timezone.utc).strftime('%Y%m%d')
+        _date_strings[day] = date_str
+    return f"{date_str}{seconds // 3600:02d}{seconds % 3600 // 60:02d}00"
+
+
+def assign_start_times(programs, anchor, rollover=True):
+    """
+    按页面顺序为节目填写 start
+
+    节目单按播出顺序排列，时间比上一个节目早超过 ROLLOVER_SECONDS 时视为进入第二天，
+    因此 23:30 之后的 00:30 会排在当天最后而不是最前。时间无法解析的节目 start 为 None。
+
+    Args:
+        programs: 含 'time' 字段的节目列表，原地修改
+        anchor: 节目单所属日期零点的时间戳
+        rollover: 为 False 时不处理跨午夜，全部按 anchor 当天计算
+
+    Returns:
+        programs
+    """
+    day_offset = 0
+    previous = None
+    for program in programs:
+        offset = parse_hhmm(program.get('time'))
+        if offset is None:
+            program['start'] = None
+            continue
+        if rollover and previous is not None and offset + day_offset < previous - ROLLOVER_SECONDS:
+            day_offset += SECONDS_PER_DAY
+        previous = offset + day_offset
+        program['start'] = anchor + previous
+    return programs
+
+
+def assign_nearest_start_times(programs, reference):
+    """
+    为节目填写离 reference 最近的 start
+
+    用于只覆盖几个小时的页面（电视猫时段页面）：页面中的节目与页面时段相差不超过半天，
+    开头可能是前一天延续过来的节目，末尾可能是次日凌晨的节目，不能按页面顺序累计跨午夜。
+    时间无法解析的节目 start 为 None。
+
+    Args:
+        programs: 含 'time' 字段的节目列表，原地修改
+        reference: 页面时段内的时间戳
+
+    Returns:
+        programs
+    """
+    anchor = day_of(reference)
+    for program in programs:
+        offset = parse_hhmm(program.get('time'))
+        if offset is None:
+            program['start'] = None
+            continue
+        start = anchor + offset
+        if start - reference > ROLLOVER_SECONDS:
+            start -= SECONDS_PER_DAY
+        elif reference - start > ROLLOVER_SECONDS:
+            start += SECONDS_PER_DAY
+        program['start'] = start
+    return programs
+
+
+def ensure_start_times(programs, anchor=None):
+    """
+    为没有 start 的旧格式节目补上 start，已有 start 的节目不变
+
+    旧格式的节目不保证按播出顺序排列，因此不处理跨午夜，全部按当天计算。
+
+    Args:
+        anchor: 默认为北京时间今天零点
+    """
+    missing = [program for program in programs if program.get('start') is None]
+    if missing:
+        assign_start_times(missing, day_start() if anchor is None else anchor, rollover=False)
+    return programs
+
+
+def start_key(program):
+    """排序键；时间无法解析的节目排在最后"""
+    start = program.get('start')
+    return (start is None, start or 0)
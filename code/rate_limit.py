@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按主机的令牌桶限速
+
+每个主机一个令牌桶：允许突发 burst 个请求，之后按 rate（请求/秒）的持续速率放行。
+多个线程共享同一个桶，合计速率不会超过配置值。
+"""
+
+import logging
+import threading
+import time
+
+from settings import get_host_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 3
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    Args:
+        rate: 持续速率，单位：请求/秒；为 0 或 None 时不限速
+        burst: 桶容量，即允许的最大突发请求数
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，必要时阻塞等待，返回等待的秒数"""
+        if not self.rate:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # 先预占令牌（允许为负），每个调用方只需睡到自己的时间片，无需轮询
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    按主机管理令牌桶
+
+    Args:
+        rate_limit_config: network.rate_limit 配置节，包含 rate、burst 及按主机覆盖的 hosts
+    """
+
+    def __init__(self, rate_limit_config=None):
+        rate_limit_config = rate_limit_config or {}
+        self.enabled = rate_limit_config.get('enabled', True)
+        self.rate = rate_limit_config.get('rate', DEFAULT_RATE)
+        self.burst = rate_limit_config.get('burst', DEFAULT_BURST)
+        self.host_config = rate_limit_config.get('hosts') or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                host_settings = get_host_settings(host, self.host_config)
+                rate = host_settings.get('rate', self.rate)
+                burst = host_settings.get('burst', self.burst)
+                bucket = TokenBucket(rate, burst)
+                self._buckets[host] = bucket
+                logger.debug(f"主机 {host} 限速: {rate} 请求/秒，突发 {burst}")
+        return bucket
+
+    def acquire(self, host):
+        if not self.enabled:
+            return 0.0
+        return self.bucket_for(host).acquire()
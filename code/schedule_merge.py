@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按时间段合并多个数据源的节目单
+
+每个节目视为一个时间段 [start, 结束)：有 stop 的用 stop，否则到同一节目单中下一个节目开始，
+最后一个节目到当天结束。两份已按 start 排序的节目单只扫描一遍：
+
+- 开始时间落在优先级更高的源已占用的时间段内的节目被丢弃；
+- 不同源在 duplicate_window 内开始、名称相近（如 "新闻联播" 与 "新闻联播(直播)"）的节目
+  只保留优先级最高的一个；
+- 同一源内只去掉开始时间和名称都相同的重复节目。
+
+每个节目的 source 记录其来源，report() 按频道列出每个时间段由哪个源提供。
+"""
+
+import json
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+
+from programme import SECONDS_PER_DAY, day_of, format_xmltv_time, start_key
+
+logger = logging.getLogger(__name__)
+
+# 名称后的标注，如 (直播)、（重播）、[高清]、【首播】
+TITLE_ANNOTATION = re.compile(r'[(（\[【][^)）\]】]*[)）\]】]')
+TITLE_PUNCTUATION = re.compile(r'[\s:：·\-—_《》"“”\'‘’、，,。.!！]+')
+
+
+@lru_cache(maxsize=8192)
+def normalize_title(title):
+    """去掉标注、空白和标点，用于判断两个节目名称是否相近"""
+    title = TITLE_ANNOTATION.sub('', title or '')
+    return TITLE_PUNCTUATION.sub('', title).lower()
+
+
+def titles_match(title, other):
+    """名称标准化后相同，或一个包含另一个（如 "人世间" 与 "电视剧：人世间"）"""
+    left = normalize_title(title)
+    right = normalize_title(other)
+    if not left or not right:
+        return title == other
+    return left == right or left in right or right in left
+
+
+def _slot_ends(programs):
+    """返回每个节目的结束时间（不含），programs 需已按 start 排序且都有 start"""
+    ends = []
+    last = len(programs) - 1
+    for index, program in enumerate(programs):
+        stop = program.get('stop')
+        if stop is None:
+            if index < last:
+                stop = programs[index + 1]['start']
+            else:
+                stop = day_of(program['start']) + SECONDS_PER_DAY
+        ends.append(stop)
+    return ends
+
+
+class ScheduleMerger:
+    """
+    节目单合并器
+
+    Args:
+        priority: 源名称列表，越靠前优先级越高；不在列表中的源优先级最低
+        duplicate_window: 判断近似重复节目的开始时间差，单位：秒
+    """
+
+    def __init__(self, priority=None, duplicate_window=300):
+        self.ranks = {name: index for index, name in enumerate(priority or [])}
+        self.duplicate_window = duplicate_window
+        self.stats = Counter()
+
+    def rank(self, source):
+        return self.ranks.get(source, len(self.ranks))
+
+    def merge(self, existing_programs, new_programs, source=None):
+        """
+        合并两份节目单，返回新的列表
+
+        Args:
+            existing_programs: 已合并的节目单，节目的 source 已填写
+            new_programs: 新数据源的节目单
+            source: 新数据源名称，填写到 new_programs 中还没有来源的节目
+        """
+        for program in new_programs:
+            if program.get('source') is None:
+                program['source'] = source
+
+        existing_timed, existing_untimed = self._split(existing_programs)
+        new_timed, new_untimed = self._split(new_programs)
+
+        merged = []
+        # 已保留节目中每个优先级占用到的时间
+        covered = {}
+        existing_ends = _slot_ends(existing_timed)
+        new_ends = _slot_ends(new_timed)
+        i = j = 0
+        while i < len(existing_timed) or j < len(new_timed):
+            # 按 (start, 优先级) 顺序取下一个节目，开始时间相同时优先级高的先处理
+            take_existing = j >= len(new_timed) or (
+                i < len(existing_timed) and
+                (existing_timed[i]['start'], self.rank(existing_timed[i].get('source'))) <=
+                (new_timed[j]['start'], self.rank(new_timed[j].get('source')))
+            )
+            if take_existing:
+                self._offer(merged, covered, existing_timed[i], existing_ends[i])
+                i += 1
+            else:
+                self._offer(merged, covered, new_timed[j], new_ends[j])
+                j += 1
+
+        # 时间无法解析的节目无法按时间段比较，沿用原先按名称去重的做法
+        untimed_titles = {program['title'] for program in existing_untimed}
+        merged.extend(existing_untimed)
+        for program in new_untimed:
+            if program['title'] not in untimed_titles:
+                merged.append(program)
+                untimed_titles.add(program['title'])
+        return merged
+
+    def _split(self, programs):
+        timed = [program for program in programs if program.get('start') is not None]
+        untimed = [program for program in programs if program.get('start') is None]
+        # 各数据源的节目单通常已按时间排序，此时排序只需线性时间
+        timed.sort(key=start_key)
+        return timed, untimed
+
+    def _offer(self, merged, covered, program, end):
+        start = program['start']
+        rank = self.rank(program.get('source'))
+
+        # 只需比较开始时间在窗口内的已保留节目，merged 按 start 递增
+        index = len(merged) - 1
+        while index >= 0 and merged[index]['start'] >= start - self.duplicate_window:
+            other = merged[index]
+            if other.get('source') == program.get('source'):
+                if other['start'] == start and other['title'] == program['title']:
+                    self.stats['duplicates'] += 1
+                    return
+            elif titles_match(other['title'], program['title']):
+                self.stats['duplicates'] += 1
+                if rank >= self.rank(other.get('source')):
+                    return
+                # 优先级更低的源稍早开始，由当前节目替换
+                del merged[index]
+                break
+            index -= 1
+        else:
+            # 不是近似重复时，再检查开始时间是否落在优先级更高的源的时间段内
+            for covered_rank, until in covered.items():
+                if covered_rank < rank and until > start:
+                    self.stats['overlaps'] += 1
+                    return
+
+        merged.append(program)
+        covered[rank] = max(covered.get(rank, end), end)
+
+    def report(self, programs_dict):
+        """
+        按频道列出每个时间段的来源
+
+        Returns:
+            {频道ID: [{'start', 'title', 'source'}]}，start 为 XMLTV 时间格式
+        """
+        report = {}
+        for channel_id, channel_data in programs_dict.items():
+            report[channel_id] = [
+                {'start': format_xmltv_time(program['start']), 'title': program['title'], 'source': program.get('source')}
+                for program in channel_data['programs'] if program.get('start') is not None
+            ]
+        return report
+
+    def save_report(self, programs_dict, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(programs_dict), f, ensure_ascii=False, indent=1)
+        logger.info(f"保存合并报告: {path}")
+
+    def log_report(self, programs_dict):
+        totals = Counter()
+        for channel_id, channel_data in programs_dict.items():
+            sources = Counter(program.get('source') for program in channel_data['programs'])
+            totals.update(sources)
+            if len(sources) > 1:
+                summary = '，'.join(f"{name} {count}" for name, count in sources.most_common())
+                logger.debug(f"频道 {channel_id} 节目来源: {summary}")
+        summary = '，'.join(f"{name} {count}" for name, count in totals.most_common())
+        logger.info(f"节目来源: {summary or '无'}")
+        logger.info(f"合并时丢弃近似重复节目 {self.stats['duplicates']} 个，"
+                    f"与高优先级源时间重叠的节目 {self.stats['overlaps']} 个")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节目单源调度器
+
+把各数据源视为一个有向无环图：没有依赖关系的源并行抓取，
+结果严格按配置的优先级顺序交还给调用方合并，保证输出与顺序执行一致。
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+logger = logging.getLogger(__name__)
+
+
+class SourceTask:
+    """
+    单个数据源任务
+
+    Args:
+        name: 源名称
+        run: 在工作线程中执行的抓取函数，返回该源的节目单
+        depends_on: 依赖的源名称列表，这些源合并完成后本任务才会开始
+        prepare: 可选，在调度线程中于提交前调用，返回传给 run 的关键字参数
+    """
+
+    def __init__(self, name, run, depends_on=None, prepare=None):
+        self.name = name
+        self.run = run
+        self.depends_on = list(depends_on or [])
+        self.prepare = prepare
+
+
+class SourceScheduler:
+    """
+    按依赖关系并行执行数据源，按优先级顺序产出结果
+
+    用法::
+
+        scheduler = SourceScheduler(tasks, max_workers=4)
+        for task, future in scheduler.run():
+            result = future.result()
+            ...
+            if should_stop:
+                scheduler.cancel_pending()
+                break
+
+    Args:
+        tasks: SourceTask 列表，按优先级从高到低排列
+        max_workers: 并行执行的源数，默认为源的个数
+        parallel: 为 False 时在调用线程中逐个执行
+        cancel_event: 可选，threading.Event；cancel_pending 时置位，通知运行中的源停止发出请求
+    """
+
+    def __init__(self, tasks, max_workers=None, parallel=True, cancel_event=None):
+        self.tasks = list(tasks)
+        self.parallel = parallel
+        self.max_workers = max_workers or max(len(self.tasks), 1)
+        self.cancel_event = cancel_event
+        self._futures = {}
+        self._merged = set()
+        self._executor = None
+        self._validate_dependencies()
+
+    def _validate_dependencies(self):
+        # 结果按优先级顺序合并，只能依赖优先级更高（更靠前）的源，否则会死锁
+        names = [task.name for task in self.tasks]
+        for index, task in enumerate(self.tasks):
+            valid = []
+            for dep in task.depends_on:
+                if dep not in names:
+                    # 依赖的源未启用，视为已满足
+                    continue
+                if names.index(dep) >= index:
+                    logger.warning(f"源 {task.name} 依赖优先级更低的源 {dep}，忽略该依赖")
+                    continue
+                valid.append(dep)
+            task.depends_on = valid
+
+    def _is_ready(self, task):
+        return all(dep in self._merged for dep in task.depends_on)
+
+    def _submit(self, task):
+        kwargs = task.prepare() if task.prepare else {}
+        if self._executor is None:
+            # 顺序模式：直接在当前线程执行
+            future = Future()
+            try:
+                future.set_result(task.run(**kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            logger.info(f"提交源 {task.name} 的抓取任务")
+            future = self._executor.submit(task.run, **kwargs)
+        self._futures[task.name] = future
+
+    def _submit_ready(self):
+        for task in self.tasks:
+            if task.name not in self._futures and self._is_ready(task):
+                self._submit(task)
+
+    def run(self):
+        """按优先级顺序产出 (task, future)，调用方处理完一个结果后才会继续"""
+        if self.parallel and len(self.tasks) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        try:
+            for task in self.tasks:
+                if self._executor is None:
+                    self._submit(task)
+                else:
+                    self._submit_ready()
+                yield task, self._futures[task.name]
+                self._merged.add(task.name)
+        finally:
+            self.cancel_pending()
+
+    def cancel_pending(self):
+        """
+        取消尚未开始的源，并等待已在运行的源结束，其结果将被丢弃
+
+        不等待的话运行中的源会在调用方开始下一轮（如下一天）抓取时继续请求，占用同一主机的限速额度。
+        设置了 cancel_event 时先将其置位，源在两次请求之间检查后尽快结束，等待结束后再清除。
+        """
+        running = []
+        for task in self.tasks:
+            if task.name in self._merged:
+                continue
+            future = self._futures.get(task.name)
+            if future is None:
+                logger.info(f"取消源 {task.name}（尚未开始）")
+            elif future.cancel():
+                logger.info(f"取消源 {task.name}（排队中）")
+            elif not future.done():
+                logger.info(f"源 {task.name} 已在运行，等待其结束，结果将被丢弃")
+                running.append(task.name)
+            self._merged.add(task.name)
+
+        if self._executor is not None:
+            started = time.perf_counter()
+            if running and self.cancel_event is not None:
+                self.cancel_event.set()
+            try:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            finally:
+                if self.cancel_event is not None:
+                    self.cancel_event.clear()
+            self._executor = None
+            if running:
+                logger.info(f"等待运行中的源 {', '.join(running)} 结束，用时 {time.perf_counter() - started:.1f} 秒")
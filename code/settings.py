@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置文件加载
+
+epgo 和各抓取模块共用同一份 config.yaml，首次访问时加载一次。
+"""
+
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = "config.yaml"
+
+_config = None
+_config_lock = threading.Lock()
+
+def load_config(config_path=DEFAULT_CONFIG_PATH):
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        return config or {}
+    except FileNotFoundError:
+        logger.error(f"配置文件未找到: {config_path}")
+        return {}
+    except yaml.YAMLError as e:
+        logger.error(f"解析配置文件失败: {e}")
+        return {}
+
+def get_config():
+    """返回全局配置，首次调用时从默认路径加载"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+def get_section(name):
+    """返回配置中的某一节，不存在时返回空字典"""
+    return get_config().get(name) or {}
+
+def get_host_settings(host, host_config):
+    """
+    在按主机配置中查找某主机的设置
+
+    键可以是主机名、主机名后缀（如 "tvsou.com"），
+    也可以是保存入口URL的环境变量名（如 "CCTV_API_URL"），避免在配置中写出入口地址。
+    """
+    if not host or not host_config:
+        return {}
+    if host in host_config:
+        return host_config[host] or {}
+    for key, value in host_config.items():
+        if host.endswith('.' + key):
+            return value or {}
+        env_url = os.environ.get(key)
+        if env_url and urlsplit(env_url).hostname == host:
+            return value or {}
+    return {}
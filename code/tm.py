@@ -1,12 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 import logging
 from datetime import datetime, timedelta, timezone
+from functools import cached_property
 import os
-import time
 import re
 
 from channel_mapping import normalize_channel_name
+from html_parse import make_soup
+from http_client import http_get
+from pipeline import ParsePipeline
+from programme import Programme, assign_nearest_start_times, start_key, weekday_start
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,7 +21,7 @@ file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
 
-def make_request(url, session=None, headers=None, retry=3, delay=2):
+def make_request(url, session=None, headers=None, retry=None, delay=None, revalidate=False):
     if headers is None:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -30,20 +34,7 @@ def make_request(url, session=None, headers=None, retry=3, delay=2):
         logger.error("找不到TM_REFERER")
         return None
 
-    request_func = session.get if session else requests.get
-    
-    for attempt in range(retry):
-        try:
-            response = request_func(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            return response
-        except requests.RequestException as e:
-            if attempt < retry - 1:
-                logger.info(f"等待 {delay} 秒后重试...")
-                time.sleep(delay)
-            else:
-                logger.error(f"所有重试均失败: {url}")
-                return None
+    return http_get(url, session=session, headers=headers, retry=retry, retry_delay=delay, revalidate=revalidate)
 
 def get_current_weekday():
     # 使用北京时间(UTC+8)获取当前星期几
@@ -52,12 +43,25 @@ def get_current_weekday():
 def generate_time_slots():
     return list(range(0, 24, 2))
 
-def generate_urls(channel_type, weekday=None):
+def upcoming_slots(count=2, now=None):
+    """
+    返回当前及之后的时段（只取当天）
+
+    Args:
+        count: 时段个数，每个时段 2 小时
+        now: 默认为北京时间当前时间
+    """
+    if now is None:
+        now = datetime.now(timezone(timedelta(hours=8)))
+    current = now.hour // 2 * 2
+    return [slot for slot in generate_time_slots() if slot >= current][:count]
+
+def generate_urls(channel_type, weekday=None, slots=None):
     import os
     urls = []
     if weekday is None:
         weekday = get_current_weekday()
-    time_slots = generate_time_slots()
+    time_slots = generate_time_slots() if slots is None else slots
     if channel_type == 'cctv':
         url_prefix = os.environ.get('TM_CCTV')
     elif channel_type == 'satellite':
@@ -76,152 +80,291 @@ def generate_urls(channel_type, weekday=None):
     logger.info(f"为{channel_type}频道生成了 {len(urls)} 个URL")
     return urls
 
+# 节目格中的 "HH:MM-HH:MM" 时间段，以及标题末尾的时间段（连同前后空白）
+TIME_RANGE = re.compile(r'(\d{2}:\d{2})-(\d{2}:\d{2})')
+TRAILING_TIME_RANGE = re.compile(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$')
+CLOCK_TIME = re.compile(r'(\d{2}:\d{2})')
+WHITESPACE = re.compile(r'\s+')
+
+def strip_time_range(text, match):
+    """去掉文本末尾的时间段；match 为 TIME_RANGE 在 text 中的第一个匹配"""
+    if match.end() == len(text):
+        # 时间段恰好在末尾时就是要去掉的那一个，不必再匹配一次
+        return text[:match.start()].strip()
+    return TRAILING_TIME_RANGE.sub('', text).strip()
+
+def descendant_tags(element, names=None):
+    """按文档顺序返回子孙元素（可限定标签名），直接遍历比 find_all 的通用匹配快得多"""
+    if names is None:
+        return [node for node in element.descendants if isinstance(node, Tag)]
+    return [node for node in element.descendants if isinstance(node, Tag) and node.name in names]
+
+def has_class_part(element, parts):
+    """element 的 class 中是否含有 parts 中的任一片段"""
+    classes = element.get('class')
+    if not classes:
+        return False
+    class_str = ' '.join(classes) if isinstance(classes, list) else classes
+    return any(part in class_str for part in parts)
+
+# 按 class 查找时间和标题时使用的标签和 class 片段
+CLASS_TAGS = ('span', 'div', 'p')
+TIME_CLASS_PARTS = ('time', 'program-time', 'start-time')
+TITLE_CLASS_PARTS = ('title', 'program-title', 'name')
+
+class ProgramItem:
+    """
+    节目项：只遍历一次子孙元素，span、按 class 查找和结构特征都由此得到，各种取值只计算一次
+
+    Args:
+        item: 节目项元素（通常是 li）
+    """
+
+    def __init__(self, item):
+        self.item = item
+
+    @cached_property
+    def elements(self):
+        return descendant_tags(self.item)
+
+    @cached_property
+    def template(self):
+        """结构特征：全部子孙元素的标签和 class，前两种解析方式是否适用只取决于它"""
+        return tuple((element.name, tuple(element.get('class') or ())) for element in self.elements)
+
+    @cached_property
+    def spans(self):
+        return [element for element in self.elements if element.name == 'span']
+
+    def find_by_class(self, parts):
+        for element in self.elements:
+            if element.name in CLASS_TAGS and has_class_part(element, parts):
+                return element
+        return None
+
+    @cached_property
+    def time_elem(self):
+        return self.find_by_class(TIME_CLASS_PARTS)
+
+    @cached_property
+    def title_elem(self):
+        return self.find_by_class(TITLE_CLASS_PARTS)
+
+    @cached_property
+    def text(self):
+        return self.item.text.strip()
+
+    @cached_property
+    def strings(self):
+        return ' '.join(self.item.stripped_strings)
+
+def programme_from_pair(time_str, title):
+    """时间和标题分开给出；标题中带有时间段时以时间段的开始时间为准"""
+    if not (time_str and title and ':' in time_str):
+        return None
+    match = TIME_RANGE.search(title)
+    if match:
+        return Programme(match.group(1), strip_time_range(title, match))
+    return Programme(time_str, title)
+
+def programme_from_text(text):
+    """文本中第一个时间之后的部分作为标题"""
+    if not text:
+        return None
+    time_match = CLOCK_TIME.search(text)
+    if not time_match:
+        return None
+    title = text[time_match.end():].strip()
+    match = TIME_RANGE.search(title)
+    if match:
+        return Programme(match.group(1), strip_time_range(title, match))
+    if title:
+        return Programme(time_match.group(1), title)
+    return None
+
+def parse_item_spans(view):
+    spans = view.spans
+    return programme_from_pair(spans[0].text.strip(), spans[1].text.strip())
+
+def parse_item_classes(view):
+    return programme_from_pair(view.time_elem.text.strip(), view.title_elem.text.strip())
+
+def parse_item_text(view):
+    return programme_from_text(view.text)
+
+def parse_item_strings(view):
+    return programme_from_text(view.strings)
+
+# 节目项的解析方式，按先后顺序尝试
+ITEM_STRATEGIES = (parse_item_spans, parse_item_classes, parse_item_text, parse_item_strings)
+
+# 节目项结构 -> 从第几种解析方式开始尝试
+_item_strategies = {}
+
+def first_strategy(view):
+    """
+    返回该结构的节目项第一种适用的解析方式的序号
+
+    前两种方式（span、class）是否适用只取决于结构，按结构记下后同一页面模板的节目项不再逐个判断；
+    之后的方式仍按顺序尝试，结果与逐个尝试全部方式相同。
+    """
+    if len(view.spans) >= 2:
+        # 最常见的结构，判断比计算结构特征更快
+        return 0
+    template = view.template
+    start = _item_strategies.get(template)
+    if start is None:
+        start = 1 if view.time_elem is not None and view.title_elem is not None else 2
+        _item_strategies[template] = start
+    return start
+
 def parse_program_item(item, channel_name):
+    """
+    解析单个节目项
+
+    依次尝试：前两个 span、按 class 查找时间和标题、元素文本、全部文本片段，返回第一个成功的结果。
+    """
     try:
-        spans = item.find_all('span')
-        if len(spans) >= 2:
-            time_str = spans[0].text.strip()
-            title = spans[1].text.strip()
-            if time_str and title and ':' in time_str:
-                title_time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', title)
-                if title_time_match:
-                    time_str = title_time_match.group(1)
-                    pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', title).strip()
-                    return {'time': time_str, 'title': pure_title}
-                return {'time': time_str, 'title': title}
-        
-        time_elem = item.find(['span', 'div', 'p'], class_=lambda cls: cls and ('time' in cls or 'program-time' in cls or 'start-time' in cls))
-        title_elem = item.find(['span', 'div', 'p'], class_=lambda cls: cls and ('title' in cls or 'program-title' in cls or 'name' in cls))
-        if time_elem and title_elem:
-            time_str = time_elem.text.strip()
-            title = title_elem.text.strip()
-            if time_str and title and ':' in time_str:
-                title_time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', title)
-                if title_time_match:
-                    time_str = title_time_match.group(1)
-                    pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', title).strip()
-                    return {'time': time_str, 'title': pure_title}
-                return {'time': time_str, 'title': title}
-        
-        item_text = item.text.strip()
-        if item_text:
-            time_match = re.search(r'(\d{2}:\d{2})', item_text)
-            if time_match:
-                time_str = time_match.group(1)
-                title = item_text[time_match.end():].strip()
-                title_time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', title)
-                if title_time_match:
-                    time_str = title_time_match.group(1)
-                    pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', title).strip()
-                    return {'time': time_str, 'title': pure_title}
-                if title:
-                    return {'time': time_str, 'title': title}
-        
-        all_text = ' '.join(item.stripped_strings)
-        if all_text:
-            time_match = re.search(r'(\d{2}:\d{2})', all_text)
-            if time_match:
-                time_str = time_match.group(1)
-                title = all_text[time_match.end():].strip()
-                title_time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', title)
-                if title_time_match:
-                    time_str = title_time_match.group(1)
-                    pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', title).strip()
-                    return {'time': time_str, 'title': pure_title}
-                if title:
-                    return {'time': time_str, 'title': title}
-        
+        view = ProgramItem(item)
+        start = first_strategy(view)
+        for index, strategy in enumerate(ITEM_STRATEGIES[start:], start):
+            if index == 1 and (view.time_elem is None or view.title_elem is None):
+                continue
+            program = strategy(view)
+            if program is not None:
+                return program
         return None
     except Exception as e:
         logger.error(f"解析节目项失败: {e}", exc_info=True)
         return None
 
+def parse_program_cell(cell_text):
+    """解析节目格文本 "节目名 HH:MM-HH:MM"，不是节目格时返回 None"""
+    time_match = TIME_RANGE.search(cell_text)
+    if not time_match:
+        return None
+    pure_title = WHITESPACE.sub(' ', strip_time_range(cell_text, time_match))
+    if not pure_title:
+        return None
+    return Programme(time_match.group(1), pure_title, end_time=time_match.group(2))
+
+CELL_TAGS = ('td', 'th')
+
 def fetch_program_items(soup):
+    """
+    从时段页面的节目表格中提取 [(标准频道名称, 节目)]
+
+    每行第一格为频道名称，其余为节目格；同一频道只取第一次出现的行。
+    所有表格中的行按文档顺序遍历一次（嵌套表格的行不再重复访问），结果与逐个表格遍历相同。
+    """
     programs = []
     try:
-        tables = soup.find_all('table')
         processed_channels = set()
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
-                if len(cells) >= 2:
-                    channel_name = cells[0].text.strip()
-                    if not channel_name:
-                        continue
-                    standard_channel_name = normalize_channel_name(channel_name)
-                    if standard_channel_name in processed_channels:
-                        continue
-                    processed_channels.add(standard_channel_name)
-                    for i, cell in enumerate(cells[1:], 2):
-                        cell_text = cell.text.strip()
-                        if not cell_text:
-                            continue
-                        time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', cell_text)
-                        if time_match:
-                            start_time = time_match.group(1)
-                            end_time = time_match.group(2)
-                            pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', cell_text).strip()
-                            pure_title = re.sub(r'\s+', ' ', pure_title)
-                            if pure_title and start_time and end_time:
-                                programs.append((standard_channel_name, {'time': start_time, 'end_time': end_time, 'title': pure_title}))
+        for row in soup.find_all('tr'):
+            if row.find_parent('table') is None:
+                continue
+            cells = descendant_tags(row, CELL_TAGS)
+            if len(cells) < 2:
+                continue
+            channel_name = cells[0].text.strip()
+            if not channel_name:
+                continue
+            standard_channel_name = normalize_channel_name(channel_name)
+            if standard_channel_name in processed_channels:
+                continue
+            processed_channels.add(standard_channel_name)
+            for cell in cells[1:]:
+                cell_text = cell.text.strip()
+                if not cell_text:
+                    continue
+                program = parse_program_cell(cell_text)
+                if program is not None:
+                    programs.append((standard_channel_name, program))
     except Exception as e:
         logger.error(f"提取节目列表失败: {e}", exc_info=True)
     
     return programs
 
-def fetch_tvmao_programs(channel_type=None, weekday=None):
+# 时段页面地址末尾的 "-h{时段}.html"，见 generate_urls
+SLOT_URL = re.compile(r'-h(\d+)\.html$')
+
+def group_slot_programs(slot_pages, anchor):
+    """
+    按频道汇总各时段页面的节目并填写 start
+
+    每个时段页面单独换算：0 点时段开头的 23:30 属于前一天，22 点时段末尾的 00:30 属于次日，
+    节目取离页面时段最近的那一天，不在页面之间按顺序累计跨午夜。
+
+    Args:
+        slot_pages: [(时段, [(频道名称, 节目)])]
+        anchor: 当天零点的时间戳
+
+    Returns:
+        {频道名称: [节目]}
+    """
+    programs_dict = {}
+    for slot, program_items in slot_pages:
+        # 以时段中间作为参考时间，时段为 2 小时
+        reference = anchor + (slot + 1) * 3600
+        assign_nearest_start_times([program for _, program in program_items], reference)
+        for channel_name, program in program_items:
+            programs_dict.setdefault(channel_name, []).append(program)
+    return programs_dict
+
+def parse_slot_page(html):
+    """解析时段页面，返回 [(频道名称, 节目)]，在解析进程中执行"""
+    # 只为表格建树，页面其余部分不参与解析
+    return fetch_program_items(make_soup(html, SoupStrainer('table')))
+
+def fetch_tvmao_programs(channel_type=None, weekday=None, slots=None, revalidate=False):
+    """
+    抓取电视猫节目单
+
+    Args:
+        channel_type: 'cctv' 或 'satellite'，默认两者都抓取
+        weekday: 1~7，默认为今天
+        slots: 只抓取这些时段（如 [14, 16]），默认抓取全天 12 个时段
+        revalidate: 缓存仍新鲜时也向服务器确认，用于刷新临时调整的节目
+    """
     programs_dict = {}
     
     if channel_type:
-        urls = generate_urls(channel_type, weekday)
+        urls = generate_urls(channel_type, weekday, slots)
     else:
         urls = []
-        urls.extend(generate_urls('cctv', weekday))
-        urls.extend(generate_urls('satellite', weekday))
+        urls.extend(generate_urls('cctv', weekday, slots))
+        urls.extend(generate_urls('satellite', weekday, slots))
     
     if not urls:
         return programs_dict
 
-    session = requests.Session()
-
-    for url in urls:
-        response = make_request(url, session=session)
-        
-        if not response:
-            continue
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        program_items = fetch_program_items(soup)
+    # 抓取线程请求页面，解析进程解析，页面未变化时复用上次的解析结果
+    pipeline = ParsePipeline(parse_slot_page, 'tm.slot_page')
+    pages = pipeline.run(urls, lambda url: make_request(url, revalidate=revalidate))
 
-        for channel_name, program in program_items:
-            if channel_name not in programs_dict:
-                programs_dict[channel_name] = []
-            programs_dict[channel_name].append(program)
+    slot_pages = [(int(SLOT_URL.search(url).group(1)), program_items) for url, program_items in pages.items()]
+    programs_dict = group_slot_programs(slot_pages, weekday_start(weekday))
 
-        time.sleep(1)
-    
     for channel_name in programs_dict:
         seen = set()
         unique_programs = []
         
         for prog in programs_dict[channel_name]:
-            key = f"{prog['time']}_{prog['title']}"
+            key = (prog['start'], prog['title'])
             if key not in seen:
                 seen.add(key)
                 unique_programs.append(prog)
         
-        unique_programs.sort(key=lambda x: x['time'])
+        unique_programs.sort(key=start_key)
         
         time_map = {}
         for prog in unique_programs:
-            if prog['time'] not in time_map:
-                time_map[prog['time']] = prog
+            if prog['start'] not in time_map:
+                time_map[prog['start']] = prog
 
         time_unique_programs = list(time_map.values())
 
-        time_unique_programs.sort(key=lambda x: x['time'])
+        time_unique_programs.sort(key=start_key)
         
         max_programs = 60
         if len(time_unique_programs) > max_programs:
@@ -236,59 +379,47 @@ def fetch_tvmao_programs(channel_type=None, weekday=None):
     logger.info(f"{channel_type}频道节目单抓取完成，共获取到 {len(programs_dict)} 个频道")
     return programs_dict
 
-def generate_xmltv(programs_dict):
+def write_xmltv(programs_dict, stream):
     today = datetime.now().strftime('%Y%m%d')
     
     generator_url = os.environ.get('TM_GENERATOR_URL', '')
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="TMEPG Generator" generator-info-url="{generator_url}">
-'''
-    
     total_programs = 0
     
-    for channel_name, programs in programs_dict.items():
-        channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
-        
-        xml_content += f'''
-  <channel id="{channel_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-        
-        channel_program_count = 0
-        for program in programs:
-            time_str = program['time']
-            title = program['title']
+    with XmltvWriter(stream, 'TMEPG Generator', generator_url, declaration=UTF8_DECLARATION) as writer:
+        for channel_name, programs in programs_dict.items():
+            channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
             
-            start_time = f"{today}{time_str.replace(':', '')}00"
+            writer.channel(channel_id, channel_name)
             
-            try:
-                if 'end_time' in program:
-                    end_time_str = f"{today}{program['end_time'].replace(':', '')}00"
-                else:
-                    hour, minute = map(int, time_str.split(':'))
-                    end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=hour, minutes=minute+30)
-                    end_time_str = end_time.strftime(f"{today}%H%M00")
+            channel_program_count = 0
+            for program in programs:
+                time_str = program['time']
+                title = program['title']
                 
-                xml_content += f'''
-  <programme channel="{channel_id}" start="{start_time}" stop="{end_time_str}">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-                channel_program_count += 1
-                total_programs += 1
-            except Exception as e:
-                logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
-                continue
-        
-        logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目元素")
+                start_time = f"{today}{time_str.replace(':', '')}00"
+                
+                try:
+                    if 'end_time' in program:
+                        end_time_str = f"{today}{program['end_time'].replace(':', '')}00"
+                    else:
+                        hour, minute = map(int, time_str.split(':'))
+                        end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=hour, minutes=minute+30)
+                        end_time_str = end_time.strftime(f"{today}%H%M00")
+                    
+                    writer.programme(channel_id, start_time, end_time_str, title)
+                    channel_program_count += 1
+                    total_programs += 1
+                except Exception as e:
+                    logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
+                    continue
+            
+            logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目元素")
     
     logger.info(f"共生成了 {total_programs} 个节目元素")
-    xml_content += '''
-</tv>
-'''
-    
-    return xml_content
+    return total_programs
+
+def generate_xmltv(programs_dict):
+    return render_xmltv(write_xmltv, programs_dict)
 
 def main():
     """主函数"""
@@ -307,7 +438,6 @@ def main():
     logger.info(f"\n共提取到 {len(programs_dict)} 个频道的节目单")
     
     if programs_dict:
-        xmltv_content = generate_xmltv(programs_dict)
         output_dir = 'output'
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -316,7 +446,7 @@ def main():
         output_file = os.path.join(output_dir, f'tvmao_epg_{today}.xml')
         
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(xmltv_content)
+            write_xmltv(programs_dict, f)
         
         logger.info(f"节目单已保存到 {output_file}")
         
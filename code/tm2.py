@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
 from bs4 import BeautifulSoup
 import logging
 import re
 from datetime import datetime, timedelta, timezone
-import time
 import os
-from channel_mapping import normalize_channel_name
+from channel_mapping import channel_names_match
+from html_parse import ProgramPage
+from http_client import get_client, http_get
+from pipeline import ParsePipeline
+from programme import Programme, assign_start_times, weekday_start
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -44,7 +47,6 @@ CHANNEL_CODES = {
     'CCTV-15音乐': 'CCTV-CCTV16',
     'CCTV-16奥林匹克': 'CCTV-CCTVOLY',
     'CCTV-17农业': 'CCTV-CCTV17',
-    'CGTN 西语': 'CCTV-CCTV17',
     'CGTN 纪录(英)': 'CCTV-CCTV18',
     'CGTN': 'CCTV-CCTV19',
     'CGTN 法语': 'CCTV-CCTVF',
@@ -97,7 +99,26 @@ CHANNEL_CODES = {
     '藏语卫视': 'XIZANGTV1',
 }
 
-def make_request(url, session=None, headers=None, retry=3, delay=2):
+# 频道代码 -> 频道名称，频道身份以请求的代码为准；CHANNEL_CODES 中每个代码只应出现一次
+CODE_TO_CHANNEL = {}
+for _name, _code in CHANNEL_CODES.items():
+    CODE_TO_CHANNEL.setdefault(_code, _name)
+
+def known_channel_name(parsed_name):
+    """返回与页面频道名称唯一对应的 CHANNEL_CODES 中的名称，没有或不唯一时返回 None"""
+    matches = [name for name in CHANNEL_CODES if channel_names_match(name, parsed_name)]
+    return matches[0] if len(matches) == 1 else None
+
+def validate_response(url, response):
+    if '/ccp/' in response.url and '/ccp/' not in url:
+        return f"检测到反爬虫重定向 -> {response.url}"
+
+    if len(response.text) < 500:
+        return f"响应体过小 ({len(response.text)} 字节), 可能被拦截"
+
+    return None
+
+def make_request(url, session=None, headers=None, retry=None, delay=None):
     if headers is None:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -114,44 +135,8 @@ def make_request(url, session=None, headers=None, retry=3, delay=2):
             'DNT': '1'
         }
     
-    request_func = session.get if session else requests.get
-    
-    for attempt in range(retry):
-        try:
-            response = request_func(url, headers=headers, timeout=15, allow_redirects=True)
-            response.raise_for_status()
-            
-            if '/ccp/' in response.url and '/ccp/' not in url:
-                logger.warning(f"检测到反爬虫重定向: {url} -> {response.url}")
-                if attempt < retry - 1:
-                    wait_time = delay * (attempt + 1)
-                    logger.info(f"等待 {wait_time} 秒后重试... ({attempt + 1}/{retry})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"所有重试均失败: {url}")
-                    return None
-            
-            if len(response.text) < 500:
-                logger.warning(f"响应体过小 ({len(response.text)} 字节), 可能被拦截: {url}")
-                if attempt < retry - 1:
-                    wait_time = delay * (attempt + 1)
-                    logger.info(f"等待 {wait_time} 秒后重试... ({attempt + 1}/{retry})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"所有重试均失败: {url}")
-                    return None
-            
-            return response
-        except requests.RequestException as e:
-            if attempt < retry - 1:
-                wait_time = delay * (attempt + 1)
-                logger.info(f"等待 {wait_time} 秒后重试... ({attempt + 1}/{retry}), 错误: {e}")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"所有重试均失败: {url}, 错误: {e}")
-                return None
+    return http_get(url, session=session, headers=headers, retry=retry, retry_delay=delay,
+                    validate=lambda response: validate_response(url, response))
 
 def get_current_weekday():
     return datetime.now(timezone(timedelta(hours=8))).weekday() + 1
@@ -169,7 +154,15 @@ def generate_url_with_weekday(channel_code, weekday=None):
         url = f"{B_WS}{channel_code}-w{weekday}.html"
     return url
 
-def parse_channel_name(soup):
+def parse_channel_name(soup, full_scan=False):
+    """
+    从页面提取频道名称
+
+    默认只看 h1 和 title；面包屑和全文扫描需要解析整页，开销最大，只在调试时启用。
+
+    Args:
+        full_scan: 为 True 时在 h1/title 失败后继续尝试面包屑和全文扫描
+    """
     h1_tag = soup.find('h1')
     if h1_tag:
         h1_text = h1_tag.get_text().strip()
@@ -190,7 +183,11 @@ def parse_channel_name(soup):
             channel_name = match.group(0)
             logger.info(f"从title提取频道名称: {channel_name}")
             return channel_name
-    
+
+    if not full_scan:
+        logger.debug("h1/title 中未找到频道名称")
+        return None
+
     breadcrumb = soup.find('div', class_='breadcrumb')
     if breadcrumb:
         links = breadcrumb.find_all('a')
@@ -251,11 +248,7 @@ def parse_program_items(soup):
                 title = re.sub(r'\(\d+\)$', '', title).strip()
 
             if title and len(title) > 0:
-                programs.append({
-                    'time': time_str,
-                    'title': title,
-                    'episode': episode
-                })
+                programs.append(Programme(time_str, title, episode))
                 logger.debug(f"解析到节目: {time_str} - {title}{f'({episode})' if episode else ''}")
     else:
         logger.debug("未找到精确结构，使用通用解析")
@@ -284,34 +277,78 @@ def parse_program_items(soup):
                 title = re.sub(r'\s+', ' ', title)
                 title = re.sub(r'^正在播出\s+', '', title)
 
-                programs.append({
-                    'time': time_str,
-                    'title': title,
-                    'episode': episode
-                })
+                programs.append(Programme(time_str, title, episode))
 
                 logger.debug(f"解析到节目 {i+1}: {time_str} - {title}")
 
     logger.info(f"共解析到 {len(programs)} 个节目")
     return programs
 
-def fetch_channel_epg(channel_code, weekday=None, session=None):
-    url = generate_url_with_weekday(channel_code, weekday)
-    logger.info(f"正在获取: {url}")
+def parse_channel_html(html):
+    """解析频道页面文本，返回频道名称和节目列表，可在解析进程中执行"""
+    page = ProgramPage(html)
+    return {
+        'channel': parse_channel_name(page),
+        'programs': parse_program_items(page),
+    }
 
-    response = make_request(url, session=session)
+def parse_channel_page(response):
+    """解析频道页面，返回频道名称和节目列表"""
+    return parse_channel_html(response.text)
+
+# 频道页面解析结果的缓存名称，解析逻辑变化时更换
+CHANNEL_PAGE_PARSE = 'tm2.channel_page.v3'
+
+def fetch_channel_epg(channel_code, weekday=None, session=None, channel_name=None):
+    """
+    获取单个频道的节目单
+
+    Args:
+        channel_name: 频道名称，默认按 CHANNEL_CODES 由频道代码确定；
+            与页面中提取的名称不一致时记录警告，仍按请求的频道发布，
+            除非页面名称对应代码表中的另一个频道
+    """
+    response = request_channel_page(channel_code, weekday, session)
     if not response:
-        logger.warning(f"获取失败: {channel_code}")
         return None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # 页面未变化（缓存或304）时直接复用上次的解析结果
+    page = get_client().parse(response, CHANNEL_PAGE_PARSE, parse_channel_page)
+    return build_channel_epg(channel_code, page, weekday, channel_name)
 
-    channel_name = parse_channel_name(soup)
-    if not channel_name:
-        logger.warning(f"无法提取频道名称: {channel_code}")
-        return None
+def request_channel_page(channel_code, weekday=None, session=None):
+    """请求频道页面，失败时返回 None"""
+    url = generate_url_with_weekday(channel_code, weekday)
+    logger.info(f"正在获取: {url}")
 
-    programs = parse_program_items(soup)
+    response = make_request(url, session=session)
+    if not response:
+        logger.warning(f"获取失败: {channel_code}")
+    return response
+
+def build_channel_epg(channel_code, page, weekday=None, channel_name=None):
+    """由频道页面的解析结果生成单个频道的节目单，参数含义同 fetch_channel_epg"""
+    if channel_name is None:
+        channel_name = CODE_TO_CHANNEL.get(channel_code)
+
+    parsed_name = page['channel']
+    if channel_name is None:
+        # 未知的频道代码，只能以页面名称为准
+        channel_name = parsed_name
+        if not channel_name:
+            logger.warning(f"无法提取频道名称: {channel_code}")
+            return None
+    elif parsed_name and not channel_names_match(channel_name, parsed_name):
+        known_name = known_channel_name(parsed_name)
+        if known_name is not None and known_name != channel_name:
+            # 页面其实是代码表中的另一个频道，按该频道发布，避免把节目发布到别的频道下
+            logger.warning(f"页面频道名称与请求不一致: {channel_code} 请求 {channel_name}，页面 {parsed_name}，按 {known_name} 发布")
+            channel_name = known_name
+        else:
+            # 页面名称写法不同或无法识别，频道身份仍以请求为准
+            logger.warning(f"页面频道名称与请求不一致: {channel_code} 请求 {channel_name}，页面 {parsed_name}")
+
+    programs = assign_start_times(page['programs'], weekday_start(weekday))
 
     if programs:
         logger.info(f"成功获取 {channel_name} 的 {len(programs)} 个节目")
@@ -333,86 +370,66 @@ def fetch_all_satellite_epg(channel_list=None, weekday=None):
     total_channels = len(channel_list)
     logger.info(f"开始获取 {total_channels} 个卫视频道的EPG数据")
 
-    session = requests.Session()
-    session.headers.update({
+    get_client().warm_up(TM_REFERER, headers={
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Referer': TM_REFERER,
-        'Connection': 'keep-alive'
+        'Referer': TM_REFERER
     })
 
-    try:
-        session.get(TM_REFERER, timeout=10)
-        logger.info("已访问首页建立会话")
-    except Exception as e:
-        logger.warning(f"访问首页失败: {e}")
+    # 抓取线程请求页面，解析进程解析，结果按频道列表的顺序返回
+    pipeline = ParsePipeline(parse_channel_html, CHANNEL_PAGE_PARSE)
+    pages = pipeline.run(channel_list.items(), lambda item: request_channel_page(item[1], weekday))
 
     success_count = 0
-    for channel_name, channel_code in channel_list.items():
-        epg_data = fetch_channel_epg(channel_code, weekday, session=session)
+    for (channel_name, channel_code), page in pages.items():
+        epg_data = build_channel_epg(channel_code, page, weekday, channel_name)
 
         if epg_data and epg_data['programs']:
             programs_dict[epg_data['channel']] = epg_data['programs']
             success_count += 1
 
-        time.sleep(2 + (hash(channel_code) % 3))
-
-    session.close()
     logger.info(f"完成！成功获取 {success_count}/{total_channels} 个频道的EPG数据")
     return programs_dict
 
-def generate_xmltv(programs_dict):
+def write_xmltv(programs_dict, stream):
     today = datetime.now().strftime('%Y%m%d')
     generator_url = os.environ.get('TM_GENERATOR_URL', '')
-    
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="TMEPG2 Generator" generator-info-url="{generator_url}">
-'''
-    
     total_programs = 0
     
-    for channel_name, programs in programs_dict.items():
-        channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
-        
-        xml_content += f'''
-  <channel id="{channel_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-        
-        channel_program_count = 0
-        for program in programs:
-            time_str = program['time']
-            title = program['title']
+    with XmltvWriter(stream, 'TMEPG2 Generator', generator_url, declaration=UTF8_DECLARATION) as writer:
+        for channel_name, programs in programs_dict.items():
+            channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
             
-            start_time = f"{today}{time_str.replace(':', '')}00"
+            writer.channel(channel_id, channel_name)
             
-            try:
-                hour, minute = map(int, time_str.split(':'))
-                end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + \
-                          timedelta(hours=hour, minutes=minute+30)
-                end_time_str = end_time.strftime(f"{today}%H%M00")
+            channel_program_count = 0
+            for program in programs:
+                time_str = program['time']
+                title = program['title']
                 
-                xml_content += f'''
-  <programme channel="{channel_id}" start="{start_time}" stop="{end_time_str}">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-                channel_program_count += 1
-                total_programs += 1
-            except Exception as e:
-                logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
-                continue
-        
-        logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目元素")
+                start_time = f"{today}{time_str.replace(':', '')}00"
+                
+                try:
+                    hour, minute = map(int, time_str.split(':'))
+                    end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + \
+                              timedelta(hours=hour, minutes=minute+30)
+                    end_time_str = end_time.strftime(f"{today}%H%M00")
+                    
+                    writer.programme(channel_id, start_time, end_time_str, title)
+                    channel_program_count += 1
+                    total_programs += 1
+                except Exception as e:
+                    logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
+                    continue
+            
+            logger.info(f"为频道 {channel_name} 生成了 {channel_program_count} 个节目元素")
     
     logger.info(f"共生成了 {total_programs} 个节目元素")
-    xml_content += '''
-</tv>
-'''
-    
-    return xml_content
+    return total_programs
+
+def generate_xmltv(programs_dict):
+    return render_xmltv(write_xmltv, programs_dict)
 
 def debug_page(channel_code, weekday=None):
     url = generate_url_with_weekday(channel_code, weekday)
@@ -448,7 +465,7 @@ def debug_page(channel_code, weekday=None):
         for link in links:
             print(f"  - {link.get_text().strip()}: {link.get('href', '')}")
 
-    channel_name = parse_channel_name(soup)
+    channel_name = parse_channel_name(soup, full_scan=True)
     print(f"\n✅ 提取的频道名称: {channel_name}")
 
     li_elements = soup.find_all('li')
@@ -491,8 +508,6 @@ def main():
     print("生成XMLTV文件")
     print("=" * 60)
     
-    xmltv_content = generate_xmltv(programs_dict)
-    
     output_dir = 'output'
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
@@ -501,7 +516,7 @@ def main():
     output_file = os.path.join(output_dir, f'tvmao2_satellite_{today}.xml')
     
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(xmltv_content)
+        write_xmltv(programs_dict, f)
     
     print(f"文件已保存: {output_file}")
     print(f"文件大小: {os.path.getsize(output_file) / 1024:.2f} KB")
@@ -1,12 +1,16 @@
-import requests
 from bs4 import BeautifulSoup
 import logging
 import re
 from datetime import datetime, timedelta, timezone
-import time
 import os
 import random
+from channel_catalog import get_catalog
 from channel_mapping import normalize_channel_name
+from html_parse import ProgramPage
+from http_client import get_client, http_get
+from pipeline import ParsePipeline
+from programme import Programme, assign_start_times, weekday_start
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -56,7 +60,13 @@ PROVINCE_CODES = {
     '青海': {'code': ['QHTV'], 'provId': '630000'},
 }
 
-def make_request(url, session=None, headers=None, retry=0, delay=2):
+def validate_response(response):
+    if len(response.text) < 500:
+        return f"响应体过小 ({len(response.text)} 字节), 可能被拦截"
+    return None
+
+def request_page(url, session=None, headers=None, retry=None, delay=None):
+    """发送请求，404 响应原样返回，由调用方处理"""
     user_agents = [
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
@@ -83,34 +93,20 @@ def make_request(url, session=None, headers=None, retry=0, delay=2):
             'X-Requested-With': 'XMLHttpRequest'
         }
     
-    request_func = session.get if session else requests.get
+    if random.random() > 0.5:
+        headers['User-Agent'] = random.choice(user_agents)
     
-    try:
-        time.sleep(random.uniform(0.5, 1.5))
-        
-        if random.random() > 0.5:
-            headers['User-Agent'] = random.choice(user_agents)
-        
-        response = request_func(url, headers=headers, timeout=15, allow_redirects=True)
-        
-        if response.status_code == 404:
-            logger.warning(f"404错误: {url}, 跳过该频道")
-            return None
-        
-        response.raise_for_status()
-        
-        if len(response.text) < 500:
-            logger.warning(f"响应体过小 ({len(response.text)} 字节), 可能被拦截: {url}")
-            return None
-        
-        return response
-    except requests.RequestException as e:
-        if "404" in str(e):
-            logger.warning(f"404错误: {url}, 跳过该频道")
-            return None
-        
-        logger.error(f"请求失败: {url}, 错误: {e}")
+    return http_get(url, session=session, headers=headers, retry=retry, retry_delay=delay,
+                    validate=validate_response, passthrough_status=(404,))
+
+def make_request(url, session=None, headers=None, retry=None, delay=None):
+    response = request_page(url, session=session, headers=headers, retry=retry, delay=delay)
+    
+    if response is not None and response.status_code == 404:
+        logger.warning(f"404错误: {url}, 跳过该频道")
         return None
+    
+    return response
 
 def get_current_weekday():
     return datetime.now(timezone(timedelta(hours=8))).weekday() + 1
@@ -209,7 +205,7 @@ def parse_channel_name(soup):
             logger.info(f"从title提取频道名称: {channel_name}")
             return channel_name
     
-    logger.warning("所有方法都无法提取频道名称")
+    logger.debug("h1/title 中未找到频道名称")
     return None
 
 def parse_program_items(soup):
@@ -244,11 +240,7 @@ def parse_program_items(soup):
                 title = re.sub(r'\(\d+\)$', '', title).strip()
 
             if title and len(title) > 0:
-                programs.append({
-                    'time': time_str,
-                    'title': title,
-                    'episode': episode
-                })
+                programs.append(Programme(time_str, title, episode))
     else:
         logger.debug("未找到精确结构，使用通用解析")
         li_elements = soup.find_all('li')
@@ -270,197 +262,265 @@ def parse_program_items(soup):
                 title = match.group(2).strip()
                 episode = match.group(3) if match.group(3) else None
                 title = re.sub(r'\s+', ' ', title)
-                programs.append({
-                    'time': time_str,
-                    'title': title,
-                    'episode': episode
-                })
+                programs.append(Programme(time_str, title, episode))
 
     logger.info(f"共解析到 {len(programs)} 个节目")
     return programs
 
-def fetch_province_channels(province_name, weekday=None, session=None):
+def parse_channel_html(html):
+    """解析频道页面文本，返回 (频道名称, 节目列表)，可在解析进程中执行"""
+    page = ProgramPage(html)
+    return parse_channel_name(page), parse_program_items(page)
+
+# 频道页面解析结果的缓存名称，解析逻辑变化时更换
+CHANNEL_PAGE_PARSE = 'tmdf.channel_page.v2'
+
+def province_codes(province_name):
+    """返回省份的 code 列表，不支持的省份返回 None"""
     if province_name not in PROVINCE_CODES:
-        logger.error(f"不支持的省份: {province_name}")
-        return {}
-    
-    province_info = PROVINCE_CODES[province_name]
+        return None
     # 支持单个code或code列表
-    codes = province_info['code']
+    codes = PROVINCE_CODES[province_name]['code']
     if isinstance(codes, str):
         codes = [codes]
-    
+    return codes
+
+def fetch_channel_list(province_name, province_code, session=None):
+    """获取某个省份 code 的频道列表 {频道名称: 频道代码}，失败时返回空字典"""
+    catalog = get_catalog()
+    channel_list = catalog.get_channels(province_code)
+    if channel_list is not None:
+        logger.info(f"{province_name} ({province_code}) 使用已保存的频道列表，共 {len(channel_list)} 个频道")
+        return channel_list
+
+    url = generate_url_with_weekday(province_code)
+    logger.info(f"正在获取 {province_name} ({province_code}) 的频道列表: {url}")
+
+    response = make_request(url, session=session)
+    if not response:
+        logger.warning(f"获取失败: {province_name} ({province_code})")
+        return {}
+
+    channel_list = get_client().parse(
+        response, 'tmdf.channel_list',
+        lambda r: parse_channel_list(BeautifulSoup(r.text, 'html.parser'), province_name))
+
+    if not channel_list:
+        logger.warning(f"未找到 {province_name} ({province_code}) 的频道列表")
+        return {}
+    logger.info(f"{province_name} ({province_code}) 获取到 {len(channel_list)} 个频道")
+    catalog.put_channels(province_code, channel_list)
+    return channel_list
+
+def channel_page_code(channel_code, weekday):
+    """返回 (不带星期的频道代码, 指定星期的页面代码)"""
+    # 频道列表中的代码带有当天的星期（如 BTV-BTV2-w3.html），换成要抓取的星期
+    base_code = re.sub(r'-w\d+\.html$', '', channel_code)
+    return base_code, f"{base_code}-w{weekday}.html"
+
+def request_channel_page(channel_name, channel_code, weekday, session=None):
+    """请求频道页面，失败或返回404时返回 None"""
+    base_code, channel_code = channel_page_code(channel_code, weekday)
+    channel_url = f"{B_PROGRAM}{channel_code}"
+
+    catalog = get_catalog()
+    if catalog.is_missing(base_code):
+        logger.debug(f"频道 {channel_name} 之前返回404，跳过: {channel_url}")
+        return None
+
+    logger.debug(f"获取频道 {channel_name} 的EPG: {channel_url}")
+
+    channel_response = request_page(channel_url, session=session)
+    if channel_response is not None and channel_response.status_code == 404:
+        logger.warning(f"404错误: {channel_url}, 跳过该频道")
+        catalog.mark_missing(base_code)
+        return None
+    if not channel_response:
+        return None
+    return channel_response
+
+def build_channel_programs(channel_name, channel_code, weekday, parsed):
+    """
+    由频道页面的解析结果生成节目列表
+
+    频道名称（决定地方台的频道ID）以页面 h1/title 为准，页面中提取不到时才用频道列表中的名称。
+
+    Returns:
+        (频道名称, 节目列表)，没有节目时返回 None
+    """
+    parsed_name, programs = parsed
+    assign_start_times(programs, weekday_start(weekday))
+    if not parsed_name:
+        _, channel_code = channel_page_code(channel_code, weekday)
+        logger.warning(f"无法提取频道名称: {channel_code}")
+        parsed_name = channel_name
+
+    if not programs:
+        return None
+    logger.info(f"成功获取 {parsed_name} 的 {len(programs)} 个节目")
+    return parsed_name, programs
+
+def fetch_channel_pages(channel_items, weekday, fetch_workers, session=None):
+    """
+    通过抓取/解析流水线获取一组频道的节目列表
+
+    Args:
+        channel_items: [(频道名称, 频道代码, ...)]，其余元素原样保留在结果的键中
+
+    Returns:
+        {channel_item: (频道名称, 节目列表)}，按 channel_items 的顺序，不含失败或没有节目的频道
+    """
+    pipeline = ParsePipeline(parse_channel_html, CHANNEL_PAGE_PARSE, fetch_workers=fetch_workers)
+    pages = pipeline.run(channel_items, lambda item: request_channel_page(item[0], item[1], weekday, session))
+
+    channel_programs = {}
+    for item, parsed in pages.items():
+        result = build_channel_programs(item[0], item[1], weekday, parsed)
+        if result:
+            channel_programs[item] = result
+    return channel_programs
+
+def fetch_province_channels(province_name, weekday=None, session=None):
+    codes = province_codes(province_name)
+    if codes is None:
+        logger.error(f"不支持的省份: {province_name}")
+        return {}
+
     all_channels = {}
     for province_code in codes:
-        url = generate_url_with_weekday(province_code, weekday)
-        logger.info(f"正在获取 {province_name} ({province_code}) 的频道列表: {url}")
-
-        response = make_request(url, session=session)
-        if not response:
-            logger.warning(f"获取失败: {province_name} ({province_code})")
-            continue
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        channel_list = parse_channel_list(soup, province_name)
-        
-        if channel_list:
-            all_channels.update(channel_list)
-            logger.info(f"{province_name} ({province_code}) 获取到 {len(channel_list)} 个频道")
-        else:
-            logger.warning(f"未找到 {province_name} ({province_code}) 的频道列表")
-    
+        all_channels.update(fetch_channel_list(province_name, province_code, session))
     return all_channels
 
 def fetch_province_epg(province_name, weekday=None, session=None):
-    if province_name not in PROVINCE_CODES:
+    codes = province_codes(province_name)
+    if codes is None:
         logger.error(f"不支持的省份: {province_name}")
         return {}
     
-    province_info = PROVINCE_CODES[province_name]
-    # 支持单个code或code列表
-    codes = province_info['code']
-    if isinstance(codes, str):
-        codes = [codes]
-    
     if weekday is None:
         weekday = get_current_weekday()
     
     all_programs = {}
     
+    channel_items = []
     for province_code in codes:
-        url = f"{B_PROGRAM}{province_code}"
-        logger.info(f"正在获取 {province_name} ({province_code}) 的EPG数据: {url}")
+        channel_list = fetch_channel_list(province_name, province_code, session)
+        channel_items.extend(channel_list.items())
 
-        response = make_request(url, session=session)
-        if not response:
-            logger.warning(f"获取失败: {province_name} ({province_code})")
-            continue
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        channel_list = parse_channel_list(soup, province_name)
-        
-        if not channel_list:
-            logger.warning(f"未找到 {province_name} ({province_code}) 的频道列表")
-            continue
-        
-        programs_dict = {}
-        
-        for channel_name, channel_code in channel_list.items():
-            channel_url = f"{B_PROGRAM}{channel_code}"
-            
-            logger.debug(f"获取频道 {channel_name} 的EPG: {channel_url}")
-            
-            channel_response = make_request(channel_url, session=session)
-            if not channel_response:
-                continue
-            
-            channel_soup = BeautifulSoup(channel_response.text, 'html.parser')
-            
-            parsed_name = parse_channel_name(channel_soup)
-            if not parsed_name:
-                logger.warning(f"无法提取频道名称: {channel_code}")
-                parsed_name = channel_name
-            
-            programs = parse_program_items(channel_soup)
-            
-            if programs:
-                programs_dict[parsed_name] = programs
-                logger.info(f"成功获取 {parsed_name} 的 {len(programs)} 个节目")
-            
-            time.sleep(1)
-        
-        all_programs.update(programs_dict)
-        logger.info(f"{province_name} ({province_code}) 完成！成功获取 {len(programs_dict)} 个频道的EPG数据")
+    # 逐个请求频道页面，解析在解析进程中与请求重叠进行
+    channel_programs = fetch_channel_pages(channel_items, weekday, 1, session)
+    for channel_name, programs in channel_programs.values():
+        all_programs[channel_name] = programs
     
     logger.info(f"{province_name} 总计完成！成功获取 {len(all_programs)} 个频道的EPG数据")
     return all_programs
 
-def fetch_all_provinces_epg(province_list=None, weekday=None):
+def fetch_provinces_concurrently(province_list, weekday, max_workers):
+    """
+    并发抓取多个省份：先并发获取各省份的频道列表，再把所有频道页面交给同一条抓取/解析流水线
+
+    同一主机的并发请求数由 http_client 的 max_concurrency 统一限制。
+    结果按省份、频道列表的原顺序组装，与逐个抓取一致。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    province_items = [(name, code) for name in province_list for code in province_codes(name)]
+    logger.info(f"并发抓取 {len(province_list)} 个省份，线程数: {max_workers}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list_futures = [
+            executor.submit(fetch_channel_list, name, code)
+            for name, code in province_items
+        ]
+        channel_lists = [future.result() for future in list_futures]
+
+    channel_items = [
+        (channel_name, channel_code, province_name)
+        for (province_name, _), channel_list in zip(province_items, channel_lists)
+        for channel_name, channel_code in channel_list.items()
+    ]
+    channel_programs = fetch_channel_pages(channel_items, weekday, max_workers)
+
+    all_provinces_epg = {}
+    for (_, _, province_name), (channel_name, programs) in channel_programs.items():
+        all_provinces_epg.setdefault(province_name, {})[channel_name] = programs
+
+    for province_name, province_epg in all_provinces_epg.items():
+        logger.info(f"{province_name} 总计完成！成功获取 {len(province_epg)} 个频道的EPG数据")
+    return all_provinces_epg
+
+def fetch_all_provinces_epg(province_list=None, weekday=None, max_workers=None):
+    """
+    抓取多个省份的地方台节目单
+
+    Args:
+        province_list: 省份名称列表，默认为全部省份
+        weekday: 1~7，默认为今天
+        max_workers: 并发抓取的线程数，不大于 1 时逐个请求；解析总在解析进程中进行
+
+    Returns:
+        {省份: {频道名称: 节目列表}}
+    """
     if province_list is None:
         province_list = list(PROVINCE_CODES.keys())
+    if weekday is None:
+        weekday = get_current_weekday()
     
-    all_provinces_epg = {}
-    
-    session = requests.Session()
-    session.headers.update({
+    get_client().warm_up(TM_REFERER, headers={
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Referer': TM_REFERER,
-        'Connection': 'keep-alive'
+        'Referer': TM_REFERER
     })
 
-    try:
-        session.get(TM_REFERER, timeout=10)
-        logger.info("已访问首页建立会话")
-    except Exception as e:
-        logger.warning(f"访问首页失败: {e}")
-
+    supported = []
     for province_name in province_list:
         if province_name not in PROVINCE_CODES:
             logger.warning(f"跳过不支持的省份: {province_name}")
             continue
-        
-        province_epg = fetch_province_epg(province_name, weekday, session)
-        if province_epg:
-            all_provinces_epg[province_name] = province_epg
-        
-        time.sleep(2 + (hash(province_name) % 3))
+        supported.append(province_name)
+
+    # 单线程时也走同一条流水线，所有省份共用一组解析进程
+    all_provinces_epg = fetch_provinces_concurrently(supported, weekday, max(1, max_workers or 1))
     
-    session.close()
     logger.info(f"所有省份完成！共获取 {len(all_provinces_epg)} 个省的EPG数据")
     return all_provinces_epg
 
-def generate_xmltv(provinces_epg_dict):
+def write_xmltv(provinces_epg_dict, stream):
     today = datetime.now().strftime('%Y%m%d')
     generator_url = os.environ.get('TM_GENERATOR_URL', '')
-    
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="TMDF EPG Generator" generator-info-url="{generator_url}">
-'''
-    
     total_programs = 0
     
-    for province_name, programs_dict in provinces_epg_dict.items():
-        for channel_name, programs in programs_dict.items():
-            channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
-            
-            xml_content += f'''
-  <channel id="{channel_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-            
-            for program in programs:
-                time_str = program['time']
-                title = program['title']
+    with XmltvWriter(stream, 'TMDF EPG Generator', generator_url, declaration=UTF8_DECLARATION) as writer:
+        for province_name, programs_dict in provinces_epg_dict.items():
+            for channel_name, programs in programs_dict.items():
+                channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
                 
-                start_time = f"{today}{time_str.replace(':', '')}00"
+                writer.channel(channel_id, channel_name)
                 
-                try:
-                    hour, minute = map(int, time_str.split(':'))
-                    end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + \
-                              timedelta(hours=hour, minutes=minute+30)
-                    end_time_str = end_time.strftime(f"{today}%H%M00")
+                for program in programs:
+                    time_str = program['time']
+                    title = program['title']
                     
-                    xml_content += f'''
-  <programme channel="{channel_id}" start="{start_time}" stop="{end_time_str}">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-                    total_programs += 1
-                except Exception as e:
-                    logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
-                    continue
+                    start_time = f"{today}{time_str.replace(':', '')}00"
+                    
+                    try:
+                        hour, minute = map(int, time_str.split(':'))
+                        end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + \
+                                  timedelta(hours=hour, minutes=minute+30)
+                        end_time_str = end_time.strftime(f"{today}%H%M00")
+                        
+                        writer.programme(channel_id, start_time, end_time_str, title)
+                        total_programs += 1
+                    except Exception as e:
+                        logger.warning(f"解析节目时间失败，跳过节目: {title}, 时间: {time_str}, 错误: {e}")
+                        continue
     
     logger.info(f"共生成了 {total_programs} 个节目元素")
-    xml_content += '''
-</tv>
-'''
-    
-    return xml_content
+    return total_programs
+
+def generate_xmltv(provinces_epg_dict):
+    return render_xmltv(write_xmltv, provinces_epg_dict)
 
 def main():
     logger.info("=" * 60)
@@ -485,8 +545,6 @@ def main():
     print("生成XMLTV文件")
     print("=" * 60)
     
-    xmltv_content = generate_xmltv(all_provinces_epg)
-    
     output_dir = 'output'
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
@@ -495,7 +553,7 @@ def main():
     output_file = os.path.join(output_dir, f'tvmao_df_{today}.xml')
     
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(xmltv_content)
+        write_xmltv(all_provinces_epg, f)
     
     print(f"文件已保存: {output_file}")
     print(f"文件大小: {os.path.getsize(output_file) / 1024:.2f} KB")
@@ -1,11 +1,17 @@
-import requests
 import time
-from bs4 import BeautifulSoup
 import logging
 from datetime import datetime, timedelta, timezone
 import os
 import re
 
+from bs4 import SoupStrainer
+
+from html_parse import make_soup
+from http_client import http_get
+from pipeline import ParsePipeline
+from programme import Programme, assign_start_times, day_start
+from xmltv_writer import UTF8_DECLARATION, XmltvWriter, render_xmltv
+
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -14,28 +20,92 @@ file_handler.setLevel(logging.DEBUG)
 file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
-def make_request(url, headers=None, retry=2, delay=2):
+def make_request(url, headers=None, retry=None, delay=None):
     if headers is None:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
     
-    for attempt in range(retry):
-        try:
-            logger.info(f"请求URL: {url} (尝试 {attempt+1}/{retry})")
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            logger.info(f"成功获取URL: {url}，状态码: {response.status_code}")
-            return response
-        except requests.RequestException as e:
-            logger.warning(f"请求失败 (尝试 {attempt+1}/{retry}): {e}")
-            if attempt < retry - 1:
-                time.sleep(delay)
-            else:
-                logger.error(f"所有重试均失败: {url}")
-                return None
+    logger.info(f"请求URL: {url}")
+    response = http_get(url, headers=headers, retry=retry, retry_delay=delay)
+    if response is not None:
+        logger.info(f"成功获取URL: {url}，状态码: {response.status_code}")
+    return response
+
+# tvsou 站点地址，可用环境变量 TVSOU_URL 指向本地回放服务器（见 model/replay_server.py）
+TVSOU_URL = os.environ.get('TVSOU_URL', 'https://www.tvsou.com').rstrip('/')
+
+# 并发抓取频道页面的线程数；实际并发还受 http_client 按主机的限速和 max_concurrency 限制
+FETCH_WORKERS = 4
+# 日志中列出的最慢频道数
+SLOWEST_CHANNELS = 5
+
+def parse_channel_page(html):
+    """
+    解析频道页面中的节目表格，在解析进程中执行
+
+    Returns:
+        按时间和名称去重后的节目列表，尚未填写 start
+    """
+    channel_soup = make_soup(html, SoupStrainer('table'))
+    programs = []
+    seen = set()
+    for table in channel_soup.find_all('table'):
+        for row in table.find_all('tr'):
+            cells = row.find_all(['td', 'th'])
+            if len(cells) >= 2:
+                time_str = cells[0].text.strip()
+                title = cells[1].text.strip()
+                if time_str and title and ':' in time_str:
+                    key = f"{time_str}_{title}"
+                    if key not in seen:
+                        seen.add(key)
+                        programs.append(Programme(time_str, title))
+    return programs
 
-def fetch_tvsou_channel_programs(url, channel_type):
+def fetch_channel_page(channel_name, channel_href, headers, latencies):
+    """抓取频道页面并记录耗时，失败时返回 None"""
+    started = time.perf_counter()
+    response = make_request(channel_href, headers=headers)
+    elapsed = time.perf_counter() - started
+    latencies.append((elapsed, channel_name))
+
+    server_info = ""
+    if response is not None and response.elapsed:
+        server_info = f"，服务器响应 {response.elapsed.total_seconds():.2f} 秒"
+    logger.info(f"{channel_name} 页面耗时 {elapsed:.2f} 秒{server_info}: {channel_href}")
+    return response
+
+def find_channel_links(soup):
+    """返回频道页面链接 {链接: 频道名称}，按页面顺序去重"""
+    channel_links = soup.find_all('a', href=lambda href: href and '/epg/' in href and ('yangshi' in href or 'weishi' in href) and '_w' not in href)
+    logger.info(f"找到 {len(channel_links)} 个频道链接")
+    unique_channels = {}
+    for link in channel_links:
+        channel_name = link.text.strip()
+        channel_href = link['href']
+        
+        if channel_name in ['央视', '卫视']:
+            continue
+        if re.match(r'^(周一|周二|周三|周四|周五|周六|周日)', channel_name):
+            continue
+        
+        if channel_name and channel_href not in unique_channels:
+            unique_channels[channel_href] = channel_name
+    
+    logger.info(f"去重后得到 {len(unique_channels)} 个频道")
+    return unique_channels
+
+def fetch_tvsou_channel_programs(url, channel_type, fetch_workers=FETCH_WORKERS, parse_workers=None):
+    """
+    抓取 tvsou 某个分类（央视/卫视）下全部频道的节目单
+
+    频道页面经抓取/解析流水线（见 pipeline）并发抓取、在解析进程中解析。
+
+    Args:
+        fetch_workers: 抓取线程数
+        parse_workers: 解析进程数，默认读取 pipeline.parse_workers，0 时不启动解析进程
+    """
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
@@ -44,61 +114,34 @@ def fetch_tvsou_channel_programs(url, channel_type):
     if not response:
         return {}
     
-    soup = BeautifulSoup(response.text, 'html.parser')
     programs_dict = {}
     
     try:
         logger.info(f"开始解析{channel_type}页面: {url}")
-        channel_links = soup.find_all('a', href=lambda href: href and '/epg/' in href and ('yangshi' in href or 'weishi' in href) and '_w' not in href)
-        logger.info(f"找到 {len(channel_links)} 个频道链接")
-        unique_channels = {}
-        for link in channel_links:
-            channel_name = link.text.strip()
-            channel_href = link['href']
-            
-            if channel_name in ['央视', '卫视']:
-                continue
-            if re.match(r'^(周一|周二|周三|周四|周五|周六|周日)', channel_name):
-                continue
-            
-            if channel_name and channel_href not in unique_channels:
-                unique_channels[channel_href] = channel_name
-        
-        logger.info(f"去重后得到 {len(unique_channels)} 个频道")
-        
+        unique_channels = find_channel_links(make_soup(response.text))
+        channels = []
         for channel_href, channel_name in unique_channels.items():
             if not channel_href.startswith('http'):
-                channel_href = f"https://www.tvsou.com{channel_href}"
-            logger.info(f"正在提取 {channel_name} 的节目单: {channel_href}")
-            channel_response = make_request(channel_href, headers=headers)
-            if not channel_response:
-                continue
-            channel_soup = BeautifulSoup(channel_response.text, 'html.parser')
-            programs = []
-            program_tables = channel_soup.find_all('table')
-            for table in program_tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 2:
-                        time_str = cells[0].text.strip()
-                        title = cells[1].text.strip()
-                        if time_str and title and ':' in time_str:
-                            programs.append({'time': time_str, 'title': title})
-            
-            unique_programs = []
-            seen = set()
-            for prog in programs:
-                key = f"{prog['time']}_{prog['title']}"
-                if key not in seen:
-                    seen.add(key)
-                    unique_programs.append(prog)
-            
+                channel_href = f"{TVSOU_URL}{channel_href}"
+            channels.append((channel_name, channel_href))
+
+        # 抓取线程请求页面，解析进程解析，结果按页面上的频道顺序返回
+        latencies = []
+        pipeline = ParsePipeline(parse_channel_page, fetch_workers=fetch_workers, parse_workers=parse_workers)
+        pages = pipeline.run(channels, lambda channel: fetch_channel_page(*channel, headers, latencies))
+
+        anchor = day_start()
+        for (channel_name, _), unique_programs in pages.items():
+            assign_start_times(unique_programs, anchor)
             if unique_programs:
                 programs_dict[channel_name] = unique_programs
-                logger.info(f"  成功提取 {len(unique_programs)} 个节目")
+                logger.info(f"  {channel_name} 成功提取 {len(unique_programs)} 个节目")
             else:
-                logger.warning(f"  未提取到任何节目")
+                logger.warning(f"  {channel_name} 未提取到任何节目")
+
+        slowest = sorted(latencies, reverse=True)[:SLOWEST_CHANNELS]
+        if slowest:
+            logger.info(f"{channel_type}最慢的频道页面: " + "，".join(f"{name} {elapsed:.2f} 秒" for elapsed, name in slowest))
     
     except Exception as e:
         logger.error(f"解析{channel_type}节目单失败: {e}", exc_info=True)
@@ -107,10 +150,10 @@ def fetch_tvsou_channel_programs(url, channel_type):
 
 def fetch_tvsou_programs():
     programs_dict = {}
-    cctv_url = "https://www.tvsou.com/epg/yangshi/"
+    cctv_url = f"{TVSOU_URL}/epg/yangshi/"
     cctv_programs = fetch_tvsou_channel_programs(cctv_url, "央视")
     programs_dict.update(cctv_programs)
-    satellite_url = "https://www.tvsou.com/epg/weishi/"
+    satellite_url = f"{TVSOU_URL}/epg/weishi/"
     satellite_programs = fetch_tvsou_channel_programs(satellite_url, "卫视")
     programs_dict.update(satellite_programs)
     filtered_programs = {}
@@ -140,51 +183,40 @@ def is_cctv_or_satellite(channel_name):
             return True
     return False
 
-def generate_xmltv(programs_dict):
+def write_xmltv(programs_dict, stream):
     today = datetime.now().strftime('%Y%m%d')
-    xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<tv generator-info-name="TVSou EPG Generator" generator-info-url="https://www.tvsou.com/epg">
-'''
-    for channel_name, programs in programs_dict.items():
-        channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
-        xml_content += f'''
-  <channel id="{channel_id}">
-    <display-name>{channel_name}</display-name>
-  </channel>
-'''
-        for program in programs:
-            time_str = program['time']
-            title = program['title']
-            start_time = f"{today}{time_str.replace(':', '')}00"
-            try:
-                hour, minute = map(int, time_str.split(':'))
-                end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=hour, minutes=minute+30)
-                end_time_str = end_time.strftime(f"{today}%H%M00")
-            except:
-                continue
-            xml_content += f'''
-  <programme channel="{channel_id}" start="{start_time}" stop="{end_time_str}">
-    <title lang="zh">{title}</title>
-  </programme>
-'''
-    xml_content += f'''
-</tv>
-'''
-    return xml_content
+    with XmltvWriter(stream, 'TVSou EPG Generator', 'https://www.tvsou.com/epg', declaration=UTF8_DECLARATION) as writer:
+        for channel_name, programs in programs_dict.items():
+            channel_id = channel_name.replace(' ', '_').replace('-', '_').replace(':', '_')
+            writer.channel(channel_id, channel_name)
+            for program in programs:
+                time_str = program['time']
+                title = program['title']
+                start_time = f"{today}{time_str.replace(':', '')}00"
+                try:
+                    hour, minute = map(int, time_str.split(':'))
+                    end_time = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=hour, minutes=minute+30)
+                    end_time_str = end_time.strftime(f"{today}%H%M00")
+                except:
+                    continue
+                writer.programme(channel_id, start_time, end_time_str, title)
+    return writer.programme_count
+
+def generate_xmltv(programs_dict):
+    return render_xmltv(write_xmltv, programs_dict)
 
 def main():
     logger.info("开始从tvsou.com提取节目单...")
     programs_dict = fetch_tvsou_programs()
     logger.info(f"共提取到 {len(programs_dict)} 个频道的节目单")
     if programs_dict:
-        xmltv_content = generate_xmltv(programs_dict)
         output_dir = 'output'
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         today = datetime.now().strftime('%Y%m%d')
         output_file = os.path.join(output_dir, f'tvsou_epg_{today}.xml')
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(xmltv_content)
+            write_xmltv(programs_dict, f)
         logger.info(f"节目单已保存到 {output_file}")
         total_programs = 0
         for channel_name, programs in programs_dict.items():
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 XMLTV 写入
+
+逐个频道、逐个节目直接写入输出流（如 gzip 文件），不构建整棵 ElementTree，也不需要
+minidom 重新解析，内存占用不随频道数和天数增长。
+
+输出与原先 ET.tostring + minidom.toprettyxml(indent="  ") 的结果逐字节一致：
+声明为 <?xml version="1.0" ?>，属性按写入顺序输出，没有内容的元素自闭合，
+只含文本的元素写在同一行，转义规则与 minidom 相同。
+"""
+
+import io
+import re
+
+# epgo 沿用 minidom 的声明；各数据源单独运行时输出的文件声明编码
+XML_DECLARATION = '<?xml version="1.0" ?>'
+UTF8_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+# XML 1.0 不允许的字符，原实现遇到时 minidom 解析会直接失败，这里改为丢弃
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def escape(data):
+    """按 minidom 的规则转义文本和属性值"""
+    if '&' in data:
+        data = data.replace('&', '&amp;')
+    if '<' in data:
+        data = data.replace('<', '&lt;')
+    if '"' in data:
+        data = data.replace('"', '&quot;')
+    if '>' in data:
+        data = data.replace('>', '&gt;')
+    return data
+
+
+def clean_text(text):
+    # 原实现经过一次 XML 解析，文本中的 \r\n 和 \r 会被换成 \n
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return INVALID_XML_CHARS.sub('', text)
+
+
+def clean_attr(value):
+    # 属性中的换行等字符会被 ET 写成字符引用，解析后原样保留，只需去掉非法字符
+    return INVALID_XML_CHARS.sub('', value)
+
+
+class XmltvWriter:
+    """
+    XMLTV 写入器
+
+    用法：
+        with XmltvWriter(stream) as writer:
+            writer.channel(channel_id, display_name)
+            writer.programme(channel_id, start, stop, title)
+
+    Args:
+        stream: 文本输出流，需提供 write 方法
+        generator_name/generator_url: 根元素 tv 的 generator-info-* 属性
+        indent: 每层缩进字符串；为 None 时不换行不缩进
+        declaration: XML 声明
+    """
+
+    def __init__(self, stream, generator_name=None, generator_url=None, indent='  ',
+                 declaration=XML_DECLARATION):
+        self.stream = stream
+        self.declaration = declaration
+        self.indent = indent if indent is not None else ''
+        self.newline = '\n' if indent is not None else ''
+        self.root_attrs = []
+        if generator_name is not None:
+            self.root_attrs.append(('generator-info-name', generator_name))
+        if generator_url is not None:
+            self.root_attrs.append(('generator-info-url', generator_url))
+        self.channel_count = 0
+        self.programme_count = 0
+        self._started = False
+        self._root_open = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.end()
+        return False
+
+    def _open_tag(self, tag, attrs):
+        parts = ['<', tag]
+        for name, value in attrs:
+            parts.append(f' {name}="{escape(clean_attr(value))}"')
+        return ''.join(parts)
+
+    def _element(self, depth, tag, attrs, text=None, children=()):
+        """
+        生成一个元素的文本
+
+        Args:
+            children: 子元素 [(tag, attrs, text)]，与文本互斥
+        """
+        prefix = self.indent * depth
+        head = prefix + self._open_tag(tag, attrs)
+        if children:
+            lines = [head, '>', self.newline]
+            for child_tag, child_attrs, child_text in children:
+                lines.append(self._element(depth + 1, child_tag, child_attrs, child_text))
+            lines.append(f"{prefix}</{tag}>{self.newline}")
+            return ''.join(lines)
+        if text:
+            text = clean_text(text)
+        if text:
+            return f"{head}>{escape(text)}</{tag}>{self.newline}"
+        return f"{head}/>{self.newline}"
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self.stream.write(self.declaration + self.newline)
+
+    def _write_child(self, content):
+        if not self._root_open:
+            # 根元素在写入第一个子元素时才闭合开始标签，没有子元素时自闭合
+            self.stream.write(self._open_tag('tv', self.root_attrs) + '>' + self.newline)
+            self._root_open = True
+        self.stream.write(content)
+
+    def channel(self, channel_id, display_name):
+        self._write_child(self._element(1, 'channel', [('id', channel_id)], children=[
+            ('display-name', [], display_name),
+        ]))
+        self.channel_count += 1
+
+    def programme(self, channel_id, start, stop, title, lang='zh'):
+        self._write_child(self._element(1, 'programme', [
+            ('channel', channel_id), ('start', start), ('stop', stop),
+        ], children=[
+            ('title', [('lang', lang)], title),
+        ]))
+        self.programme_count += 1
+
+    def end(self):
+        self.start()
+        if self._root_open:
+            self.stream.write(f"</tv>{self.newline}")
+        else:
+            self.stream.write(self._open_tag('tv', self.root_attrs) + '/>' + self.newline)
+
+
+def render_xmltv(write_func, *args):
+    """
+    调用写入函数并以字符串返回结果，供需要完整 XMLTV 文本的调用方使用
+
+    Args:
+        write_func: 以输出流为最后一个参数的写入函数，如 epgo.write_xmltv
+    """
+    buffer = io.StringIO()
+    write_func(*args, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+完整流程基准
+
+启动本地回放服务器（见 replay_server），把各入口环境变量指向它，在临时工作目录中运行 code/epgo.py，
+记录每轮的耗时、回放服务器收到的请求数（按数据源和结果分类）以及输出的完整程度：
+窗口内保存了节目单的天数、标准频道的成功率、地方台频道数和节目总数。
+退出码非零、日志中有未处理的异常、没有生成 epg.gz 或窗口内没有任何一天的节目单时，该轮视为失败。
+
+多轮运行共用同一个工作目录：第一轮是冷缓存，之后各轮可看出响应缓存、304 再验证和节目单复用的效果。
+限速、重试等配置来自项目的 config.yaml，可用参数覆盖部分配置。
+
+用法：
+    python model/bench_e2e.py [--runs N] [--days N] [--no-rate-limit] [--latency 0.05] [--error-rate 0.05] ...
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+from channels import CHANNELS
+from guide_store import GuideStore
+from programme import SECONDS_PER_DAY, day_start
+from replay_server import ReplayServer, add_fault_arguments, faults_from_args, format_stats
+
+EPGO_SCRIPT = os.path.join(project_root, 'code', 'epgo.py')
+
+
+def prepare_config(args, workdir):
+    """把项目配置按参数修改后写入工作目录"""
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    if args.days:
+        config.setdefault('output', {})['days'] = args.days
+    if args.no_rate_limit:
+        config.setdefault('network', {}).setdefault('rate_limit', {})['enabled'] = False
+    if args.retry_delay is not None:
+        config.setdefault('network', {})['retry_delay'] = args.retry_delay
+
+    with open(os.path.join(workdir, 'config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    return config
+
+
+def completeness(workdir, config):
+    """统计工作目录中窗口内各天节目单的完整程度"""
+    output_config = config.get('output', {})
+    output_dir = os.path.join(workdir, output_config.get('dir', 'output'))
+    store = GuideStore(os.path.join(output_dir, output_config.get('guide_dir', 'guide')))
+
+    days = max(1, output_config.get('days', 1))
+    today = day_start()
+    saved = 0
+    rates = {}
+    local_channels = 0
+    programmes = 0
+    for i in range(days):
+        guide = store.load(today + i * SECONDS_PER_DAY)
+        if guide is None:
+            continue
+        saved += 1
+        channels = guide['channels']
+        covered = sum(1 for channel_id in CHANNELS if channels.get(channel_id, {}).get('programs'))
+        rates[i] = covered / len(CHANNELS) * 100
+        if i == 0:
+            local_channels = sum(1 for channel_id, data in channels.items()
+                                 if channel_id not in CHANNELS and data['programs'])
+        programmes += sum(len(data['programs']) for data in channels.values())
+
+    gz_file = os.path.join(output_dir, 'epg.gz')
+    return {
+        'days': f"{saved}/{days}",
+        'today_rate': rates.get(0, 0.0),
+        'mean_rate': sum(rates.values()) / len(rates) if rates else 0.0,
+        'local_channels': local_channels,
+        'programmes': programmes,
+        'epg_kb': os.path.getsize(gz_file) / 1024 if os.path.exists(gz_file) else 0.0,
+    }
+
+
+def check_run(returncode, log_path, output):
+    """返回一轮运行的失败原因列表"""
+    problems = []
+    if returncode != 0:
+        problems.append(f"退出码 {returncode}")
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        log = f.read()
+    if 'Traceback (most recent call last)' in log:
+        problems.append("日志中有未处理的异常")
+    errors = log.count(' - ERROR - ')
+    if errors:
+        # 回放服务器注入故障时会有请求失败的错误日志，只报告数量
+        print(f"  日志中有 {errors} 条错误")
+    if not output['epg_kb']:
+        problems.append("没有生成 epg.gz")
+    if output['days'].startswith('0/'):
+        problems.append("没有保存任何一天的节目单")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='完整流程基准（本地回放）')
+    parser.add_argument('--runs', type=int, default=1, help='运行轮数，之后各轮复用第一轮的缓存和节目单存档')
+    parser.add_argument('--days', type=int, default=None, help='覆盖 output.days')
+    parser.add_argument('--no-rate-limit', action='store_true', help='关闭按主机限速，只测抓取和解析本身')
+    parser.add_argument('--retry-delay', type=float, default=None, help='覆盖 network.retry_delay（秒）')
+    parser.add_argument('--config', default=os.path.join(project_root, 'config.yaml'), help='项目配置文件')
+    parser.add_argument('--workdir', default=None, help='工作目录，默认使用临时目录并在结束后删除')
+    parser.add_argument('--timeout', type=float, default=1800, help='单轮运行的超时时间（秒）')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='epgo-replay-')
+    os.makedirs(workdir, exist_ok=True)
+    config = prepare_config(args, workdir)
+
+    server = ReplayServer(faults_from_args(args), single_host=args.single_host).start()
+    env = dict(os.environ)
+    env.update(server.env())
+    print(f"工作目录: {workdir}")
+
+    rows = []
+    try:
+        for run in range(1, args.runs + 1):
+            server.reset_stats()
+            log_path = os.path.join(workdir, f"run{run}.log")
+            started = time.perf_counter()
+            with open(log_path, 'w', encoding='utf-8') as log:
+                result = subprocess.run([sys.executable, EPGO_SCRIPT], cwd=workdir, env=env,
+                                        stdout=log, stderr=subprocess.STDOUT, timeout=args.timeout)
+            elapsed = time.perf_counter() - started
+
+            stats = server.stats()
+            requests = sum(value for outcomes in stats.values()
+                           for outcome, value in outcomes.items() if outcome != 'bytes')
+            faults = sum(outcomes.get(outcome, 0) for outcomes in stats.values()
+                         for outcome in ('error', 'redirect', 'tiny'))
+            not_modified = sum(outcomes.get('not_modified', 0) for outcomes in stats.values())
+            output = completeness(workdir, config)
+
+            print(f"\n=== 第 {run} 轮：{elapsed:.1f} 秒，退出码 {result.returncode}，日志 {log_path} ===")
+            for line in format_stats(stats):
+                print(f"  {line}")
+            problems = check_run(result.returncode, log_path, output)
+            for problem in problems:
+                print(f"  失败: {problem}")
+            rows.append((run, elapsed, requests, not_modified, faults, output, problems))
+    finally:
+        server.stop()
+
+    print(f"\n{'轮次':<6}{'耗时(s)':>9}{'请求':>7}{'304':>6}{'故障':>6}{'天数':>7}"
+          f"{'今天成功率':>12}{'平均成功率':>12}{'地方台':>8}{'节目数':>9}{'epg.gz(KB)':>12}")
+    for run, elapsed, requests, not_modified, faults, output, _ in rows:
+        print(f"{run:<6}{elapsed:>9.1f}{requests:>7}{not_modified:>6}{faults:>6}{output['days']:>7}"
+              f"{output['today_rate']:>11.1f}%{output['mean_rate']:>11.1f}%"
+              f"{output['local_channels']:>8}{output['programmes']:>9}{output['epg_kb']:>12.1f}")
+
+    failed = [row[0] for row in rows if row[-1]]
+    if failed:
+        print(f"\n失败的轮次: {', '.join(map(str, failed))}，日志保留在 {workdir}")
+        return 1
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线解析基准
+
+对 model/fixtures 下的页面样本逐个运行各数据源的解析函数，报告每秒页面数和单页峰值内存分配，
+并与 model/fixtures/baseline.json 中的基线比较：速度下降或内存增加超过容差、解析结果变化时列出并返回非零退出码。
+
+样本目录：
+    tm/             电视猫时段页面（TM_CCTV/TM_SATELLITE 的 w{星期}-h{时段}.html）
+    tm2/            电视猫卫视、央视频道页面（ul#pgrow 或旧版 li 列表）
+    tmdf/province/  地方台省份首页（div.chlsnav 频道导航或无导航的旧版页面）
+    tmdf/channel/   地方台频道页面
+    ts/index/       tvsou 央视、卫视分类页面
+    ts/channel/     tvsou 频道节目表格页面
+    ct/             央视节目单接口返回的 JSONP
+
+样本按各解析函数依赖的页面结构手工构造（含导航、页脚等无关内容，体积与真实页面相近），
+不含任何入口地址。解析逻辑或页面结构变化后替换样本，再用 --update-baseline 重新生成基线。
+速度基线与机器有关，换机器后应先更新基线。
+
+用法：
+    python model/bench_fixtures.py [解析器 ...] [--rounds N] [--speed-tolerance 0.5] [--memory-tolerance 0.1] [--update-baseline]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+# 基准只做本地解析，不访问网络
+for name in ('B_WS', 'B_PROGRAM', 'TM_REFERER'):
+    os.environ.setdefault(name, 'http://localhost/')
+
+import capi
+import ct
+import tm
+import tm2
+import tmdf
+import ts
+from html_parse import make_soup
+from programme import Programme
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASELINE_FILE = os.path.join(FIXTURES_DIR, 'baseline.json')
+
+# 解析器名称 -> (样本文件, 解析函数)；解析函数接收页面文本
+PARSERS = {
+    'tm.slot_page': ('tm/*.html', tm.parse_slot_page),
+    'tm2.channel_page': ('tm2/*.html', tm2.parse_channel_html),
+    'tmdf.channel_list': ('tmdf/province/*.html', lambda html: tmdf.parse_channel_list(make_soup(html), '')),
+    'tmdf.channel_page': ('tmdf/channel/*.html', tmdf.parse_channel_html),
+    'ts.channel_links': ('ts/index/*.html', lambda html: ts.find_channel_links(make_soup(html))),
+    'ts.channel_page': ('ts/channel/*.html', ts.parse_channel_page),
+    'ct.jsonp': ('ct/*.jsonp', lambda text: ct.format_cctv_programs(capi.parse_jsonp(text))),
+}
+
+
+def load_pages(pattern):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((os.path.relpath(path, FIXTURES_DIR), f.read()))
+    return pages
+
+
+def plain(value):
+    """把解析结果转换为可比较、可序列化的结构"""
+    if isinstance(value, Programme):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {str(key): plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+
+def count_items(value):
+    """结果中的条目数：节目数或频道数"""
+    if isinstance(value, dict):
+        return len(value['programs']) if 'programs' in value else len(value)
+    if isinstance(value, tuple):
+        return len(value[1])
+    return len(value or ())
+
+
+def measure(parse_func, pages, rounds):
+    """
+    运行一个解析器
+
+    Returns:
+        每秒页面数、单页峰值内存分配（KB）、条目数和结果摘要
+    """
+    # 取最快一轮，减少其他进程和垃圾回收带来的波动
+    elapsed = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        results = [parse_func(html) for _, html in pages]
+        round_time = time.perf_counter() - start
+        elapsed = round_time if elapsed is None else min(elapsed, round_time)
+
+    # tracemalloc 会明显拖慢解析，峰值内存单独测量
+    peaks = []
+    for _, html in pages:
+        tracemalloc.start()
+        parse_func(html)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    snapshot = json.dumps([plain(result) for result in results], ensure_ascii=False, sort_keys=True)
+    return {
+        'pages_per_sec': round(len(pages) / elapsed, 1),
+        'peak_kb': round(max(peaks) / 1024, 1),
+        'items': sum(count_items(result) for result in results),
+        'digest': hashlib.sha1(snapshot.encode('utf-8')).hexdigest(),
+    }
+
+
+def compare(name, current, baseline, speed_tolerance, memory_tolerance):
+    """返回相对基线的退化描述列表"""
+    problems = []
+    if current['digest'] != baseline['digest'] or current['items'] != baseline['items']:
+        problems.append(f"{name}: 解析结果变化（条目 {baseline['items']} -> {current['items']}）")
+    if current['pages_per_sec'] < baseline['pages_per_sec'] * (1 - speed_tolerance):
+        problems.append(f"{name}: 速度下降 {baseline['pages_per_sec']} -> {current['pages_per_sec']} 页/秒")
+    if current['peak_kb'] > baseline['peak_kb'] * (1 + memory_tolerance):
+        problems.append(f"{name}: 峰值内存增加 {baseline['peak_kb']} -> {current['peak_kb']} KB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线解析基准')
+    parser.add_argument('parsers', nargs='*', help=f"只运行指定解析器：{', '.join(PARSERS)}")
+    parser.add_argument('--rounds', type=int, default=20, help='每个样本的重复次数')
+    # 速度受机器负载影响较大，峰值内存和解析结果与负载无关
+    parser.add_argument('--speed-tolerance', type=float, default=0.5, help='速度相对基线允许下降的比例')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='峰值内存相对基线允许增加的比例')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线')
+    args = parser.parse_args()
+
+    # 解析函数的逐条日志会干扰计时
+    logging.disable(logging.CRITICAL)
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    names = args.parsers or list(PARSERS)
+    unknown = [name for name in names if name not in PARSERS]
+    if unknown:
+        parser.error(f"未知解析器: {', '.join(unknown)}")
+
+    print(f"{'解析器':<20}{'样本':>6}{'页/秒':>10}{'基线':>10}{'峰值KB':>10}{'基线':>10}{'条目':>8}  结果")
+    problems = []
+    results = {}
+    for name in names:
+        pattern, parse_func = PARSERS[name]
+        pages = load_pages(pattern)
+        if not pages:
+            print(f"{name:<20}{0:>6}  没有样本: {pattern}")
+            continue
+
+        current = measure(parse_func, pages, args.rounds)
+        results[name] = current
+        baseline = baselines.get(name)
+        if baseline:
+            problems.extend(compare(name, current, baseline, args.speed_tolerance, args.memory_tolerance))
+            status = '一致' if current['digest'] == baseline['digest'] else '变化'
+            print(f"{name:<20}{len(pages):>6}{current['pages_per_sec']:>10}{baseline['pages_per_sec']:>10}"
+                  f"{current['peak_kb']:>10}{baseline['peak_kb']:>10}{current['items']:>8}  {status}")
+        else:
+            print(f"{name:<20}{len(pages):>6}{current['pages_per_sec']:>10}{'-':>10}"
+                  f"{current['peak_kb']:>10}{'-':>10}{current['items']:>8}  无基线")
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n基线已写入 {os.path.relpath(BASELINE_FILE, project_root)}")
+        return 0
+
+    if problems:
+        print("\n相对基线的退化：")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
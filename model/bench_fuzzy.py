@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+频道模糊匹配基准
+
+用 channels.CHANNELS 的标准名称作为候选，生成几千个合成频道名称，
+对比逐个 difflib.SequenceMatcher 与 fuzzy_match.FuzzyMatcher 的耗时，并确认匹配结果完全一致。
+
+用法：
+    python model/bench_fuzzy.py [--count N] [--threshold 0.8] [--seed 1]
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+from channel_mapping import ChannelIndex
+from channels import CHANNELS
+from fuzzy_match import FuzzyMatcher
+
+NOISE_CHARS = '台频道高清卫视综合新闻少儿HD4K -+公共都市生活影视'
+
+
+def synthetic_names(base_names, count, rng):
+    """对真实频道名称做增删改，另外混入随机的地方频道名称"""
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            names.append(''.join(rng.choice(NOISE_CHARS) for _ in range(rng.randint(2, 8))))
+            continue
+        chars = list(rng.choice(base_names))
+        for _ in range(rng.randint(0, 3)):
+            op = rng.random()
+            pos = rng.randrange(len(chars) + 1)
+            if op < 0.4:
+                chars.insert(pos, rng.choice(NOISE_CHARS))
+            elif op < 0.7 and len(chars) > 1:
+                del chars[min(pos, len(chars) - 1)]
+            elif chars:
+                chars[min(pos, len(chars) - 1)] = rng.choice(NOISE_CHARS)
+        names.append(''.join(chars))
+    return names
+
+
+def linear_match(candidates, query, threshold):
+    """原 epgo.match_channel 的模糊匹配逻辑"""
+    best_match = None
+    best_score = 0
+    for channel_id, standard_channel in candidates:
+        score = difflib.SequenceMatcher(None, query, standard_channel).ratio()
+        if score > best_score and score >= threshold:
+            best_score = score
+            best_match = channel_id
+    return best_match, best_score
+
+
+def main():
+    parser = argparse.ArgumentParser(description='频道模糊匹配基准')
+    parser.add_argument('--count', type=int, default=3000, help='合成频道名称数量')
+    parser.add_argument('--threshold', type=float, default=0.8, help='模糊匹配阈值')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    candidates = ChannelIndex(CHANNELS).standard_names
+    queries = synthetic_names([name for _, name in candidates], args.count, random.Random(args.seed))
+
+    start = time.perf_counter()
+    expected = [linear_match(candidates, query, args.threshold) for query in queries]
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(candidates)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [matcher.best_match(query, args.threshold) for query in queries]
+    indexed_time = time.perf_counter() - start
+
+    mismatches = [(q, e, a) for q, e, a in zip(queries, expected, actual) if e != a]
+    matched = sum(1 for key, _ in actual if key)
+
+    print("=== 频道模糊匹配基准 ===")
+    print(f"候选频道: {len(candidates)}，查询: {len(queries)}，阈值: {args.threshold}，匹配成功: {matched}")
+    print(f"逐个 SequenceMatcher: {linear_time:.2f} 秒")
+    print(f"倒排索引 + 上限剪枝: {indexed_time:.2f} 秒（建索引 {build_time * 1000:.1f} 毫秒），"
+          f"加速 {linear_time / indexed_time:.1f}x")
+    print(f"结果不一致: {len(mismatches)}")
+    for query, exp, act in mismatches[:10]:
+        print(f"  {query}: 原 {exp}，新 {act}")
+
+
+if __name__ == '__main__':
+    main()
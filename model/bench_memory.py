@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节目记录内存基准
+
+模拟一周内全部 31 个省份地方台的节目单，对比节目字典与 programme.Programme
+（__slots__ + 标题驻留）的内存占用。
+
+用法：
+    python model/bench_memory.py [--days 7] [--provinces 31] [--channels 12] [--programs 45]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+from programme import Programme, assign_start_times, weekday_start
+
+# 在各频道、各天反复出现的节目
+COMMON_TITLES = [
+    '新闻联播', '天气预报', '焦点访谈', '广告', '本地新闻', '晚间新闻', '早间新闻',
+    '健康之路', '今日说法', '动物世界', '精彩节目预告', '午夜剧场', '财经报道', '体育新闻',
+]
+SERIES_TITLES = ['电视剧：山河月明', '电视剧：人世间', '电视剧：父母爱情', '动画片：熊出没', '纪录片：航拍中国']
+
+
+def page_text(title):
+    # 每次解析页面得到的都是新的字符串对象，这里同样每次新建
+    return ''.join(list(title))
+
+
+def build_guides(days, provinces, channels, programs, rng, record):
+    guides = []
+    for day in range(1, days + 1):
+        anchor = weekday_start(day)
+        for _ in range(provinces):
+            for _ in range(channels):
+                items = []
+                minute = 6 * 60
+                for _ in range(programs):
+                    roll = rng.random()
+                    if roll < 0.6:
+                        title, episode = rng.choice(COMMON_TITLES), None
+                    elif roll < 0.9:
+                        title, episode = rng.choice(SERIES_TITLES), str(rng.randint(1, 40))
+                    else:
+                        title, episode = f'专题节目{rng.randint(1, 100000)}', None
+                    time_str = f"{minute // 60 % 24:02d}:{minute % 60:02d}"
+                    items.append(record(page_text(time_str), page_text(title), episode))
+                    minute += rng.choice((15, 30, 45, 60))
+                guides.append(assign_start_times(items, anchor))
+    return guides
+
+
+def as_dict(time_str, title, episode):
+    return {'time': time_str, 'title': title, 'episode': episode}
+
+
+def measure(label, record, args):
+    tracemalloc.start()
+    guides = build_guides(args.days, args.provinces, args.channels, args.programs, random.Random(args.seed), record)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = sum(len(items) for items in guides)
+    print(f"{label:<22}{count:>10}{current / 1024 / 1024:>12.1f}{current / count:>14.0f}")
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description='节目记录内存基准')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--provinces', type=int, default=31)
+    parser.add_argument('--channels', type=int, default=12, help='每个省份的频道数')
+    parser.add_argument('--programs', type=int, default=45, help='每个频道每天的节目数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print("=== 节目记录内存基准 ===")
+    print(f"{'记录类型':<20}{'节目数':>10}{'内存(MB)':>12}{'每条(字节)':>12}")
+    before = measure('dict', as_dict, args)
+    after = measure('Programme', Programme, args)
+    print(f"节省 {(before - after) / 1024 / 1024:.1f} MB（{(1 - after / before) * 100:.0f}%）")
+
+
+if __name__ == '__main__':
+    main()
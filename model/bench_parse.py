@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节目页面解析基准
+
+对比整页 html.parser 解析与 html_parse.ProgramPage（lxml + SoupStrainer）的单页耗时，
+并确认两种方式解析出的频道名称和节目完全一致。
+
+用法：
+    python model/bench_parse.py [页面文件 ...] [--rounds N]
+不指定页面文件时使用内置的模拟页面（结构与 tm2/tmdf 的节目页面相同）。
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+# 基准只做本地解析，不访问网络
+for name in ('B_WS', 'B_PROGRAM', 'TM_REFERER'):
+    os.environ.setdefault(name, 'http://localhost/')
+
+from bs4 import BeautifulSoup
+
+import tm2
+import tmdf
+from html_parse import PARSER, ProgramPage
+
+
+def build_sample_page(program_count=40, nav_count=300, with_pgrow=True):
+    """生成模拟节目页面：大量导航链接 + 节目列表"""
+    nav = ''.join(
+        f'<li><a href="/program/CH{i}-w1.html" title="频道{i}节目表">频道{i}</a></li>'
+        for i in range(nav_count)
+    )
+    if with_pgrow:
+        items = ''.join(
+            f'<li><span class="am">{i // 2:02d}:{(i % 2) * 30:02d}</span>'
+            f'<span class="p_show"><a href="/tvcolumn/{i}">节目{i}</a>({i + 1})</span></li>'
+            for i in range(program_count)
+        )
+        programs = f'<ul id="pgrow">{items}</ul>'
+    else:
+        programs = '<ul>' + ''.join(
+            f'<li>{i // 2:02d}:{(i % 2) * 30:02d} 节目{i}({i + 1})</li>' for i in range(program_count)
+        ) + '</ul>'
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>测试卫视节目表_电视猫</title>'
+        '<script>var x = 1;</script></head><body>'
+        f'<div class="top"><ul class="nav">{nav}</ul></div>'
+        '<div class="breadcrumb"><a href="/">首页</a><a href="/program/TEST1-w1.html">测试卫视</a></div>'
+        f'<div class="mt10"><h1>测试卫视节目表</h1>{programs}</div>'
+        '<div class="footer">' + '<p>说明文字</p>' * 200 + '</div>'
+        '</body></html>'
+    )
+
+
+def parse_full(module, html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return module.parse_channel_name(soup), module.parse_program_items(soup)
+
+
+def parse_strained(module, html):
+    page = ProgramPage(html)
+    return module.parse_channel_name(page), module.parse_program_items(page)
+
+
+def bench(func, module, html, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func(module, html)
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='节目页面解析基准')
+    parser.add_argument('pages', nargs='*', help='保存的节目页面HTML文件')
+    parser.add_argument('--rounds', type=int, default=50, help='每个页面的重复次数')
+    args = parser.parse_args()
+
+    # 解析函数的逐条日志会干扰计时
+    logging.disable(logging.CRITICAL)
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+    else:
+        pages = [
+            ('模拟页面(pgrow)', build_sample_page()),
+            ('模拟页面(通用li)', build_sample_page(with_pgrow=False)),
+        ]
+
+    print(f"=== 节目页面解析基准（新解析器: {PARSER} + SoupStrainer）===")
+    print(f"{'页面':<20}{'模块':<6}{'整页(ms)':>10}{'按需(ms)':>10}{'加速':>8}  结果一致")
+    for label, html in pages:
+        for module in (tm2, tmdf):
+            before, expected = bench(parse_full, module, html, args.rounds)
+            after, actual = bench(parse_strained, module, html, args.rounds)
+            same = '是' if expected == actual else '否'
+            print(f"{label:<20}{module.__name__:<6}{before:>10.2f}{after:>10.2f}{before / after:>7.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+电视猫时段页面提取基准
+
+对比改写前的 tm 提取逻辑（逐个表格遍历、每格重新编译正则；节目项逐种方式重复遍历元素）
+与当前的单遍提取（预编译正则、按页面模板记下适用的解析方式），并确认两者结果完全一致。
+
+用法：
+    python model/bench_tm.py [时段页面文件 ...] [--rounds N]
+不指定页面文件时使用内置的模拟页面（结构与电视猫时段节目表相同）。
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+from bs4 import BeautifulSoup
+
+import tm
+from channel_mapping import normalize_channel_name
+from programme import Programme
+
+
+def legacy_fetch_program_items(soup):
+    """改写前的 tm.fetch_program_items，作为对照"""
+    programs = []
+    tables = soup.find_all('table')
+    processed_channels = set()
+    for table in tables:
+        rows = table.find_all('tr')
+        for row in rows:
+            cells = row.find_all(['td', 'th'])
+            if len(cells) >= 2:
+                channel_name = cells[0].text.strip()
+                if not channel_name:
+                    continue
+                standard_channel_name = normalize_channel_name(channel_name)
+                if standard_channel_name in processed_channels:
+                    continue
+                processed_channels.add(standard_channel_name)
+                for i, cell in enumerate(cells[1:], 2):
+                    cell_text = cell.text.strip()
+                    if not cell_text:
+                        continue
+                    time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', cell_text)
+                    if time_match:
+                        start_time = time_match.group(1)
+                        end_time = time_match.group(2)
+                        pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', cell_text).strip()
+                        pure_title = re.sub(r'\s+', ' ', pure_title)
+                        if pure_title and start_time and end_time:
+                            programs.append((standard_channel_name, Programme(start_time, pure_title, end_time=end_time)))
+    return programs
+
+
+def legacy_parse_program_item(item):
+    """改写前的 tm.parse_program_item（去掉异常日志），作为对照"""
+    def split_range(time_str, title):
+        title_time_match = re.search(r'(\d{2}:\d{2})-(\d{2}:\d{2})', title)
+        if title_time_match:
+            pure_title = re.sub(r'\s*\d{2}:\d{2}-\d{2}:\d{2}\s*$', '', title).strip()
+            return Programme(title_time_match.group(1), pure_title)
+        return None
+
+    spans = item.find_all('span')
+    if len(spans) >= 2:
+        time_str = spans[0].text.strip()
+        title = spans[1].text.strip()
+        if time_str and title and ':' in time_str:
+            return split_range(time_str, title) or Programme(time_str, title)
+
+    time_elem = item.find(['span', 'div', 'p'], class_=lambda cls: cls and ('time' in cls or 'program-time' in cls or 'start-time' in cls))
+    title_elem = item.find(['span', 'div', 'p'], class_=lambda cls: cls and ('title' in cls or 'program-title' in cls or 'name' in cls))
+    if time_elem and title_elem:
+        time_str = time_elem.text.strip()
+        title = title_elem.text.strip()
+        if time_str and title and ':' in time_str:
+            return split_range(time_str, title) or Programme(time_str, title)
+
+    for text in (item.text.strip(), ' '.join(item.stripped_strings)):
+        if text:
+            time_match = re.search(r'(\d{2}:\d{2})', text)
+            if time_match:
+                time_str = time_match.group(1)
+                title = text[time_match.end():].strip()
+                program = split_range(time_str, title)
+                if program:
+                    return program
+                if title:
+                    return Programme(time_str, title)
+    return None
+
+
+def build_grid_page(channel_count=40, slot_count=12, nav_count=300):
+    """生成模拟时段页面：导航、每行一个频道的节目表格和页脚"""
+    nav = ''.join(f'<li><a href="/program/CH{i}-w1.html">频道{i}</a></li>' for i in range(nav_count))
+    rows = []
+    for channel in range(channel_count):
+        name = f'CCTV-{channel + 1}' if channel < 17 else f'测试{channel}卫视'
+        cells = ''.join(
+            f'<td><a href="/tvcolumn/{channel}-{slot}">节目{channel}_{slot}</a> 第{slot + 1}集 '
+            f'{slot * 10 // 60:02d}:{slot * 10 % 60:02d}-{(slot + 1) * 10 // 60:02d}:{(slot + 1) * 10 % 60:02d}</td>'
+            for slot in range(slot_count)
+        )
+        rows.append(f'<tr><td class="chn"><a href="/program/CH{channel}">{name}</a></td>{cells}</tr>')
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>电视节目表</title></head><body>'
+        f'<div class="top"><ul class="nav">{nav}</ul></div>'
+        f'<table class="timetable"><tr><th>频道</th><th>时段</th></tr>{"".join(rows)}</table>'
+        '<div class="footer">' + '<p>说明文字</p>' * 200 + '</div>'
+        '</body></html>'
+    )
+
+
+def build_item_list(layout, count=200):
+    """生成一种结构的节目项列表"""
+    items = []
+    for i in range(count):
+        time_str = f'{i * 7 // 60 % 24:02d}:{i * 7 % 60:02d}'
+        title = f'节目{i} 第{i % 30 + 1}集'
+        if layout == 'span':
+            items.append(f'<li><span class="am">{time_str}</span><span class="p_show"><a href="#">{title}</a></span></li>')
+        elif layout == 'class':
+            items.append(f'<li><div class="program-time">{time_str}</div><p class="program-title">{title}</p></li>')
+        else:
+            items.append(f'<li><b>{time_str}</b> <i>{title}</i></li>')
+    return BeautifulSoup(f'<ul>{"".join(items)}</ul>', 'html.parser').find_all('li')
+
+
+def bench(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func(arg)
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def snapshot(pairs):
+    return [(channel, (p['time'], p['title'], p['end_time'])) for channel, p in pairs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='电视猫时段页面提取基准')
+    parser.add_argument('pages', nargs='*', help='保存的电视猫时段页面HTML文件')
+    parser.add_argument('--rounds', type=int, default=20, help='每个页面的重复次数')
+    args = parser.parse_args()
+
+    # 解析函数的逐条日志会干扰计时
+    logging.disable(logging.CRITICAL)
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+    else:
+        pages = [('模拟时段页面', build_grid_page())]
+
+    print("=== 时段页面提取（整页解析 + 提取）===")
+    print(f"{'页面':<20}{'改写前(ms)':>12}{'当前(ms)':>10}{'加速':>8}  结果一致")
+    for label, html in pages:
+        before, expected = bench(lambda h: legacy_fetch_program_items(BeautifulSoup(h, 'html.parser')), html, args.rounds)
+        after, actual = bench(tm.parse_slot_page, html, args.rounds)
+        same = '是' if snapshot(expected) == snapshot(actual) else '否'
+        print(f"{label:<20}{before:>12.2f}{after:>10.2f}{before / after:>7.1f}x  {same}")
+
+    print("\n=== 时段页面提取（同一棵树，不含建树）===")
+    print(f"{'页面':<20}{'改写前(ms)':>12}{'当前(ms)':>10}{'加速':>8}  结果一致")
+    for label, html in pages:
+        soup = BeautifulSoup(html, 'html.parser')
+        before, expected = bench(legacy_fetch_program_items, soup, args.rounds)
+        after, actual = bench(tm.fetch_program_items, soup, args.rounds)
+        same = '是' if snapshot(expected) == snapshot(actual) else '否'
+        print(f"{label:<20}{before:>12.2f}{after:>10.2f}{before / after:>7.1f}x  {same}")
+
+    print("\n=== 节目项解析（每种结构 200 项，不含建树）===")
+    print(f"{'结构':<20}{'改写前(ms)':>12}{'当前(ms)':>10}{'加速':>8}  结果一致")
+    key = lambda p: None if p is None else (p['time'], p['title'])
+    for layout in ('span', 'class', 'text'):
+        items = build_item_list(layout)
+        before, expected = bench(lambda its: [legacy_parse_program_item(it) for it in its], items, args.rounds)
+        after, actual = bench(lambda its: [tm.parse_program_item(it, '') for it in its], items, args.rounds)
+        same = '是' if list(map(key, expected)) == list(map(key, actual)) else '否'
+        print(f"{layout:<20}{before:>12.2f}{after:>10.2f}{before / after:>7.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地回放服务器
+
+按各抓取模块拼出的地址回放 model/fixtures 中的页面样本，用于在不访问外网的情况下
+测量完整抓取流程（调度、重试、限速、缓存）的耗时：
+
+    TM_CCTV / TM_SATELLITE   /tm/cctv/w{星期}-h{时段}.html、/tm/satellite/...   -> tm/
+    B_PROGRAM                /program/{省份代码}                                -> tmdf/province/
+                             /program/{频道代码}-w{星期}.html                    -> tm2/（CCTV-*）或 tmdf/channel/
+    B_WS                     /ws/{频道代码}-w{星期}.html                         -> tm2/
+    TM_REFERER               /                                                  首页
+    CCTV_API_URL             /api/epginfo?c={channel_id}&d={date_str}           -> ct/
+    TVSOU_URL                /epg/yangshi/、/epg/weishi/{频道}                   -> ts/index/、ts/channel/
+
+没有对应样本时按请求地址稳定地选用同类样本：时段页面的时间换算到请求的时段，
+省份页面的频道代码换成请求的省份（频道名称前加省份代码，避免各省重名），
+央视接口的节目时间换算到请求的日期。
+响应带 ETag，条件请求返回 304，与 http_client 的缓存再验证配合。
+
+可注入延迟和故障：返回 503、重定向到 /ccp/ 验证页面、返回过小的页面（后两种只针对网页，不针对央视接口）。
+各数据源使用不同的回环地址（127.0.0.2~5），按主机的限速和并发配置与真实站点一样分开生效；
+无法绑定这些地址时退回 127.0.0.1。
+
+用法：
+    python model/replay_server.py [--latency 0.05] [--error-rate 0.05] ...
+启动后打印需要设置的环境变量，Ctrl-C 停止并打印请求统计。完整流程基准见 model/bench_e2e.py。
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 添加项目根目录和code目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'code'))
+
+from programme import BEIJING_TZ, SECONDS_PER_DAY, UTC_OFFSET
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 各数据源的回环地址
+SOURCE_HOSTS = {
+    'cctv': '127.0.0.2',
+    'tm': '127.0.0.3',
+    'tvmao': '127.0.0.4',
+    'tvsou': '127.0.0.5',
+}
+FALLBACK_HOST = '127.0.0.1'
+
+TIME_RANGE = re.compile(r'(\d{2}):(\d{2})-(\d{2}):(\d{2})')
+JSONP = re.compile(r'\s*([\w.]+)\((.*)\)\s*;?\s*$', re.S)
+SLOT_FILE = re.compile(r'-w\d+-h(\d+)\.html$')
+
+HOME_PAGE = '<!DOCTYPE html><html><head><meta charset="utf-8"><title>电视节目表</title></head><body>' + \
+    '<p>回放服务器首页</p>' * 40 + '</body></html>'
+CAPTCHA_PAGE = '<html><body>请完成验证</body></html>'
+TINY_PAGE = '<html><body>访问过于频繁</body></html>'
+
+
+class FaultConfig:
+    """
+    注入的延迟和故障
+
+    Args:
+        latency: 每个响应前等待的秒数
+        jitter: 在 latency 之外随机增加 0~jitter 秒
+        error_rate: 返回 503 的比例
+        redirect_rate: 重定向到 /ccp/ 验证页面的比例
+        tiny_rate: 返回过小页面的比例
+        seed: 随机数种子，相同的种子和请求顺序得到相同的故障
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, redirect_rate=0.0, tiny_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.redirect_rate = redirect_rate
+        self.tiny_rate = tiny_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            extra = self._random.random() * self.jitter if self.jitter else 0.0
+        return self.latency + extra
+
+    def fault(self, html):
+        """返回本次请求注入的故障：'error'、'redirect'、'tiny' 或 None"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return 'error'
+        if not html:
+            return None
+        roll -= self.error_rate
+        if roll < self.redirect_rate:
+            return 'redirect'
+        if roll - self.redirect_rate < self.tiny_rate:
+            return 'tiny'
+        return None
+
+
+class FixtureSet:
+    """
+    页面样本
+
+    Args:
+        directory: 样本目录
+    """
+
+    def __init__(self, directory=FIXTURES_DIR):
+        self.directory = directory
+        self._pages = {}
+        for path in glob.glob(os.path.join(directory, '**', '*.*'), recursive=True):
+            if path.endswith(('.html', '.jsonp')):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._pages[os.path.relpath(path, directory).replace(os.sep, '/')] = f.read()
+
+    def get(self, name):
+        return self._pages.get(name)
+
+    def pick(self, pattern, key, exclude=None):
+        """
+        按 key 稳定地从匹配 pattern 的样本中选一个
+
+        Returns:
+            (样本名称, 内容)，没有匹配的样本时返回 (None, None)
+        """
+        regex = re.compile(pattern)
+        names = sorted(name for name in self._pages if regex.fullmatch(name) and not (exclude and exclude(name)))
+        if not names:
+            return None, None
+        name = names[zlib.crc32(key.encode('utf-8')) % len(names)]
+        return name, self._pages[name]
+
+
+def shift_time_ranges(text, hours):
+    """把页面中的 HH:MM-HH:MM 整体平移若干小时"""
+    if not hours:
+        return text
+
+    def shift(match):
+        start = (int(match.group(1)) + hours) % 24
+        end = (int(match.group(3)) + hours) % 24
+        return f"{start:02d}:{match.group(2)}-{end:02d}:{match.group(4)}"
+
+    return TIME_RANGE.sub(shift, text)
+
+
+def day_of_label(date_str):
+    """'YYYYmmdd' -> 北京时间当天零点的时间戳，格式不正确时返回 None"""
+    try:
+        return int(datetime.strptime(date_str, '%Y%m%d').replace(tzinfo=BEIJING_TZ).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+class Routes:
+    """
+    把请求地址对应到样本
+
+    每个方法返回 (数据源, 内容类型, 内容)，没有样本时内容为 None。
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.table = [
+            (re.compile(r'/tm/(cctv|satellite)/w(\d)-h(\d+)\.html'), self.tm_slot),
+            (re.compile(r'/program/(CCTV-[^/]+)-w(\d)\.html'), self.tm2_program),
+            (re.compile(r'/program/([^/]+)-w(\d)\.html'), self.tmdf_channel),
+            (re.compile(r'/program/([A-Za-z0-9]+)'), self.tmdf_province),
+            (re.compile(r'/ws/([^/]+)-w(\d)\.html'), self.tm2_ws),
+            (re.compile(r'/api/epginfo'), self.cctv_api),
+            (re.compile(r'/epg/(yangshi|weishi)/'), self.tvsou_index),
+            (re.compile(r'/epg/(yangshi|weishi)/([^/]+)'), self.tvsou_channel),
+            (re.compile(r'/ccp/.*'), self.captcha),
+            (re.compile(r'/'), self.home),
+        ]
+
+    def resolve(self, path, query):
+        for pattern, handler in self.table:
+            match = pattern.fullmatch(path)
+            if match:
+                return handler(query, *match.groups())
+        return 'other', 'text/html', None
+
+    def tm_slot(self, query, kind, weekday, slot):
+        page = self.fixtures.get(f"tm/{kind}-w{weekday}-h{slot}.html")
+        if page is None:
+            name, page = self.fixtures.pick(rf'tm/{kind}-w\d+-h\d+\.html', f"{kind}{weekday}{slot}")
+            if page is not None:
+                page = shift_time_ranges(page, int(slot) - int(SLOT_FILE.search(name).group(1)))
+        return 'tm', 'text/html; charset=utf-8', page
+
+    def tm2_program(self, query, code, weekday):
+        page = self.fixtures.get(f"tm2/{code}-w1.html")
+        if page is None:
+            _, page = self.fixtures.pick(r'tm2/CCTV-.*\.html', code)
+        return 'tm2', 'text/html; charset=utf-8', page
+
+    def tm2_ws(self, query, code, weekday):
+        page = self.fixtures.get(f"tm2/{code}-w1.html")
+        if page is None:
+            _, page = self.fixtures.pick(r'tm2/.*\.html', code, exclude=lambda name: name.startswith('tm2/CCTV-'))
+        return 'tm2', 'text/html; charset=utf-8', page
+
+    def tmdf_channel(self, query, code, weekday):
+        page = self.fixtures.get(f"tmdf/channel/{code}-w1.html")
+        if page is None:
+            _, page = self.fixtures.pick(r'tmdf/channel/.*\.html', code)
+        return 'tmdf', 'text/html; charset=utf-8', page
+
+    def tmdf_province(self, query, code):
+        page = self.fixtures.get(f"tmdf/province/{code}.html")
+        if page is None:
+            # 以带频道导航的省份页面为模板
+            name, page = self.fixtures.pick(r'tmdf/province/.*\.html', code,
+                                            exclude=lambda name: 'chlsnav' not in self.fixtures.get(name))
+            if page is not None:
+                template_code = os.path.splitext(os.path.basename(name))[0]
+                page = re.sub(r'(class="black_link" href="[^"]*" title=")', rf'\1{code} ',
+                              page.replace(template_code, code))
+        return 'tmdf', 'text/html; charset=utf-8', page
+
+    def cctv_api(self, query, *_):
+        channel = query.get('c', [''])[0]
+        day = day_of_label(query.get('d', [''])[0])
+        if not channel or day is None:
+            return 'cctv', 'application/javascript', json.dumps({'errcode': '1001', 'msg': '参数错误'})
+
+        page = self.fixtures.get(f"ct/{channel}.jsonp")
+        if page is None:
+            _, page = self.fixtures.pick(r'ct/.*\.jsonp', channel)
+            if page is None:
+                return 'cctv', 'application/javascript', None
+        callback, payload = JSONP.match(page).groups()
+        data = json.loads(payload)
+
+        # 节目时间换算到请求的日期，频道键换成请求的频道
+        channel_data = next(iter(data['data'].values()))
+        programs = channel_data['list']
+        if programs:
+            first = programs[0]['startTime']
+            offset = day - (first - (first + UTC_OFFSET) % SECONDS_PER_DAY)
+            for program in programs:
+                program['startTime'] += offset
+                program['endTime'] += offset
+        data['data'] = {channel: channel_data}
+        callback = query.get('cb', [callback])[0]
+        return 'cctv', 'application/javascript', f"{callback}({json.dumps(data, ensure_ascii=False)});"
+
+    def tvsou_index(self, query, kind):
+        return 'tvsou', 'text/html; charset=utf-8', self.fixtures.get(f"ts/index/{kind}.html")
+
+    def tvsou_channel(self, query, kind, code):
+        page = self.fixtures.get(f"ts/channel/{code}.html")
+        if page is None:
+            _, page = self.fixtures.pick(r'ts/channel/.*\.html', code)
+        return 'tvsou', 'text/html; charset=utf-8', page
+
+    def captcha(self, query, *_):
+        return 'ccp', 'text/html; charset=utf-8', CAPTCHA_PAGE
+
+    def home(self, query, *_):
+        return 'home', 'text/html; charset=utf-8', HOME_PAGE
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        replay = self.server.replay
+        parts = urlsplit(self.path)
+        source, content_type, body = replay.routes.resolve(parts.path, parse_qs(parts.query))
+
+        delay = replay.faults.delay()
+        if delay:
+            time.sleep(delay)
+
+        if body is None:
+            replay.count(source, 'missing')
+            self.respond(404, 'text/html; charset=utf-8', '<html><body>404</body></html>')
+            return
+
+        if source in ('ccp', 'home'):
+            replay.count(source, 'ok')
+            self.respond(200, content_type, body)
+            return
+
+        fault = replay.faults.fault(html=source != 'cctv')
+        if fault == 'error':
+            replay.count(source, 'error')
+            self.respond(503, 'text/html; charset=utf-8', '<html><body>503 Service Unavailable</body></html>')
+        elif fault == 'redirect':
+            replay.count(source, 'redirect')
+            self.respond(302, 'text/html; charset=utf-8', '', {'Location': f"/ccp/verify?from={parts.path}"})
+        elif fault == 'tiny':
+            replay.count(source, 'tiny')
+            self.respond(200, 'text/html; charset=utf-8', TINY_PAGE)
+        else:
+            encoded = body.encode('utf-8')
+            etag = '"' + hashlib.sha1(encoded).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                replay.count(source, 'not_modified')
+                self.respond(304, None, None, {'ETag': etag})
+                return
+            replay.count(source, 'ok')
+            replay.count(source, 'bytes', len(encoded))
+            self.respond(200, content_type, encoded, {'ETag': etag})
+
+    def respond(self, status, content_type, body, headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class ReplayServer:
+    """
+    回放服务器，每个回环地址一个监听线程
+
+    Args:
+        faults: 注入的延迟和故障，默认不注入
+        fixtures: 页面样本，默认读取 model/fixtures
+        single_host: 为 True 时所有数据源都使用 127.0.0.1
+    """
+
+    def __init__(self, faults=None, fixtures=None, single_host=False):
+        self.faults = faults or FaultConfig()
+        self.routes = Routes(fixtures or FixtureSet())
+        self.single_host = single_host
+        self.addresses = {}
+        self._servers = {}
+        self._threads = []
+        self._stats = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, source, outcome, value=1):
+        with self._lock:
+            self._stats[(source, outcome)] += value
+
+    def stats(self):
+        """返回 {数据源: {结果: 次数}}，结果中的 bytes 为返回的字节数"""
+        with self._lock:
+            items = list(self._stats.items())
+        stats = {}
+        for (source, outcome), value in sorted(items):
+            stats.setdefault(source, {})[outcome] = value
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _listen(self, host):
+        server = ThreadingHTTPServer((host, 0), ReplayHandler)
+        server.replay = self
+        server.request_queue_size = 64
+        thread = threading.Thread(target=server.serve_forever, name=f"replay-{host}", daemon=True)
+        thread.start()
+        self._servers[host] = server
+        self._threads.append(thread)
+        return f"{host}:{server.server_address[1]}"
+
+    def start(self):
+        for source, host in SOURCE_HOSTS.items():
+            if self.single_host:
+                host = FALLBACK_HOST
+            if host in self._servers:
+                server = self._servers[host]
+                self.addresses[source] = f"{host}:{server.server_address[1]}"
+                continue
+            try:
+                self.addresses[source] = self._listen(host)
+            except OSError as e:
+                logger.warning(f"无法监听 {host}（{e}），{source} 改用 {FALLBACK_HOST}")
+                if FALLBACK_HOST not in self._servers:
+                    self._listen(FALLBACK_HOST)
+                server = self._servers[FALLBACK_HOST]
+                self.addresses[source] = f"{FALLBACK_HOST}:{server.server_address[1]}"
+        return self
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def env(self):
+        """指向回放服务器的入口环境变量"""
+        return {
+            'CCTV_API_URL': f"http://{self.addresses['cctv']}/api/epginfo?c={{channel_id}}&d={{date_str}}&cb=setItem1",
+            'TM_CCTV': f"http://{self.addresses['tm']}/tm/cctv/",
+            'TM_SATELLITE': f"http://{self.addresses['tm']}/tm/satellite/",
+            'B_PROGRAM': f"http://{self.addresses['tvmao']}/program/",
+            'B_WS': f"http://{self.addresses['tvmao']}/ws/",
+            'TM_REFERER': f"http://{self.addresses['tvmao']}/",
+            'TVSOU_URL': f"http://{self.addresses['tvsou']}",
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_fault_arguments(parser):
+    """添加注入延迟和故障的命令行参数"""
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应前等待的秒数')
+    parser.add_argument('--jitter', type=float, default=0.0, help='在 latency 之外随机增加的最大秒数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的比例')
+    parser.add_argument('--redirect-rate', type=float, default=0.0, help='重定向到 /ccp/ 验证页面的比例')
+    parser.add_argument('--tiny-rate', type=float, default=0.0, help='返回过小页面的比例')
+    parser.add_argument('--seed', type=int, default=None, help='故障注入的随机数种子')
+    parser.add_argument('--single-host', action='store_true', help='所有数据源都使用 127.0.0.1')
+
+
+def faults_from_args(args):
+    return FaultConfig(args.latency, args.jitter, args.error_rate, args.redirect_rate, args.tiny_rate, args.seed)
+
+
+def format_stats(stats):
+    """把请求统计格式化为每个数据源一行"""
+    lines = []
+    for source, outcomes in stats.items():
+        requests = sum(value for outcome, value in outcomes.items() if outcome != 'bytes')
+        details = '，'.join(f"{outcome} {value}" for outcome, value in outcomes.items() if outcome != 'bytes')
+        lines.append(f"{source:<8}{requests:>6} 次请求  {details}  ({outcomes.get('bytes', 0) / 1024:.0f} KB)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地回放服务器')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = ReplayServer(faults_from_args(args), single_host=args.single_host).start()
+    print("回放服务器已启动，设置以下环境变量后运行抓取脚本：")
+    for key, value in server.env().items():
+        print(f"export {key}='{value}'")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print("\n请求统计：")
+        for line in format_stats(server.stats()):
+            print(f"  {line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ EPGO主程序测试脚本
 用于测试整个EPGO系统的核心功能
 """
 
+import io
+import re
 import sys
 import os
 from datetime import datetime
@@ -16,7 +18,10 @@ sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
 
 # 导入配置和主程序
 try:
-    from epgo import main, load_config
+    from epgo import main, combine_days, replace_window, write_xmltv
+    from settings import load_config
+    from programme import Programme, SECONDS_PER_DAY, day_start
+    from schedule_merge import ScheduleMerger
     CONFIG = load_config()
 except ImportError as e:
     print(f"导入EPGO模块失败: {e}")
@@ -111,6 +116,64 @@ def test_config():
         traceback.print_exc()
         return False
 
+def test_combine_days():
+    """测试相邻两天的节目单在午夜前后重叠时的合并"""
+    print("=== 多天节目单合并测试 ===")
+
+    day = day_start()
+    next_day = day + SECONDS_PER_DAY
+    # 第一天的页面末尾带有次日凌晨的节目，第二天开头带有前一晚延续过来的节目
+    first = [Programme('23:00', '晚间新闻', start=day + 23 * 3600),
+             Programme('00:00', '午夜剧场', start=next_day),
+             Programme('00:30', '天气预报', start=next_day + 1800)]
+    second = [Programme('23:00', '晚间新闻', start=day + 23 * 3600),
+              Programme('00:00', '午夜剧场', start=next_day),
+              Programme('00:30', '天气预报', start=next_day + 1800),
+              Programme('06:00', '朝闻天下', start=next_day + 6 * 3600)]
+    day_guides = [
+        (day, {'test': {'name': '测试频道', 'programs': first}}),
+        (next_day, {'test': {'name': '测试频道', 'programs': second}}),
+    ]
+    programs = combine_days(day_guides)['test']['programs']
+
+    starts = [program['start'] for program in programs]
+    assert len(starts) == len(set(starts)), f"合并后有重复的节目: {starts}"
+    assert starts == [day + 23 * 3600, next_day, next_day + 1800, next_day + 6 * 3600]
+
+    stream = io.StringIO()
+    write_xmltv({'test': {'name': '测试频道', 'programs': programs}}, stream)
+    for start, stop in re.findall(r'start="(\d{14})[^"]*" stop="(\d{14})', stream.getvalue()):
+        assert stop >= start, f"节目结束时间早于开始时间: {start} -> {stop}"
+
+    print(f"合并 {len(programs)} 个节目，没有重复和负时长")
+    print()
+    return True
+
+def test_replace_window():
+    """测试刷新只替换同一来源的节目，不覆盖优先级更高的源"""
+    print("=== 刷新窗口测试 ===")
+
+    day = day_start()
+    # 央视接口的节目带有结束时间，优先级高于电视猫
+    existing = [Programme('19:00', '新闻联播', start=day + 19 * 3600, stop=day + 19 * 3600 + 1800, source='cctv'),
+                Programme('19:30', '焦点访谈', start=day + 19 * 3600 + 1800, stop=day + 20 * 3600, source='cctv'),
+                Programme('20:00', '电视剧：人世间(1)', start=day + 20 * 3600, source='weishi'),
+                Programme('22:00', '晚间新闻', start=day + 22 * 3600, source='weishi')]
+    refreshed = [Programme('19:00', '新闻联播', start=day + 19 * 3600),
+                 Programme('19:35', '今日说法', start=day + 19 * 3600 + 2100),
+                 Programme('20:05', '电视剧：人世间(2)', start=day + 20 * 3600 + 300)]
+    # 不依赖当前目录下 config.yaml 中的优先级
+    merger = ScheduleMerger(['cctv', 'weishi'])
+    programs = replace_window(existing, refreshed, day + 18 * 3600, day + 22 * 3600, 'weishi', merger)
+
+    result = [(program['title'], program['source']) for program in programs]
+    assert result == [('新闻联播', 'cctv'), ('焦点访谈', 'cctv'), ('电视剧：人世间(2)', 'weishi'),
+                      ('晚间新闻', 'weishi')], result
+
+    print(f"刷新后 {len(programs)} 个节目，央视接口的节目保留")
+    print()
+    return True
+
 def main():
     """主测试函数"""
     print("=== EPGO系统测试套件 ===")
@@ -119,6 +182,20 @@ def main():
     
     # 测试配置文件
     config_ok = test_config()
+
+    # 测试多天节目单合并
+    try:
+        combine_ok = test_combine_days()
+    except AssertionError as e:
+        print(f"多天节目单合并测试失败: {e}")
+        combine_ok = False
+
+    # 测试刷新窗口
+    try:
+        refresh_ok = test_replace_window()
+    except AssertionError as e:
+        print(f"刷新窗口测试失败: {e}")
+        refresh_ok = False
     
     # 清理测试文件
     clear_test_files()
@@ -132,6 +209,8 @@ def main():
     # 汇总测试结果
     test_results = {
         "配置文件测试": "通过" if config_ok else "失败",
+        "多天节目单合并测试": "通过" if combine_ok else "失败",
+        "刷新窗口测试": "通过" if refresh_ok else "失败",
         "主程序测试": "通过" if main_ok else "失败"
     }
     
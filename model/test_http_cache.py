@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP 响应缓存测试脚本
+离线测试 http_cache 的过期/再验证边界、LRU 淘汰，以及 http_client 的 304 再验证
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 添加当前目录和code目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code'))
+
+from http_cache import ResponseCache
+from http_client import HttpClient
+
+def make_response(url, body, status=200, headers=None):
+    """构造一个 requests.Response，不发出网络请求"""
+    response = requests.Response()
+    response._content = body
+    response.status_code = status
+    response.url = url
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict(headers or {})
+    return response
+
+def age_entry(cache, url, seconds):
+    """把缓存条目的保存时间往前调 seconds 秒"""
+    meta_path, _ = cache._paths(cache.key_for(url))
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['stored_at'] = time.time() - seconds
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+@contextmanager
+def temp_cache_dir():
+    """临时缓存目录，退出时删除"""
+    cache_dir = tempfile.mkdtemp(prefix='epg_cache_test_')
+    try:
+        yield cache_dir
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+class FakeSession:
+    """按顺序返回预设响应的会话，记录每次请求的请求头"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, allow_redirects=True):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+def test_lookup_boundary():
+    """测试 lookup：再验证时间内新鲜；之后有校验信息的需再验证，没有的到过期时间才失效"""
+    print("=== 缓存过期与再验证边界测试 ===")
+    with temp_cache_dir() as cache_dir:
+        cache = ResponseCache({'dir': cache_dir, 'expire_hours': 1, 'revalidate_minutes': 10})
+        with_etag = 'http://example.com/etag'
+        plain = 'http://example.com/plain'
+        cache.put(with_etag, make_response(with_etag, b'a', headers={'ETag': '"v1"'}))
+        cache.put(plain, make_response(plain, b'b'))
+
+        for url in (with_etag, plain):
+            response, fresh = cache.lookup(url)
+            assert response is not None and fresh, url
+
+        # 刚超过再验证时间：带 ETag 的需要再验证，没有校验信息的在过期前仍然新鲜
+        age_entry(cache, with_etag, 10 * 60 + 5)
+        age_entry(cache, plain, 10 * 60 + 5)
+        response, fresh = cache.lookup(with_etag)
+        assert response is not None and not fresh and response.headers['ETag'] == '"v1"'
+        assert cache.get(with_etag) is None
+        response, fresh = cache.lookup(plain)
+        assert response is not None and fresh
+
+        # 超过过期时间：没有校验信息的失效，带 ETag 的仍可再验证
+        age_entry(cache, with_etag, 3600 + 5)
+        age_entry(cache, plain, 3600 + 5)
+        response, fresh = cache.lookup(with_etag)
+        assert response is not None and not fresh
+        assert cache.lookup(plain) == (None, False)
+
+    print("边界正确")
+    print()
+    return True
+
+def test_lru_eviction():
+    """测试总大小超过上限时先淘汰最久未使用的条目，连同解析结果一起删除"""
+    print("=== LRU 淘汰测试 ===")
+    with temp_cache_dir() as cache_dir:
+        # 上限 2.5 KB，每个条目 1 KB
+        cache = ResponseCache({'dir': cache_dir, 'max_size_mb': 2.5 / 1024})
+        urls = [f'http://example.com/page{index}' for index in range(3)]
+        for index, url in enumerate(urls[:2]):
+            key = cache.put(url, make_response(url, b'x' * 1024))
+            cache.put_parsed(key, 'test', index)
+            # LRU 按元数据文件的修改时间排序，page0 最早
+            meta_path, _ = cache._paths(key)
+            os.utime(meta_path, (time.time() - 100 + index, time.time() - 100 + index))
+        # 访问 page0 后它变为最近使用，page1 成为最久未使用
+        assert cache.lookup(urls[0])[0] is not None
+
+        cache.put(urls[2], make_response(urls[2], b'x' * 1024))
+        assert cache.get(urls[0]) is not None
+        assert cache.get(urls[1]) is None
+        assert cache.get(urls[2]) is not None
+        assert not os.path.exists(cache._parsed_path(cache.key_for(urls[1])))
+        assert cache._total_size == 2048, cache._total_size
+
+    print("淘汰了最久未使用的条目")
+    print()
+    return True
+
+def test_revalidate_304():
+    """测试条件请求返回 304 时使用本地副本、重置保存时间，并复用解析结果"""
+    print("=== 304 再验证测试 ===")
+    with temp_cache_dir() as cache_dir:
+        cache = ResponseCache({'dir': cache_dir, 'expire_hours': 1, 'revalidate_minutes': 10})
+        client = HttpClient({'retry': 1, 'rate_limit': {'enabled': False}}, cache=cache)
+        url = 'http://example.com/w1.html'
+        key = cache.put(url, make_response(url, b'<html>v1</html>', headers={'ETag': '"v1"'}))
+        cache.put_parsed(key, 'test', ['v1'])
+        age_entry(cache, url, 10 * 60 + 5)
+
+        session = FakeSession([make_response(url, b'', status=304)])
+        response = client.get(url, session=session)
+        assert session.requests[0]['If-None-Match'] == '"v1"'
+        assert response.from_cache and response.content == b'<html>v1</html>'
+        assert client.parse(response, 'test', lambda r: ['reparsed']) == ['v1']
+        assert client.stats['revalidated'] == 1 and client.stats['parses_saved'] == 1
+        # 保存时间已重置，再次读取时直接命中，不发请求
+        assert cache.lookup(url)[1]
+        assert client.get(url, session=session) is not None and len(session.requests) == 1
+
+        # revalidating() 期间即使缓存新鲜也发送条件请求
+        session = FakeSession([make_response(url, b'', status=304)])
+        with client.revalidating():
+            client.get(url, session=session)
+        client.get(url, session=session)
+        assert len(session.requests) == 1 and client.stats['revalidated'] == 2
+
+    print(f"统计: {client.stats}")
+    print()
+    return True
+
+def test_host_headers():
+    """测试按主机配置的请求头只发送给该主机"""
+    print("=== 按主机请求头测试 ===")
+    with temp_cache_dir() as cache_dir:
+        cache = ResponseCache({'dir': cache_dir})
+        client = HttpClient({
+            'retry': 1, 'rate_limit': {'enabled': False},
+            'headers': {'User-Agent': 'test'},
+            'hosts': {'tvsou.com': {'headers': {'Referer': 'https://www.tvsou.com/'}}},
+        }, cache=cache)
+        for url, referer in (('http://www.tvsou.com/epg', 'https://www.tvsou.com/'),
+                             ('http://api.cntv.cn/epg', None)):
+            session = FakeSession([make_response(url, b'ok')])
+            client.get(url, session=session, use_cache=False)
+            assert session.requests[0].get('Referer') == referer, session.requests[0]
+            assert session.requests[0]['User-Agent'] == 'test'
+
+    print("Referer 只发送给 tvsou.com")
+    print()
+    return True
+
+def main():
+    """主函数"""
+    print("=== HTTP缓存测试 ===")
+    print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print()
+
+    ok = True
+    for test in (test_lookup_boundary, test_lru_eviction, test_revalidate_304, test_host_headers):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"{test.__name__} 失败: {e}")
+            ok = False
+
+    print("测试完成！" if ok else "部分测试失败")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -12,12 +12,38 @@ sys.path.insert(0, os.path.join(project_root, 'code'))
 
 # 从code目录导入tm模块
 import tm
+from programme import day_start
+
+def test_carry_over():
+    """测试时段页面开头前一天延续过来的节目、末尾次日凌晨的节目按时段换算到正确的一天"""
+    print("=== 跨午夜节目测试 ===")
+
+    def slot_page(*items):
+        return [('CCTV-1', {'time': time, 'title': title}) for time, title in items]
+
+    slot_pages = [
+        # 0 点时段第一格 23:20 的节目从前一天延续过来
+        (0, slot_page(('23:20', '正大综艺'), ('00:10', '今日说法'), ('01:00', '新闻联播'))),
+        (18, slot_page(('18:00', '生活圈'), ('19:00', '新闻联播'))),
+        # 22 点时段末尾的 00:10 属于次日
+        (22, slot_page(('22:00', '晚间新闻'), ('23:20', '正大综艺'), ('00:10', '今日说法'))),
+    ]
+    anchor = day_start()
+    programs = tm.group_slot_programs(slot_pages, anchor)['CCTV-1']
+
+    starts = [(program['start'] - anchor) // 60 for program in programs]
+    assert starts == [-40, 10, 60, 18 * 60, 19 * 60, 22 * 60, 23 * 60 + 20, 24 * 60 + 10], starts
+
+    print(f"{len(programs)} 个节目的开始时间正确")
+    print()
 
 def main():
     print("=== TM节目测试 ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
+    test_carry_over()
+    
     try:
         # 调用TVMao节目单抓取函数
         print("1. 央视节目单...")
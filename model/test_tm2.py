@@ -13,11 +13,32 @@ sys.path.insert(0, os.path.join(project_root, 'code'))
 # 从code目录导入tm2模块
 import tm2
 
+def test_channel_name():
+    """测试频道名称：与代码表一致时用代码表的名称，页面是另一个已知频道时按该频道发布，否则仍按请求"""
+    print("=== 频道名称测试 ===")
+    programs = [{'time': '07:00', 'title': '朝闻天下'}, {'time': '12:00', 'title': '新闻30分'}]
+
+    epg_data = tm2.build_channel_epg('CCTV-CCTV1', {'channel': 'CCTV-1综合频道', 'programs': programs}, 1)
+    assert epg_data['channel'] == 'CCTV-1综合', epg_data['channel']
+    # 请求 CCTV-2 却得到 CCTV-1 的页面时，不能把节目发布到 CCTV-2 下
+    epg_data = tm2.build_channel_epg('CCTV-CCTV2', {'channel': 'CCTV-1综合频道', 'programs': programs}, 1)
+    assert epg_data['channel'] == 'CCTV-1综合', epg_data['channel']
+    # 页面名称无法对应到已知频道时，频道身份仍以请求为准
+    epg_data = tm2.build_channel_epg('CCTV-CCTV2', {'channel': '未知频道', 'programs': programs}, 1)
+    assert epg_data['channel'] == 'CCTV-2财经', epg_data['channel']
+
+    codes = list(tm2.CHANNEL_CODES.values())
+    assert len(codes) == len(set(codes)), "CHANNEL_CODES 中有重复的频道代码"
+    print("频道名称正确")
+    print()
+
 def main():
     print("=== TM2卫视频道测试 ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
 
+    test_channel_name()
+
     try:
         # 获取当前星期几
         current_weekday = tm2.get_current_weekday()
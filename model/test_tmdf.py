@@ -13,11 +13,27 @@ sys.path.insert(0, os.path.join(project_root, 'code'))
 # 从code目录导入tmdf模块
 import tmdf
 
+def test_channel_name():
+    """测试地方台频道名称以页面为准，页面中没有名称时才用频道列表中的名称"""
+    print("=== 频道名称测试 ===")
+    programs = [tmdf.Programme('07:00', '北京新闻'), tmdf.Programme('19:30', '电视剧')]
+
+    # 地方台的频道ID由频道名称生成，名称变化会改变已发布的频道ID
+    channel_name, _ = tmdf.build_channel_programs('北京文艺', 'BTV-BTV2', 1, ('BTV文艺', programs))
+    assert channel_name == 'BTV文艺', channel_name
+    channel_name, _ = tmdf.build_channel_programs('北京文艺', 'BTV-BTV2', 1, (None, programs))
+    assert channel_name == '北京文艺', channel_name
+    assert tmdf.build_channel_programs('北京文艺', 'BTV-BTV2', 1, ('BTV文艺', [])) is None
+    print("频道名称正确")
+    print()
+
 def main():
     print("=== TMDF地方台测试 ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
 
+    test_channel_name()
+
     try:
         # 获取当前星期几
         current_weekday = tmdf.get_current_weekday()